@@ -0,0 +1,77 @@
+"""
+Largest-Triangle-Three-Buckets (LTTB) visual downsampling.
+
+LTTB keeps the first and last point of a series and splits the rest into `threshold - 2`
+equal buckets. From every bucket it keeps the point that forms the largest triangle with the
+point kept from the previous bucket and the average of the next bucket, which preserves the
+peaks and troughs a chart needs while dropping the rest.
+
+The choice in each bucket depends on the previous one, so the buckets are walked in order,
+but every step is taken for all series at once: one pass of array ops per bucket index, no
+matter how many series there are. Series are laid out back to back in one array, described by
+their start offsets and lengths.
+"""
+import numpy as np
+
+"""
+Returns the indices, into the concatenated x/y arrays, of the points LTTB keeps for each series,
+in series order. Series that already fit within `threshold` points are kept whole.
+
+`x` needs to be increasing within every series.
+"""
+def lttb_indices(x: np.ndarray, y: np.ndarray, starts: np.ndarray, lengths: np.ndarray, threshold: int) -> np.ndarray:
+    if threshold < 3:
+        raise ValueError("threshold must be at least 3")
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+
+    sampled = lengths > threshold
+    keep = np.zeros(len(x), dtype=bool)
+    # short series pass through untouched
+    for start, length in zip(starts[~sampled].tolist(), lengths[~sampled].tolist()):
+        keep[start:start + length] = True
+
+    if sampled.any():
+        keep[_lttb(x, y, starts[sampled], lengths[sampled], threshold)] = True
+    return np.flatnonzero(keep)
+
+def _lttb(x: np.ndarray, y: np.ndarray, starts: np.ndarray, lengths: np.ndarray, threshold: int) -> np.ndarray:
+    # prefix sums give every bucket average in O(1)
+    x_sums = np.concatenate(([0.0], np.cumsum(x)))
+    y_sums = np.concatenate(([0.0], np.cumsum(y)))
+
+    every = (lengths - 2) / (threshold - 2)
+    last = starts + lengths - 1
+    selected = [starts]
+    previous = starts
+
+    for bucket in range(threshold - 2):
+        # the bucket to pick from and the next bucket to average, as offsets into each series
+        low = starts + np.floor(bucket * every).astype(np.int64) + 1
+        high = starts + np.floor((bucket + 1) * every).astype(np.int64) + 1
+        next_high = np.minimum(starts + np.floor((bucket + 2) * every).astype(np.int64) + 1, last + 1)
+
+        next_count = next_high - high
+        avg_x = (x_sums[next_high] - x_sums[high]) / next_count
+        avg_y = (y_sums[next_high] - y_sums[high]) / next_count
+
+        # every candidate of every series in one flat array, tagged with its series
+        counts = high - low
+        series = np.repeat(np.arange(len(starts)), counts)
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        candidates = np.arange(counts.sum()) - np.repeat(offsets, counts) + np.repeat(low, counts)
+
+        px, py = x[previous][series], y[previous][series]
+        area = np.abs((px - avg_x[series]) * (y[candidates] - py) - (px - x[candidates]) * (avg_y[series] - py))
+
+        # first candidate with the largest area in each series
+        best = np.maximum.reduceat(area, offsets)
+        position = np.where(area == best[series], np.arange(len(area)), len(area))
+        previous = candidates[np.minimum.reduceat(position, offsets)]
+        selected.append(previous)
+
+    selected.append(last)
+    return np.concatenate(selected)
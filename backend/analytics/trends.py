@@ -0,0 +1,219 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List
+import numpy as np
+
+"""
+Vectorized trend engine.
+
+Every (group, calendar month) cell is reduced to the sufficient statistics of a simple linear
+regression: n, Σx, Σy, Σxy, Σx², Σy², where x is the reading's day offset from REFERENCE_DATE
+and y its value. Those moments are additive, so the overall trend, the anomaly thresholds,
+the monthly means, the per-season trends and the seasonality of every group all fall out of a handful of
+array reductions over a (groups, 12) grid. The moments can come from raw columns
+(`Moments.from_columns`, grouped np.bincount) or straight from Postgres (`Moments.from_rows`),
+in which case only the aggregates ever leave the database.
+"""
+
+REFERENCE_DATE = np.datetime64("2000-01-01", "D")
+DAYS_PER_MONTH = 365.25 / 12
+
+# |z| above which a reading is reported as an anomaly
+ANOMALY_SIGMA = 2.0
+
+# meteorological seasons as month numbers
+SEASONS = {
+    "winter": (12, 1, 2),
+    "spring": (3, 4, 5),
+    "summer": (6, 7, 8),
+    "fall": (9, 10, 11),
+}
+
+# a season needs at least this r² before its trend is called increasing or decreasing
+SEASON_TREND_MIN_R2 = 0.25
+
+# share of detrended variance explained by the month of year needed to report seasonality
+SEASONALITY_MIN_CONFIDENCE = 0.5
+SEASONALITY_MIN_MONTHS = 3
+
+MOMENT_FIELDS = ("n", "sx", "sy", "sxx", "sxy", "syy")
+
+# (12,) month index -> (4,) season index
+_SEASON_OF_MONTH = np.empty(12, dtype=np.int64)
+for _season_index, _months in enumerate(SEASONS.values()):
+    for _month in _months:
+        _SEASON_OF_MONTH[_month - 1] = _season_index
+
+def day_offsets(dates: np.ndarray) -> np.ndarray:
+    return (dates.astype("datetime64[D]") - REFERENCE_DATE).astype(np.float64)
+
+def months_of(dates: np.ndarray) -> np.ndarray:
+    return dates.astype("datetime64[M]").astype(np.int64) % 12 + 1
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), np.nan)
+
+"""
+Per (group, month) regression moments, each field shaped (n_groups, 12).
+"""
+@dataclass
+class Moments:
+    n: np.ndarray
+    sx: np.ndarray
+    sy: np.ndarray
+    sxx: np.ndarray
+    sxy: np.ndarray
+    syy: np.ndarray
+
+    @classmethod
+    def from_columns(cls, groups: np.ndarray, x: np.ndarray, y: np.ndarray, months: np.ndarray, n_groups: int) -> "Moments":
+        cells = groups * 12 + (months - 1)
+        size = n_groups * 12
+
+        def reduce(weights=None):
+            return np.bincount(cells, weights=weights, minlength=size).reshape(n_groups, 12).astype(np.float64)
+
+        return cls(
+            n=reduce(),
+            sx=reduce(x),
+            sy=reduce(y),
+            sxx=reduce(x * x),
+            sxy=reduce(x * y),
+            syy=reduce(y * y),
+        )
+
+    """
+    Builds moments from (group, month, n, sx, sy, sxx, sxy, syy) aggregate rows, summing rows of the same cell.
+    """
+    @classmethod
+    def from_rows(cls, rows: List[tuple], n_groups: int) -> "Moments":
+        fields = {name: np.zeros((n_groups, 12)) for name in MOMENT_FIELDS}
+        for group, month, *values in rows:
+            for name, value in zip(MOMENT_FIELDS, values):
+                fields[name][group, month - 1] += float(value)
+        return cls(**fields)
+
+    # sums the month axis into `size` buckets, month i going to bucket index[i]
+    def sum(self, index: np.ndarray, size: int) -> "Moments":
+        def reduce(field):
+            out = np.zeros((field.shape[0], size))
+            np.add.at(out, (slice(None), index), field)
+            return out
+        return Moments(**{name: reduce(getattr(self, name)) for name in MOMENT_FIELDS})
+
+    def total(self) -> "Moments":
+        return Moments(**{name: getattr(self, name).sum(axis=1) for name in MOMENT_FIELDS})
+
+"""
+Least squares fit of y on x for every cell of a Moments grid.
+"""
+@dataclass
+class Fit:
+    n: np.ndarray
+    mean: np.ndarray
+    std: np.ndarray
+    slope: np.ndarray
+    r2: np.ndarray
+
+    @classmethod
+    def of(cls, m: Moments) -> "Fit":
+        mean_x = _divide(m.sx, m.n)
+        mean_y = _divide(m.sy, m.n)
+        # centered sums, clipped at 0 to absorb rounding
+        cxx = np.maximum(m.sxx - m.n * np.nan_to_num(mean_x) ** 2, 0)
+        cyy = np.maximum(m.syy - m.n * np.nan_to_num(mean_y) ** 2, 0)
+        cxy = m.sxy - m.n * np.nan_to_num(mean_x) * np.nan_to_num(mean_y)
+        slope = np.nan_to_num(_divide(cxy, cxx))
+        r2 = np.clip(np.nan_to_num(_divide(cxy * cxy, cxx * cyy)), 0, 1)
+        return cls(n=m.n, mean=mean_y, std=np.sqrt(_divide(cyy, m.n)), slope=slope, r2=r2)
+
+"""
+Trend statistics for every group, computed from its monthly moments.
+"""
+@dataclass
+class TrendResult:
+    overall: Fit
+    months: Fit
+    seasons: Fit
+    # share of the detrended variance explained by the month of year (eta squared)
+    seasonality_confidence: np.ndarray
+
+def analyze(moments: Moments) -> TrendResult:
+    overall = Fit.of(moments.total())
+    months = Fit.of(moments)
+    seasons = Fit.of(moments.sum(_SEASON_OF_MONTH, len(SEASONS)))
+
+    # month-of-year share of the variance left once the linear trend is removed
+    mean_x = _divide(moments.sx.sum(axis=1), overall.n)
+    month_mean_x = _divide(moments.sx, moments.n)
+    trend_at_month = overall.mean[:, None] + overall.slope[:, None] * (month_mean_x - mean_x[:, None])
+    between = np.nansum(months.n * (months.mean - trend_at_month) ** 2, axis=1)
+    residual = overall.n * overall.std ** 2 * (1 - overall.r2)
+    seasonality_confidence = np.clip(np.nan_to_num(_divide(between, residual)), 0, 1)
+
+    return TrendResult(overall=overall, months=months, seasons=seasons, seasonality_confidence=seasonality_confidence)
+
+"""
+Returns the z-score of every reading against its group and the mask of anomalous readings.
+"""
+def anomaly_scores(groups: np.ndarray, values: np.ndarray, result: TrendResult):
+    mean = result.overall.mean[groups]
+    std = result.overall.std[groups]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(std > 0, (values - mean) / np.where(std > 0, std, 1), 0.0)
+    return z, np.abs(z) > ANOMALY_SIGMA
+
+def direction(slope: float) -> str:
+    if slope > 0:
+        return "increasing"
+    if slope < 0:
+        return "decreasing"
+    return "stable"
+
+"""
+Formats one group of a TrendResult in the /trends response shape.
+"""
+def format_trend(result: TrendResult, group: int, unit: str, anomalies: List[Dict[str, Any]]) -> Dict[str, Any]:
+    overall = result.overall
+    seasons = result.seasons
+
+    pattern = {}
+    for index, season in enumerate(SEASONS):
+        if seasons.n[group, index] == 0:
+            continue
+        # average of the monthly means so unevenly sampled months don't skew the season
+        season_months = [month - 1 for month in SEASONS[season] if result.months.n[group, month - 1] > 0]
+        pattern[season] = {
+            "avg": round(float(np.mean(result.months.mean[group, season_months])), 2),
+            "trend": direction(seasons.slope[group, index])
+                if seasons.r2[group, index] >= SEASON_TREND_MIN_R2 else "stable"
+        }
+
+    observed_months = int(np.count_nonzero(result.months.n[group]))
+    confidence = float(result.seasonality_confidence[group])
+
+    return {
+        "direction": direction(overall.slope[group]),
+        "rate": round(float(overall.slope[group]) * DAYS_PER_MONTH, 2),
+        "confidence": round(float(overall.r2[group]), 2),
+        "unit": unit,
+        "anomalies": anomalies,
+        "seasonality": {
+            "detected": observed_months >= SEASONALITY_MIN_MONTHS and confidence >= SEASONALITY_MIN_CONFIDENCE,
+            "period": "yearly",
+            "confidence": round(confidence, 2),
+            "pattern": pattern
+        }
+    }
+
+"""
+Runs the whole engine over raw columns.
+
+groups are dense integer codes in [0, n_groups), dates are datetime64 values.
+Returns the TrendResult and, per group, the anomalous readings as (row index, z) pairs.
+"""
+def analyze_columns(groups: np.ndarray, dates: np.ndarray, values: np.ndarray, n_groups: int):
+    moments = Moments.from_columns(groups, day_offsets(dates), values, months_of(dates), n_groups)
+    result = analyze(moments)
+    z, mask = anomaly_scores(groups, values, result)
+    return result, np.flatnonzero(mask), z
@@ -5,11 +5,18 @@ from typing import Optional, Dict, List
 from sqlmodel import SQLModel
 
 # NOTE: we need to import the models before starting the seed flow
-from .dal.models import climate_data, metrics, locations
-from .dal.engine import engine
+from .dal.models import climate_data, climate_rollup, metrics, locations, quality_levels
+from .dal.engine import engine, dispose_engines, route_reads
+from .compute import start_pool, shutdown_pool
+from .ingest_queue import INGEST_QUEUE_ENABLED
+from .live import broadcaster
+from .dal.migrations import migrate
+from .dimensions import load_dimensions
+from .instrumentation import instrument_requests
+from .startup import start_background, wait_background
 
-from .routes import climate, locations, metrics, summary, trends
-from .seed import create_locations_from_seed, create_metrics_from_seed, create_climate_data_from_seed
+from .routes import climate, dashboard, live, locations, metrics, monitoring, series, summary, trends
+from .seed import seed
 from dotenv import load_dotenv
 import os
 
@@ -18,18 +25,11 @@ load_dotenv()
 ENVIRONMENT = os.getenv("ENVIRONMENT")
 
 """
-Creates new tables and seeds the data
-
-NOTE: only if ENVIRONMENT value is "dev"
+Applies pending schema migrations
 """
 def load_db():
-    if ENVIRONMENT == "dev":
-        print("CREATING TABLES...") 
-        SQLModel.metadata.create_all(engine)
-        print("SEEDING DATA...")
-        create_locations_from_seed()
-        create_metrics_from_seed()
-        create_climate_data_from_seed()
+    print("MIGRATING SCHEMA...")
+    migrate(engine)
 
 """
 Drops tables
@@ -45,8 +45,13 @@ def drop_db():
 Lifecycle hook to init DB and seed data
 
 NOTE: async here is important
-1. yields control after seeding is done
-2. restarts from yield point once server termination is started
+1. yields control once the schema is migrated, seeding and the compute workers start in the
+   background and GET /ready reports when they are done (see startup.py)
+2. restarts from yield point once server termination is started, readings still in the
+   ingestion queue (see ingest_queue.py) are written first and open live streams (see live.py)
+   are ended
+
+NOTE: seeding only if ENVIRONMENT value is "dev"
 
 More info can be found in the README.md in the root of this folder.
 """
@@ -54,17 +59,39 @@ More info can be found in the README.md in the root of this folder.
 async def lifespan(app: FastAPI):
     print("STARTING SERVER...")
     load_db()
+    load_dimensions()
+    if ENVIRONMENT == "dev":
+        start_background("seed", seed)
+    start_background("compute", start_pool)
+    if INGEST_QUEUE_ENABLED:
+        climate.climate_queue.start()
+    broadcaster.start()
     yield
+    # readings already accepted are written before anything shuts down
+    await climate.climate_queue.drain()
+    await broadcaster.stop()
+    await wait_background()
+    shutdown_pool()
     drop_db()
+    await dispose_engines()
     print("TERMINATING SERVER")
 
 # init server and add routes
 app = FastAPI(title="EcoVision API", lifespan=lifespan)
 app.include_router(climate.router)
+app.include_router(live.router)
 app.include_router(locations.router)
 app.include_router(metrics.router)
 app.include_router(summary.router)
 app.include_router(trends.router)
+app.include_router(dashboard.router)
+app.include_router(series.router)
+app.include_router(monitoring.router)
+
+# records latency and per phase timings of every request, see instrumentation.py
+app.middleware("http")(instrument_requests)
+# sends a client's reads to the primary right after its writes when read replicas are configured
+app.middleware("http")(route_reads)
 
 # add CORS middleware
 app.add_middleware(
@@ -0,0 +1,53 @@
+import asyncio
+import os
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from backend import compute
+from backend.benchmarks.generate import Dataset, generate_readings, metric_profiles
+from backend.routes.trends import merge_trends, trend_partitions, trends_from_columns
+
+"""
+Serial vs process pool trend analysis on wide multi-metric batches, the shape of an
+unfiltered numpy-mode /trends request. Every worker count gets its own pool,
+so the speedup per core can be read off the "trends pool" group. On a machine with fewer
+cores than workers the extra workers only add overhead.
+
+Not collected by the regular test run, pass the file explicitly:
+
+`python -m pytest benchmarks/bench_compute.py --benchmark-json=bench-results/compute-$(git rev-parse --short HEAD).json`
+"""
+
+DATASET = Dataset(locations=40, metrics=20, years=5)
+WORKERS = [1, 2, 4, 8]
+
+@pytest.fixture(scope="module")
+def columns():
+    chunks = list(generate_readings(DATASET, chunk_rows=DATASET.rows))
+    readings = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+    metrics = {index + 1: (profile.name, profile.unit) for index, profile in enumerate(metric_profiles(DATASET.metrics))}
+    return readings["date"], readings["value"], readings["metric"] + 1, readings["quality"], metrics
+
+@pytest.fixture(scope="module", params=WORKERS, ids=[f"{workers} workers" for workers in WORKERS])
+def pool(request):
+    compute.start_pool(request.param)
+    yield request.param
+    compute.shutdown_pool()
+
+def test_trends_serial(benchmark, columns):
+    benchmark.group = "trends pool"
+    result = benchmark(trends_from_columns, *columns)
+    assert len(result) == DATASET.metrics
+
+def test_trends_pool(benchmark, columns, pool):
+    benchmark.group = "trends pool"
+    benchmark.extra_info["cpus"] = os.cpu_count()
+
+    def run():
+        partitions = trend_partitions(*columns, parts=pool)
+        return merge_trends(asyncio.run(compute.run_in_pool(trends_from_columns, partitions)), columns[2], columns[4])
+
+    result = benchmark.pedantic(run, rounds=5, warmup_rounds=1)
+    assert len(result) == DATASET.metrics
@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import re
+import time
+from typing import Dict, List
+import httpx
+from .load import git_revision, percentile
+
+"""
+Sustained single reading writes against POST /api/v1/create_climate.
+
+Runs C concurrent clients, each posting one reading at a time back to back for a fixed
+duration, and reports the writes per second and latency percentiles per concurrency level.
+Every client writes its own station's readings, so the readings never conflict: each level
+creates C stations first and each client walks its station's metrics day by day.
+
+`--mode wait` waits for every reading to be written (the response contract of the direct path
+and of the ingestion queue with wait=true). `--mode queued` posts with wait=false and, after
+the run, waits for the queue to drain so the rate counts written readings, not accepted ones.
+
+Compare the direct path against the group committed one by starting the server once per
+INGEST_QUEUE_ENABLED value. It writes into the database the server uses, use a throwaway one:
+
+`ENVIRONMENT=bench INGEST_QUEUE_ENABLED=true fastapi run backend/app.py`
+`python -m backend.benchmarks.bench_ingest --clients 10 100 --mode wait queued --output bench-results/ingest-$(git rev-parse --short HEAD).json`
+"""
+
+MODES = ["wait", "queued"]
+START_DATE = datetime.date(2090, 1, 1)
+PENDING = re.compile(r'^ecovision_ingest_queue_pending\{queue="climate"\} (\d+)', re.MULTILINE)
+
+async def create_stations(client: httpx.AsyncClient, count: int, label: str) -> List[int]:
+    ids = []
+    for number in range(count):
+        location = {"name": f"bench {label} {number}", "country": "bench", "latitude": 0, "longitude": 0, "region": "bench"}
+        ids.append((await client.post("/api/v1/create_location", json=location)).raise_for_status().json()["id"])
+    return ids
+
+async def client_loop(client: httpx.AsyncClient, location_id: int, metric_ids: List[int], mode: str, deadline: float, latencies: List[float], errors: List[int]):
+    index = 0
+    while time.perf_counter() < deadline:
+        day, metric = divmod(index, len(metric_ids))
+        index += 1
+        reading = {
+            "location_id": location_id,
+            "metric_id": metric_ids[metric],
+            "date": (START_DATE + datetime.timedelta(days=day)).isoformat(),
+            "value": float(index % 40),
+            "quality": "good"
+        }
+        start = time.perf_counter()
+        try:
+            response = await client.post("/api/v1/create_climate", params={"wait": str(mode == "wait").lower()}, json=reading)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError:
+            errors.append(0)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+async def queue_pending(client: httpx.AsyncClient) -> int:
+    match = PENDING.search((await client.get("/metrics")).text)
+    return int(match.group(1)) if match else 0
+
+async def run_level(base_url: str, metric_ids: List[int], clients: int, mode: str, duration: float) -> Dict:
+    latencies: List[float] = []
+    errors: List[int] = []
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        location_ids = await create_stations(client, clients, f"{mode} {clients} {time.time_ns()}")
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(
+            client_loop(client, location_id, metric_ids, mode, deadline, latencies, errors)
+            for location_id in location_ids
+        ))
+        accepted = time.perf_counter() - start
+        while mode == "queued" and await queue_pending(client):
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "clients": clients,
+        "writes": len(latencies),
+        "errors": len(errors),
+        "writes_per_second": round(len(latencies) / elapsed, 1),
+        "drain_seconds": round(elapsed - accepted, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+    }
+
+async def main(base_url: str, levels: List[int], modes: List[str], duration: float) -> Dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        metric_ids = [metric["id"] for metric in (await client.get("/api/v1/metrics")).raise_for_status().json()]
+    if not metric_ids:
+        raise SystemExit("no metrics, seed or generate a dataset first")
+
+    results = []
+    for mode in modes:
+        for clients in levels:
+            result = await run_level(base_url, metric_ids, clients, mode, duration)
+            print(json.dumps(result))
+            results.append(result)
+
+    return {
+        "meta": {
+            "commit": git_revision(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "base_url": base_url,
+            "duration": duration,
+        },
+        "results": results,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sustained single reading writes against POST /api/v1/create_climate.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--mode", choices=MODES, nargs="+", default=["wait"])
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per mode and concurrency level")
+    parser.add_argument("--output", help="write the results and run metadata to this JSON file")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args.base_url, args.clients, args.mode, args.duration))
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"WROTE {args.output}")
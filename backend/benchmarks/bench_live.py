@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import time
+from typing import Dict, List
+import httpx
+from .load import git_revision, percentile
+
+"""
+Fan-out latency of GET /api/v1/climate/live with many open streams.
+
+For every level it opens S streams subscribed to one fresh station, then posts R readings for it
+one after the other and measures, per reading, the time from sending the POST until the last
+stream received it. Streams stay open and idle between readings, so the level also shows what
+holding S subscribers costs the server: watch its memory while the level runs.
+
+It writes into the database the server uses, use a throwaway one. Raise the open file limit of
+both processes for levels in the thousands (`ulimit -n`):
+
+`ENVIRONMENT=bench fastapi run backend/app.py`
+`python -m backend.benchmarks.bench_live --subscribers 100 1000 --output bench-results/live-$(git rev-parse --short HEAD).json`
+"""
+
+START_DATE = datetime.date(2095, 1, 1)
+
+async def subscribe(client: httpx.AsyncClient, location_id: int, received: Dict[str, List[float]], connected: asyncio.Event):
+    async with client.stream("GET", "/api/v1/climate/live", params={"location_id": location_id}) as response:
+        response.raise_for_status()
+        connected.set()
+        async for line in response.aiter_lines():
+            if line.startswith("data:"):
+                received.setdefault(json.loads(line[6:])["date"], []).append(time.perf_counter())
+
+async def run_level(base_url: str, metric_id: int, subscribers: int, readings: int) -> Dict:
+    limits = httpx.Limits(max_connections=subscribers + 1, max_keepalive_connections=subscribers + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        location = {"name": f"bench live {subscribers} {time.time_ns()}", "country": "bench", "latitude": 0, "longitude": 0, "region": "bench"}
+        location_id = (await client.post("/api/v1/create_location", json=location)).raise_for_status().json()["id"]
+
+        received: Dict[str, List[float]] = {}
+        connected = [asyncio.Event() for _ in range(subscribers)]
+        start = time.perf_counter()
+        streams = [asyncio.create_task(subscribe(client, location_id, received, event)) for event in connected]
+        await asyncio.gather(*(event.wait() for event in connected))
+        connect_seconds = time.perf_counter() - start
+
+        latencies = []
+        missed = 0
+        for day in range(readings):
+            date = (START_DATE + datetime.timedelta(days=day)).isoformat()
+            sent = time.perf_counter()
+            reading = {"location_id": location_id, "metric_id": metric_id, "date": date, "value": 1.0, "quality": "good"}
+            (await client.post("/api/v1/create_climate", json=reading)).raise_for_status()
+            deadline = time.perf_counter() + 10
+            while len(received.get(date, ())) < subscribers and time.perf_counter() < deadline:
+                await asyncio.sleep(0.001)
+            arrivals = received.get(date, [])
+            missed += subscribers - len(arrivals)
+            if arrivals:
+                latencies.append(max(arrivals) - sent)
+
+        for stream in streams:
+            stream.cancel()
+        await asyncio.gather(*streams, return_exceptions=True)
+
+    return {
+        "subscribers": subscribers,
+        "readings": readings,
+        "connect_seconds": round(connect_seconds, 2),
+        "missed": missed,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "max_ms": round(max(latencies, default=0) * 1000, 1),
+    }
+
+async def main(base_url: str, levels: List[int], readings: int) -> Dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        metric_ids = [metric["id"] for metric in (await client.get("/api/v1/metrics")).raise_for_status().json()]
+    if not metric_ids:
+        raise SystemExit("no metrics, seed or generate a dataset first")
+
+    results = []
+    for subscribers in levels:
+        result = await run_level(base_url, metric_ids[0], subscribers, readings)
+        print(json.dumps(result))
+        results.append(result)
+
+    return {
+        "meta": {
+            "commit": git_revision(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "base_url": base_url,
+            "readings": readings,
+        },
+        "results": results,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fan-out latency of GET /api/v1/climate/live with many open streams.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--readings", type=int, default=50, help="readings posted per level")
+    parser.add_argument("--output", help="write the results and run metadata to this JSON file")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args.base_url, args.subscribers, args.readings))
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"WROTE {args.output}")
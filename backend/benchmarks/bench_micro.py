@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from backend.analytics.downsample import lttb_indices
+from backend.analytics.trends import analyze_columns
+from backend.benchmarks.bench_serialization import fast_path, model_path, synthetic_rows
+from backend.benchmarks.generate import Dataset, generate_readings, metric_profiles
+from backend.dal.models.metrics import Metrics
+from backend.routes.trends import trends_from_columns
+
+"""
+pytest-benchmark microbenchmarks for the compute and serialization hot paths, on readings
+from the synthetic generator so the data has the seasonality, spikes and quality mix of the
+loaded benchmark dataset.
+
+Not collected by the regular test run, pass the file explicitly:
+
+`python -m pytest benchmarks/bench_micro.py --benchmark-json=bench-results/micro-$(git rev-parse --short HEAD).json`
+`pytest-benchmark compare bench-results/micro-*.json`
+"""
+
+DATASETS = {
+    "150k": Dataset(locations=20, metrics=4, years=5),
+    "1.5M": Dataset(locations=100, metrics=4, years=10),
+}
+
+@pytest.fixture(scope="module", params=list(DATASETS))
+def readings(request):
+    dataset = DATASETS[request.param]
+    chunks = list(generate_readings(dataset, chunk_rows=dataset.rows))
+    columns = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+    columns["group"] = columns["location"] * dataset.metrics + columns["metric"]
+    columns["metric_id"] = columns["metric"] + 1
+    columns["dataset"] = dataset
+    return columns
+
+def metrics_of(dataset: Dataset):
+    return {
+        index + 1: Metrics(id=index + 1, name=profile.name, display_name=profile.display_name, unit=profile.unit, description="")
+        for index, profile in enumerate(metric_profiles(dataset.metrics))
+    }
+
+def test_analyze_columns(benchmark, readings):
+    groups = readings["dataset"].locations * readings["dataset"].metrics
+    benchmark.group = "trends engine"
+    benchmark(analyze_columns, readings["group"], readings["date"], readings["value"], groups)
+
+def test_trends_from_columns(benchmark, readings):
+    metrics = {metric_id: (metric.name, metric.unit) for metric_id, metric in metrics_of(readings["dataset"]).items()}
+    benchmark.group = "trends response"
+    result = benchmark(trends_from_columns, readings["date"], readings["value"], readings["metric_id"], readings["quality"], metrics)
+    assert len(result) == readings["dataset"].metrics
+
+def test_lttb(benchmark, readings):
+    # generator output is already one contiguous run per (location, metric), in date order
+    days = readings["dataset"].days
+    starts = np.arange(0, len(readings["value"]), days)
+    x = readings["date"].astype(np.int64)
+    benchmark.group = "lttb"
+    kept = benchmark(lttb_indices, x, readings["value"], starts, np.full(len(starts), days), 500)
+    assert len(kept) == len(starts) * 500
+
+@pytest.mark.parametrize("rows", [1_000, 50_000])
+@pytest.mark.parametrize("path", [fast_path, model_path], ids=["fast", "model"])
+def test_serialize_climate_page(benchmark, rows, path):
+    data = synthetic_rows(rows)
+    benchmark.group = f"serialize {rows} rows"
+    benchmark(path, data)
@@ -0,0 +1,119 @@
+import argparse
+import statistics
+import time
+from sqlalchemy import text
+from ..dal.engine import engine
+from ..dal.migrations import apply_migrations
+from ..dal.partitions import ensure_partitions
+from ..routes.climate import build_climate_query, parse_filters
+from ..routes.summary import build_summary_query
+from ..routes.trends import TRENDS_QUERY
+
+"""
+Date-bounded read latency as history grows, partitioned vs unpartitioned CLIMATEDATA.
+
+Two throwaway schemas get the same synthetic readings: one migrated to the yearly partitions
+(latest version) and one left at version 6, the last unpartitioned schema, with the same
+indexes. History is added in steps, going back in time, and after every step the route
+queries for one fixed month in the newest year are timed against both schemas.
+
+Everything runs in one transaction that is rolled back, so the dev data is never touched.
+
+`python -m backend.benchmarks.bench_partitions --years 1 4 16`
+"""
+
+PARTITIONED = "bench_partitioned"
+UNPARTITIONED = "bench_unpartitioned"
+METRICS = ["temperature", "precipitation", "humidity", "wind_speed"]
+LATEST_YEAR = 2025
+# one month of the newest year, across every station and for a single station
+WINDOWS = {
+    "metric": {"metric": "temperature", "start_date": f"{LATEST_YEAR}-03-01", "end_date": f"{LATEST_YEAR}-03-31"},
+    "station": {"location_id": 7, "start_date": f"{LATEST_YEAR}-03-01", "end_date": f"{LATEST_YEAR}-03-31"},
+}
+
+INSERT_YEARS = """
+INSERT INTO climatedata (location_id, metric_id, date, value, quality)
+SELECT l, m, d::date, random() * 40, 1 + (l + m) % 4
+FROM generate_series(1, :locations) l,
+    generate_series(1, :metrics) m,
+    generate_series(CAST(:start AS DATE), CAST(:end AS DATE), INTERVAL '1 day') d
+"""
+
+def create_schema(conn, schema: str, target, locations: int):
+    conn.execute(text(f"CREATE SCHEMA {schema}"))
+    conn.execute(text(f"SET LOCAL search_path TO {schema}"))
+    apply_migrations(conn, target)
+    conn.execute(text(
+        "INSERT INTO locations (name, country, latitude, longitude, region) "
+        "SELECT 'station ' || g, 'country', 0, 0, 'region' FROM generate_series(1, :n) g"
+    ), {"n": locations})
+    for name in METRICS:
+        conn.execute(text(
+            "INSERT INTO metrics (name, display_name, unit, description) VALUES (:name, :name, 'unit', '')"
+        ), {"name": name})
+
+def add_years(conn, schema: str, first_year: int, last_year: int, locations: int, partitioned: bool):
+    conn.execute(text(f"SET LOCAL search_path TO {schema}"))
+    if partitioned:
+        ensure_partitions(conn, [f"{year}-01-01" for year in range(first_year, last_year + 1)])
+    conn.execute(text(INSERT_YEARS), {
+        "locations": locations,
+        "metrics": len(METRICS),
+        "start": f"{first_year}-01-01",
+        "end": f"{last_year}-12-31"
+    })
+    conn.execute(text("ANALYZE climatedata"))
+
+def route_queries():
+    queries = {}
+    for window, filters in WINDOWS.items():
+        reading_filters = parse_filters(**filters)
+        climate = build_climate_query(reading_filters).limit(50)
+        queries[f"{window} climate"] = (str(climate.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})), {})
+        queries[f"{window} summary"] = build_summary_query(reading_filters)
+        queries[f"{window} trends"] = (TRENDS_QUERY.format(where=reading_filters.where("c")), reading_filters.params())
+    return queries
+
+def median_ms(conn, schema: str, sql: str, params: dict, repeat: int) -> float:
+    conn.execute(text(f"SET LOCAL search_path TO {schema}"))
+    statement = text(sql)
+    conn.execute(statement, params).all()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(statement, params).all()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Date-bounded read latency as history grows.")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--locations", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    queries = route_queries()
+    print("median ms, partitioned / unpartitioned")
+    print(f"{'years':>6} {'rows':>12} " + " ".join(f"{name:>18}" for name in queries))
+    with engine.connect() as conn:
+        create_schema(conn, PARTITIONED, None, args.locations)
+        create_schema(conn, UNPARTITIONED, 6, args.locations)
+
+        loaded = 0
+        for years in sorted(args.years):
+            first_year = LATEST_YEAR - years + 1
+            last_year = LATEST_YEAR - loaded
+            add_years(conn, PARTITIONED, first_year, last_year, args.locations, partitioned=True)
+            add_years(conn, UNPARTITIONED, first_year, last_year, args.locations, partitioned=False)
+            loaded = years
+
+            rows = conn.execute(text(f"SELECT count(*) FROM {PARTITIONED}.climatedata")).scalar_one()
+            cells = []
+            for sql, params in queries.values():
+                partitioned = median_ms(conn, PARTITIONED, sql, params, args.repeat)
+                unpartitioned = median_ms(conn, UNPARTITIONED, sql, params, args.repeat)
+                cells.append(f"{partitioned:8.2f} / {unpartitioned:7.2f}")
+            print(f"{years:>6} {rows:>12,} " + " ".join(cells))
+
+        conn.rollback()
@@ -0,0 +1,56 @@
+import argparse
+import time
+import numpy as np
+from ..analytics.trends import analyze_columns
+
+"""
+Scaling benchmark for the vectorized trend engine.
+
+Times the single pass over N synthetic readings spread across G (location, metric) series,
+and for sizes where it is still tolerable, the per-metric pandas/scipy loop it replaced.
+
+`python -m backend.benchmarks.bench_trends --rows 100000 1000000 10000000`
+"""
+
+LEGACY_MAX_ROWS = 1_000_000
+
+def synthetic_columns(rows: int, groups: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    group = rng.integers(0, groups, rows)
+    day = rng.integers(0, 3650, rows)
+    dates = np.datetime64("2015-01-01") + day.astype("timedelta64[D]")
+    values = 15 + 0.001 * day + 8 * np.sin(2 * np.pi * day / 365.25) + rng.normal(0, 1, rows)
+    return group, dates, values
+
+def run_engine(group, dates, values, groups: int) -> float:
+    start = time.perf_counter()
+    analyze_columns(group, dates, values, groups)
+    return time.perf_counter() - start
+
+def run_legacy(group, dates, values) -> float:
+    import pandas as pd
+    from scipy import stats
+
+    start = time.perf_counter()
+    df = pd.DataFrame({"group": group, "date": dates, "value": values})
+    for _, frame in df.groupby("group"):
+        x = np.array([i for i in range(len(frame))])
+        stats.linregress(x, frame["value"].values)
+        mean = np.mean(frame["value"])
+        std = np.std(frame["value"])
+        frame[frame["value"] > mean + 2 * std]
+        frame.assign(month=frame["date"].dt.month).groupby("month")["value"].mean()
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmark for the vectorized trend engine.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--groups", type=int, default=60)
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'engine s':>10} {'rows/s':>14} {'legacy s':>10}")
+    for rows in args.rows:
+        columns = synthetic_columns(rows, args.groups)
+        engine_seconds = run_engine(*columns, args.groups)
+        legacy = f"{run_legacy(*columns):10.3f}" if rows <= LEGACY_MAX_ROWS else f"{'-':>10}"
+        print(f"{rows:>12,} {engine_seconds:10.3f} {rows / engine_seconds:14,.0f} {legacy}")
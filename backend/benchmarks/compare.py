@@ -0,0 +1,76 @@
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+"""
+Diffs two result files of benchmarks/load.py, e.g. taken on the base and head commit of a
+change, endpoint by endpoint and concurrency level by concurrency level.
+
+A row is flagged as a regression when throughput drops or p95/p99 latency grows by more
+than --threshold percent. The exit status is 1 when anything regressed, so it can gate CI.
+
+`python -m backend.benchmarks.compare bench-results/load-abc123.json bench-results/load-def456.json`
+
+pytest-benchmark results of benchmarks/bench_micro.py have their own diff:
+`pytest-benchmark compare bench-results/micro-*.json`
+"""
+
+# metric -> whether a higher value is better
+METRICS = {"requests_per_second": True, "p50_ms": False, "p95_ms": False, "p99_ms": False}
+# p50 moves with noise on short runs, so it is reported but never flagged
+GATED = ("requests_per_second", "p95_ms", "p99_ms")
+
+def keyed(report: Dict) -> Dict[Tuple[str, int], Dict]:
+    return {(result["endpoint"], result["clients"]): result for result in report["results"]}
+
+def change(base: float, head: float) -> float:
+    if not base:
+        return 0.0
+    return (head - base) / base * 100
+
+"""
+Returns a line per (endpoint, clients) found in both reports and whether any of them regressed.
+"""
+def compare(base: Dict, head: Dict, threshold: float) -> Tuple[List[str], bool]:
+    base_results, head_results = keyed(base), keyed(head)
+    lines = [f"{'endpoint':<12} {'clients':>7} " + " ".join(f"{metric:>28}" for metric in METRICS)]
+    regressed = False
+    for key in sorted(base_results.keys() & head_results.keys()):
+        cells = []
+        flagged = False
+        for metric, higher_is_better in METRICS.items():
+            before, after = base_results[key][metric], head_results[key][metric]
+            delta = change(before, after)
+            worse = -delta if higher_is_better else delta
+            marker = "!" if metric in GATED and worse > threshold else " "
+            flagged = flagged or marker == "!"
+            cells.append(f"{before:>9} -> {after:>9} {delta:+6.1f}%{marker}")
+        regressed = regressed or flagged
+        endpoint, clients = key
+        lines.append(f"{endpoint:<12} {clients:>7} " + " ".join(f"{cell:>28}" for cell in cells))
+
+    for key in sorted(base_results.keys() ^ head_results.keys()):
+        lines.append(f"{key[0]:<12} {key[1]:>7} only in {'base' if key in base_results else 'head'}")
+    return lines, regressed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diff two load test result files.")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change that counts as a regression")
+    args = parser.parse_args()
+
+    with open(args.base) as file:
+        base = json.load(file)
+    with open(args.head) as file:
+        head = json.load(file)
+
+    print(f"base {base['meta']['commit']} ({base['meta']['readings']:,} readings) -> head {head['meta']['commit']} ({head['meta']['readings']:,} readings)")
+    if base["meta"]["readings"] != head["meta"]["readings"]:
+        print("WARNING: the runs were taken on different datasets")
+    lines, regressed = compare(base, head, args.threshold)
+    print("\n".join(lines))
+    if regressed:
+        print(f"REGRESSED: ! marks a change worse than {args.threshold:g}%")
+    sys.exit(1 if regressed else 0)
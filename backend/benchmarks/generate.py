@@ -0,0 +1,362 @@
+import argparse
+import datetime
+import io
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Sequence, Tuple
+import numpy as np
+from sqlalchemy import Connection, Engine, insert, text
+from ..dal.bulk import CLIMATE_COLUMNS
+from ..dal.models.locations import Locations
+from ..dal.models.metrics import Metrics
+from ..dal.partitions import ensure_partitions
+from ..dal.quality import QUALITY_CODES
+from ..dal.rollups import rebuild_rollups
+
+"""
+Synthetic dataset generator for benchmarks.
+
+Builds L locations x M metrics x Y years of daily readings that look like weather station
+data rather than uniform noise:
+- every metric has a base level, a yearly seasonal cycle, a long-term trend and noise
+- seasons flip between hemispheres and get stronger away from the equator, temperature-like
+  metrics get colder with latitude
+- skewed metrics (precipitation) draw from a gamma distribution, bounded metrics are clipped
+- a small share of readings are spikes of 4-8x the usual spread, mostly flagged with a
+  poorer quality than regular readings
+- qualities follow a configurable mix
+
+Output is deterministic for a given seed and does not depend on --chunk-rows, every location
+draws from its own seeded generator.
+
+Readings are COPYed straight into CLIMATEDATA in chunks, skipping the upsert path, with the
+secondary indexes and foreign keys rebuilt once at the end. The monthly rollups are then
+rebuilt in one pass and the tables ANALYZEd. Start the server with an ENVIRONMENT other
+than "dev" so it neither reseeds nor drops the loaded tables.
+
+`python -m backend.benchmarks.generate --locations 1000 --metrics 20 --years 10 --reset`
+"""
+
+@dataclass(frozen=True)
+class MetricProfile:
+    name: str
+    display_name: str
+    unit: str
+    description: str
+    base: float
+    # seasonal swing at mid latitudes, negative when the metric peaks in winter
+    amplitude: float
+    noise: float
+    # change per year
+    trend: float = 0.0
+    # change per degree of latitude away from the equator
+    lapse: float = 0.0
+    low: float = -np.inf
+    high: float = np.inf
+    # gamma shape for skewed metrics, 0 for normal noise
+    skew: float = 0.0
+
+# NOTE: the first three match data/sample_data.json so the same queries work on both datasets
+METRIC_PROFILES: List[MetricProfile] = [
+    MetricProfile("temperature", "Temperature", "celsius", "Average daily temperature", 28, 10, 2.5, trend=0.03, lapse=-0.45),
+    MetricProfile("precipitation", "Precipitation", "mm", "Daily precipitation amount", 2.6, 0.8, 0, low=0, skew=0.4),
+    MetricProfile("humidity", "Humidity", "percent", "Average daily humidity", 68, -8, 7, low=0, high=100),
+    MetricProfile("wind_speed", "Wind Speed", "km/h", "Average daily wind speed", 14, -3, 4, low=0),
+    MetricProfile("pressure", "Pressure", "hPa", "Mean sea level pressure", 1013, -4, 6),
+    MetricProfile("solar_radiation", "Solar Radiation", "W/m2", "Average daily solar radiation", 190, 110, 40, low=0),
+    MetricProfile("dew_point", "Dew Point", "celsius", "Average daily dew point", 22, 7, 2.5, trend=0.02, lapse=-0.35),
+    MetricProfile("soil_moisture", "Soil Moisture", "percent", "Volumetric soil moisture", 28, -6, 3, low=0, high=60),
+    MetricProfile("soil_temperature", "Soil Temperature", "celsius", "Soil temperature at 10cm", 26, 8, 1.5, trend=0.02, lapse=-0.4),
+    MetricProfile("snow_depth", "Snow Depth", "cm", "Snow depth at observation time", -10, -12, 4, lapse=0.3, low=0),
+    MetricProfile("uv_index", "UV Index", "index", "Daily maximum UV index", 5, 3.5, 1.2, low=0),
+    MetricProfile("visibility", "Visibility", "km", "Average daily visibility", 18, 2, 4, low=0),
+    MetricProfile("cloud_cover", "Cloud Cover", "percent", "Average daily cloud cover", 55, -10, 20, low=0, high=100),
+    MetricProfile("pm25", "PM2.5", "ug/m3", "Fine particulate matter", 14, -5, 6, trend=-0.3, low=0),
+    MetricProfile("pm10", "PM10", "ug/m3", "Coarse particulate matter", 26, -7, 10, trend=-0.4, low=0),
+    MetricProfile("ozone", "Ozone", "ppb", "Ground level ozone", 32, 10, 8, low=0),
+    MetricProfile("no2", "Nitrogen Dioxide", "ppb", "Nitrogen dioxide", 18, -6, 6, trend=-0.3, low=0),
+    MetricProfile("co2", "Carbon Dioxide", "ppm", "Atmospheric carbon dioxide", 415, -3, 2, trend=2.3),
+    MetricProfile("evaporation", "Evaporation", "mm", "Daily pan evaporation", 3.5, 2.5, 1, low=0),
+    MetricProfile("sea_surface_temperature", "Sea Surface Temperature", "celsius", "Nearby sea surface temperature", 29, 4, 0.8, trend=0.02, lapse=-0.3),
+]
+
+COUNTRIES = ["USA", "Japan", "Brazil", "India", "Kenya", "Norway", "Australia", "Mexico", "Germany", "Chile"]
+
+# share of each quality, poorest first, for regular readings and for anomalies
+QUALITY_MIX = (0.05, 0.15, 0.45, 0.35)
+ANOMALY_QUALITY_MIX = (0.45, 0.35, 0.15, 0.05)
+
+# memory for the index builds at the end of a load
+MAINTENANCE_WORK_MEM = "512MB"
+
+# day of year with the warmest northern hemisphere weather
+PEAK_DAY = 200
+
+@dataclass(frozen=True)
+class Dataset:
+    locations: int = 1000
+    metrics: int = 20
+    years: int = 10
+    end_year: int = 2025
+    seed: int = 0
+    anomaly_rate: float = 0.002
+    quality_mix: Tuple[float, ...] = QUALITY_MIX
+
+    @property
+    def first_date(self) -> datetime.date:
+        return datetime.date(self.end_year - self.years + 1, 1, 1)
+
+    @property
+    def last_date(self) -> datetime.date:
+        return datetime.date(self.end_year, 12, 31)
+
+    @property
+    def days(self) -> int:
+        return (self.last_date - self.first_date).days + 1
+
+    @property
+    def rows(self) -> int:
+        return self.locations * self.metrics * self.days
+
+"""
+Returns the profile of each metric, cycling through METRIC_PROFILES with a numbered suffix
+when more metrics are asked for than there are profiles.
+"""
+def metric_profiles(count: int) -> List[MetricProfile]:
+    profiles = []
+    for index in range(count):
+        profile = METRIC_PROFILES[index % len(METRIC_PROFILES)]
+        copy = index // len(METRIC_PROFILES)
+        if copy:
+            profile = MetricProfile(**{
+                **profile.__dict__,
+                "name": f"{profile.name}_{copy + 1}",
+                "display_name": f"{profile.display_name} {copy + 1}"
+            })
+        profiles.append(profile)
+    return profiles
+
+def generate_locations(dataset: Dataset) -> List[dict]:
+    rng = np.random.default_rng([dataset.seed, 0])
+    # uniform over the sphere's area, away from the poles
+    latitudes = np.degrees(np.arcsin(rng.uniform(-0.9, 0.9, dataset.locations)))
+    longitudes = rng.uniform(-180, 180, dataset.locations)
+    return [
+        {
+            "name": f"Station {index + 1:04d}",
+            "country": COUNTRIES[index % len(COUNTRIES)],
+            "latitude": round(float(latitude), 4),
+            "longitude": round(float(longitude), 4),
+            "region": f"Region {index // len(COUNTRIES) % 8 + 1}"
+        }
+        for index, (latitude, longitude) in enumerate(zip(latitudes, longitudes))
+    ]
+
+"""
+Generates every reading of one location as (metrics x days) arrays of values and quality
+ordinals.
+"""
+def location_readings(dataset: Dataset, profiles: Sequence[MetricProfile], index: int, latitude: float) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng([dataset.seed, 1, index])
+    days = np.arange(dataset.days)
+    dates = np.datetime64(dataset.first_date) + days
+    day_of_year = (dates - dates.astype("datetime64[Y]")).astype(np.int64)
+    hemisphere = 1.0 if latitude >= 0 else -1.0
+    season = hemisphere * np.cos(2 * np.pi * (day_of_year - PEAK_DAY) / 365.25)
+    # seasons are mild at the equator and strong at high latitudes
+    season_scale = 0.25 + abs(latitude) / 60
+
+    def column(attribute: str) -> np.ndarray:
+        return np.array([getattr(profile, attribute) for profile in profiles], dtype=np.float64)[:, None]
+
+    shape = (len(profiles), len(days))
+    mean = column("base") + column("lapse") * abs(latitude) \
+        + column("amplitude") * season_scale * season \
+        + column("trend") * (days / 365.25)
+
+    skew = column("skew")
+    skewed = skew[:, 0] > 0
+    values = mean + column("noise") * rng.standard_normal(shape)
+    if skewed.any():
+        shape_parameter = skew[skewed]
+        values[skewed] = np.maximum(mean[skewed], 0) * rng.gamma(shape_parameter, 1 / shape_parameter, (skewed.sum(), len(days)))
+
+    anomalies = rng.random(shape) < dataset.anomaly_rate
+    spread = np.where(skewed[:, None], np.abs(mean), column("noise"))
+    spikes = rng.choice([-1.0, 1.0], shape) * rng.uniform(4, 8, shape) * spread
+    values = np.clip(np.where(anomalies, values + spikes, values), column("low"), column("high"))
+
+    quality = np.where(
+        anomalies,
+        rng.choice(len(QUALITY_CODES), shape, p=ANOMALY_QUALITY_MIX),
+        rng.choice(len(QUALITY_CODES), shape, p=dataset.quality_mix)
+    ) + 1
+    return values, quality.astype(np.int16)
+
+"""
+Yields the readings of consecutive runs of locations as column arrays, about `chunk_rows`
+readings at a time. `group` numbers the (location, metric) series as location * metrics + metric.
+"""
+def generate_readings(dataset: Dataset, chunk_rows: int = 1_000_000) -> Iterator[Dict[str, np.ndarray]]:
+    profiles = metric_profiles(dataset.metrics)
+    latitudes = [location["latitude"] for location in generate_locations(dataset)]
+    per_location = dataset.metrics * dataset.days
+    dates = np.datetime64(dataset.first_date) + np.arange(dataset.days)
+    step = max(1, chunk_rows // per_location)
+
+    for first in range(0, dataset.locations, step):
+        indices = range(first, min(first + step, dataset.locations))
+        readings = [location_readings(dataset, profiles, index, latitudes[index]) for index in indices]
+        yield {
+            "location": np.repeat(np.array(indices), per_location),
+            "metric": np.tile(np.repeat(np.arange(dataset.metrics), dataset.days), len(indices)),
+            "date": np.tile(dates, dataset.metrics * len(indices)),
+            "value": np.concatenate([values.ravel() for values, _ in readings]),
+            "quality": np.concatenate([quality.ravel() for _, quality in readings]),
+        }
+
+# NOTE: pandas comes from requirements-bench.txt and is only imported when a dataset is loaded,
+# the generator itself is exercised by the regular test run
+def readings_frame(readings: Dict[str, np.ndarray], location_ids: np.ndarray, metric_ids: np.ndarray) -> "pd.DataFrame":
+    import pandas as pd
+
+    # each distinct date is formatted once instead of once per reading
+    dates, codes = np.unique(readings["date"], return_inverse=True)
+    return pd.DataFrame({
+        "location_id": location_ids[readings["location"]],
+        "metric_id": metric_ids[readings["metric"]],
+        "date": pd.Categorical.from_codes(codes, np.datetime_as_string(dates)),
+        "value": readings["value"],
+        "quality": readings["quality"],
+    })
+
+COPY_CLIMATEDATA = f"COPY climatedata ({', '.join(CLIMATE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+RESET_TABLES = "TRUNCATE climatedata, climate_rollup_monthly, locations, metrics RESTART IDENTITY CASCADE"
+
+HAS_DATA = "SELECT EXISTS (SELECT 1 FROM locations) OR EXISTS (SELECT 1 FROM metrics) OR EXISTS (SELECT 1 FROM climatedata)"
+
+# indexes not backing the primary key, and the foreign keys
+SECONDARY_INDEXES = """
+SELECT i.relname AS name, pg_get_indexdef(i.oid) AS definition
+FROM pg_index x
+JOIN pg_class i ON i.oid = x.indexrelid
+WHERE x.indrelid = 'climatedata'::regclass
+    AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+"""
+
+FOREIGN_KEYS = """
+SELECT conname AS name, pg_get_constraintdef(oid) AS definition
+FROM pg_constraint
+WHERE conrelid = 'climatedata'::regclass AND contype = 'f'
+"""
+
+"""
+Drops the secondary indexes and foreign keys of CLIMATEDATA and returns the statements that
+put them back.
+
+NOTE: checking the foreign keys row by row and growing four indexes per reading costs far
+more than the COPY itself, building them once over the loaded table is several times faster.
+The definitions are read from the catalog so they always match what the migrations created.
+"""
+def drop_load_constraints(conn: Connection) -> List[str]:
+    indexes = conn.execute(text(SECONDARY_INDEXES)).all()
+    foreign_keys = conn.execute(text(FOREIGN_KEYS)).all()
+    for index in indexes:
+        conn.execute(text(f"DROP INDEX {index.name}"))
+    for foreign_key in foreign_keys:
+        conn.execute(text(f"ALTER TABLE climatedata DROP CONSTRAINT {foreign_key.name}"))
+    # a partitioned parent's definition reads ON ONLY, which would skip the partitions
+    return [index.definition.replace(" ON ONLY ", " ON ") for index in indexes] + [
+        f"ALTER TABLE climatedata ADD CONSTRAINT {foreign_key.name} {foreign_key.definition}" for foreign_key in foreign_keys
+    ]
+
+"""
+Loads the dataset into an empty, migrated database, or wipes the existing data first with
+`reset`. Runs in one transaction, so a failed load leaves the database as it was.
+
+Returns the number of readings loaded.
+"""
+def load(engine: Engine, dataset: Dataset, reset: bool = False, chunk_rows: int = 1_000_000, progress=print) -> int:
+    profiles = metric_profiles(dataset.metrics)
+    with engine.begin() as conn:
+        if reset:
+            conn.execute(text(RESET_TABLES))
+        elif conn.execute(text(HAS_DATA)).scalar_one():
+            raise ValueError("database already has data, pass reset=True (--reset) to replace it")
+
+        location_ids = conn.execute(
+            insert(Locations).returning(Locations.id, sort_by_parameter_order=True), generate_locations(dataset)
+        ).scalars().all()
+        metric_ids = conn.execute(
+            insert(Metrics).returning(Metrics.id, sort_by_parameter_order=True),
+            [{"name": p.name, "display_name": p.display_name, "unit": p.unit, "description": p.description} for p in profiles]
+        ).scalars().all()
+        ensure_partitions(conn, [datetime.date(year, 1, 1) for year in range(dataset.first_date.year, dataset.end_year + 1)])
+        restore = drop_load_constraints(conn)
+
+        location_ids, metric_ids = np.array(location_ids), np.array(metric_ids)
+        loaded = 0
+        start = time.perf_counter()
+        cursor = conn.connection.cursor()
+        try:
+            for readings in generate_readings(dataset, chunk_rows):
+                buffer = io.StringIO()
+                readings_frame(readings, location_ids, metric_ids).to_csv(buffer, header=False, index=False, float_format="%.3f")
+                buffer.seek(0)
+                cursor.copy_expert(COPY_CLIMATEDATA, buffer)
+                loaded += len(readings["value"])
+                progress(f"LOADED {loaded:,} / {dataset.rows:,} READINGS ({loaded / (time.perf_counter() - start):,.0f}/s)")
+        finally:
+            cursor.close()
+
+        progress("BUILDING INDEXES...")
+        conn.execute(text(f"SET LOCAL maintenance_work_mem = '{MAINTENANCE_WORK_MEM}'"))
+        for statement in restore:
+            conn.execute(text(statement))
+        progress("REBUILDING ROLLUPS...")
+        rebuild_rollups(conn)
+
+    progress("ANALYZING...")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE locations, metrics, climatedata, climate_rollup_monthly"))
+    return loaded
+
+if __name__ == "__main__":
+    from ..cache import bump_data_version
+    from ..dal.engine import engine
+    from ..dal.migrations import migrate
+
+    defaults = Dataset()
+    parser = argparse.ArgumentParser(description="Load a synthetic climate dataset into Postgres.")
+    parser.add_argument("--locations", type=int, default=defaults.locations)
+    parser.add_argument("--metrics", type=int, default=defaults.metrics)
+    parser.add_argument("--years", type=int, default=defaults.years)
+    parser.add_argument("--end-year", type=int, default=defaults.end_year)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--anomaly-rate", type=float, default=defaults.anomaly_rate, help="share of readings that are spikes")
+    parser.add_argument("--quality-mix", type=float, nargs=len(QUALITY_CODES), default=list(QUALITY_MIX),
+                        metavar=tuple(QUALITY_CODES), help="share of each quality, poorest first")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000, help="readings per COPY")
+    parser.add_argument("--reset", action="store_true", help="wipe locations, metrics and readings first")
+    args = parser.parse_args()
+
+    mix = np.array(args.quality_mix, dtype=np.float64)
+    dataset = Dataset(
+        locations=args.locations,
+        metrics=args.metrics,
+        years=args.years,
+        end_year=args.end_year,
+        seed=args.seed,
+        anomaly_rate=args.anomaly_rate,
+        quality_mix=tuple((mix / mix.sum()).tolist())
+    )
+    print(f"GENERATING {dataset.rows:,} READINGS: {dataset.locations} locations x {dataset.metrics} metrics x {dataset.days} days")
+    migrate(engine)
+    try:
+        load(engine, dataset, reset=args.reset, chunk_rows=args.chunk_rows)
+    except ValueError as error:
+        parser.exit(1, f"{error}\n")
+    # only reaches servers that share the version through CACHE_URL
+    bump_data_version()
+    print("DONE")
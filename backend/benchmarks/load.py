@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from typing import Dict, List, Optional
+import httpx
+
+"""
+HTTP load generator for the read endpoints.
+
+Runs C concurrent clients, each issuing requests back to back for a fixed duration, and
+reports throughput and latency percentiles per concurrency level. By default every endpoint
+is run on its own so each gets its own numbers, `--mixed` interleaves them instead.
+
+Paths are templates: `{location}` is replaced with a random location id from
+/api/v1/locations on every request, so with a large dataset (benchmarks/generate.py) the
+response cache only helps as much as it would for real traffic. Start the server with
+CACHE_ENABLED=false to measure uncached latency.
+
+`--output` writes the results with the commit, dataset size and settings they were taken
+with, so runs on two commits can be diffed with benchmarks/compare.py:
+
+`ENVIRONMENT=bench fastapi run backend/app.py`
+`python -m backend.benchmarks.load --clients 10 50 --output bench-results/load-$(git rev-parse --short HEAD).json`
+
+Compare the sync and async DB layers by starting the server once per DB_ASYNC value.
+"""
+
+# endpoint name -> path template
+DEFAULT_ENDPOINTS = {
+    "locations": "/api/v1/locations",
+    "climate": "/api/v1/climate?location_id={location}&per_page=50",
+    "summary": "/api/v1/summary?location_id={location}",
+    "trends": "/api/v1/trends?location_id={location}&metric=temperature",
+    "series": "/api/v1/series?location_id={location}&metric=temperature&points=500",
+    "dashboard": "/api/v1/dashboard?location_id={location}&metric=temperature&start_date=2025-01-01&end_date=2025-12-31",
+}
+
+def percentile(latencies: List[float], q: float) -> float:
+    if not latencies:
+        return 0.0
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def client_loop(client: httpx.AsyncClient, paths: List[str], location_ids: List[int], deadline: float, latencies: List[float], errors: List[int], offset: int):
+    rng = random.Random(offset)
+    index = offset
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)].format(location=rng.choice(location_ids))
+        index += 1
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError:
+            errors.append(0)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+async def run_level(base_url: str, paths: List[str], location_ids: List[int], clients: int, duration: float) -> Dict:
+    latencies: List[float] = []
+    errors: List[int] = []
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(
+            client_loop(client, paths, location_ids, deadline, latencies, errors, offset)
+            for offset in range(clients)
+        ))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+    }
+
+def git_revision() -> Optional[str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+"""
+Location ids to substitute into the path templates and the total number of readings.
+"""
+async def dataset_info(base_url: str) -> Dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        locations = (await client.get("/api/v1/locations")).raise_for_status().json()
+        climate = (await client.get("/api/v1/climate?per_page=1")).raise_for_status().json()
+    return {"location_ids": [location["id"] for location in locations], "readings": climate["meta"]["total_count"]}
+
+async def main(base_url: str, endpoints: Dict[str, str], levels: List[int], duration: float, mixed: bool) -> Dict:
+    dataset = await dataset_info(base_url)
+    if not dataset["location_ids"]:
+        raise SystemExit("no locations, seed or generate a dataset first")
+
+    scenarios = {"mixed": list(endpoints.values())} if mixed else {name: [path] for name, path in endpoints.items()}
+    results = []
+    for name, paths in scenarios.items():
+        for clients in levels:
+            result = {"endpoint": name, **await run_level(base_url, paths, dataset["location_ids"], clients, duration)}
+            print(json.dumps(result))
+            results.append(result)
+
+    return {
+        "meta": {
+            "commit": git_revision(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "base_url": base_url,
+            "duration": duration,
+            "python": platform.python_version(),
+            "locations": len(dataset["location_ids"]),
+            "readings": dataset["readings"],
+            "endpoints": endpoints,
+        },
+        "results": results,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP load generator for the read endpoints.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per endpoint and concurrency level")
+    parser.add_argument("--endpoint", action="append", dest="endpoints", choices=list(DEFAULT_ENDPOINTS), help="repeatable, defaults to all")
+    parser.add_argument("--path", action="append", dest="paths", help="repeatable extra path template, named by its path")
+    parser.add_argument("--mixed", action="store_true", help="interleave the endpoints in one run instead of one run each")
+    parser.add_argument("--output", help="write the results and run metadata to this JSON file")
+    args = parser.parse_args()
+
+    endpoints = {name: DEFAULT_ENDPOINTS[name] for name in args.endpoints or ([] if args.paths else DEFAULT_ENDPOINTS)}
+    endpoints.update({path: path for path in args.paths or []})
+
+    report = asyncio.run(main(args.base_url, endpoints, args.clients, args.duration, args.mixed))
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"WROTE {args.output}")
@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urlencode
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from .dal.engine import DB_READ_STICKY_SECONDS, reads_may_lag
+from .instrumentation import profiling
+from .routes.responses import dumps
+
+"""
+Response cache for the read endpoints.
+
+Responses are cached as serialized JSON bodies keyed on the request path, the normalized query
+parameters and the current data version. Every write path bumps the data version, so entries
+written before it can never be read again and simply age out of the LRU; nothing has to be
+deleted explicitly.
+
+Two tiers:
+1. a bounded in-process LRU, always on
+2. an optional shared backend (Redis when CACHE_URL is set) so workers share entries and the
+   data version. LocalBackend implements the same interface in memory and stands in for it in
+   tests or single process deployments.
+
+Without CACHE_URL every worker has its own data version and never sees the writes served by
+the others, so in-process entries expire after CACHE_LOCAL_TTL_SECONDS, which bounds how
+stale a response can be on a multi-worker deployment.
+
+Every cached response carries an ETag (a hash of the body) and a Cache-Control header, and
+`If-None-Match` is answered with 304 without sending the body again.
+"""
+
+load_dotenv()
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 256))
+# lifetime of entries in the shared backend, the data version is what keeps them correct
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", 3600))
+# lifetime of in-process entries without CACHE_URL, when other workers' writes go unseen
+CACHE_LOCAL_TTL_SECONDS = float(os.getenv("CACHE_LOCAL_TTL_SECONDS", 30))
+# browser max-age, 0 makes clients revalidate with If-None-Match on every poll
+CACHE_MAX_AGE_SECONDS = int(os.getenv("CACHE_MAX_AGE_SECONDS", 0))
+# e.g. redis://localhost:6379/0, unset keeps the cache in-process
+CACHE_URL = os.getenv("CACHE_URL")
+
+DATA_VERSION_KEY = "ecovision:data_version"
+ENTRY_PREFIX = "ecovision:response:"
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+
+    @classmethod
+    def of(cls, body: bytes) -> "CachedResponse":
+        return cls(body=body, etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+
+"""
+Thread safe LRU bounded by entry count. With a `ttl` entries also expire that many seconds
+after they were set.
+"""
+class LRUCache:
+    def __init__(self, max_entries: int, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and time.monotonic() >= expires:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            expires = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+"""
+In memory implementation of the shared backend interface (get, set, incr, get_int).
+"""
+class LocalBackend:
+    def __init__(self):
+        self._values: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._values.get(key)
+
+    def set(self, key: str, value: bytes, ttl: int):
+        self._values[key] = value
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + 1
+            return self._values[key]
+
+    def get_int(self, key: str) -> int:
+        return int(self._values.get(key, 0))
+
+"""
+Redis implementation of the shared backend interface.
+
+NOTE: redis is only imported when CACHE_URL is set, in-process deployments don't need it installed.
+"""
+class RedisBackend:
+    def __init__(self, url: str):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: int):
+        self._client.set(key, value, ex=ttl)
+
+    def incr(self, key: str) -> int:
+        return int(self._client.incr(key))
+
+    def get_int(self, key: str) -> int:
+        return int(self._client.get(key) or 0)
+
+local = LRUCache(CACHE_MAX_ENTRIES, ttl=None if CACHE_URL else CACHE_LOCAL_TTL_SECONDS)
+shared = RedisBackend(CACHE_URL) if CACHE_URL else None
+
+_local_version = 0
+_version_lock = threading.Lock()
+# the newest data version this process has seen and when it first saw it
+_newest_version = (0, 0.0)
+_inflight: Dict[str, asyncio.Future] = {}
+
+def data_version() -> int:
+    if shared is not None:
+        return shared.get_int(DATA_VERSION_KEY)
+    return _local_version
+
+"""
+Invalidates every cached response. Called by all paths that write readings, locations or metrics.
+"""
+def bump_data_version() -> int:
+    global _local_version
+    with _version_lock:
+        _local_version += 1
+        version = _local_version
+    if shared is not None:
+        version = shared.incr(DATA_VERSION_KEY)
+    return version
+
+"""
+Whether a response computed now may be stored under `version`.
+
+With read replicas, responses computed within DB_READ_STICKY_SECONDS of a data version change
+are served but not stored: a replica still replaying the write would otherwise pin its stale
+answer under the new version until the entry ages out.
+"""
+def storable(version: int) -> bool:
+    global _newest_version
+    if not reads_may_lag():
+        return True
+    with _version_lock:
+        if version > _newest_version[0]:
+            _newest_version = (version, time.monotonic())
+        seen_at = _newest_version[1] if version == _newest_version[0] else 0.0
+    return time.monotonic() - seen_at >= DB_READ_STICKY_SECONDS
+
+"""
+Builds the cache key from the path and the query parameters, sorted and without empty values
+so equivalent requests share an entry.
+"""
+def cache_key(request: Request) -> str:
+    params = sorted((name, value) for name, value in request.query_params.multi_items() if value != "")
+    return f"{request.url.path}?{urlencode(params)}"
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    candidates = [candidate.strip().removeprefix("W/") for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def to_response(request: Request, entry: CachedResponse) -> Response:
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": f"public, max-age={CACHE_MAX_AGE_SECONDS}, must-revalidate",
+    }
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+async def _lookup(key: str) -> Optional[CachedResponse]:
+    entry = local.get(key)
+    if entry is None and shared is not None:
+        stored = await run_in_threadpool(shared.get, ENTRY_PREFIX + key)
+        if stored is not None:
+            entry = CachedResponse.of(stored)
+            local.set(key, entry)
+    return entry
+
+async def _store(key: str, entry: CachedResponse):
+    local.set(key, entry)
+    if shared is not None:
+        await run_in_threadpool(shared.set, ENTRY_PREFIX + key, entry.body, CACHE_TTL_SECONDS)
+
+"""
+Serves the request from the cache, calling `compute` to build the content on a miss.
+
+Concurrent misses for the same key wait on the first computation instead of all querying
+Postgres. Errors raised by `compute` propagate to every waiter and are not cached.
+"""
+async def cached_json(request: Request, compute: Callable[[], Awaitable[Any]]) -> Response:
+    # profiled requests need to run the real work
+    if not CACHE_ENABLED or profiling():
+        return to_response(request, CachedResponse.of(dumps(await compute())))
+
+    version = await run_in_threadpool(data_version) if shared is not None else _local_version
+    key = f"v{version}:{cache_key(request)}"
+
+    entry = await _lookup(key)
+    if entry is not None:
+        return to_response(request, entry)
+
+    pending = _inflight.get(key)
+    if pending is not None:
+        return to_response(request, await asyncio.shield(pending))
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        entry = CachedResponse.of(dumps(await compute()))
+        if storable(version):
+            await _store(key, entry)
+        future.set_result(entry)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as error:
+        future.set_exception(error)
+        # marks the exception as retrieved when nobody else was waiting
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
+    return to_response(request, entry)
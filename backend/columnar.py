@@ -0,0 +1,125 @@
+import io
+from typing import Dict, Iterable, Iterator, List, Sequence
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+"""
+Columnar (Arrow IPC stream / Parquet) encoders for climate exports.
+
+Row chunks from a server-side cursor are transposed into Arrow record batches one chunk at a
+time and written to an in-memory sink that is drained after every batch, so an export of any
+size only ever holds one chunk (one row group for Parquet) in memory.
+
+The repetitive text columns are dictionary encoded. Their dictionaries only ever grow, so codes
+stay stable across batches and the IPC stream sends each new value once as a dictionary delta.
+"""
+
+DICTIONARY = pa.dictionary(pa.int32(), pa.string())
+
+FIELD_TYPES = {
+    "id": pa.int64(),
+    "location_id": pa.int32(),
+    "location_name": DICTIONARY,
+    "latitude": pa.float64(),
+    "longitude": pa.float64(),
+    "date": pa.date32(),
+    "metric": DICTIONARY,
+    "value": pa.float64(),
+    "unit": DICTIONARY,
+    "quality": DICTIONARY,
+}
+
+# Parquet readers do best with row groups far larger than one cursor chunk
+PARQUET_ROW_GROUP_ROWS = 100_000
+
+"""
+Assigns stable int32 codes to the values of one column across every batch of an export.
+"""
+class DictionaryEncoder:
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def _add(self, value: str) -> int:
+        self.codes[value] = len(self.values)
+        self.values.append(value)
+        return self.codes[value]
+
+    def encode(self, column: Sequence[str]) -> pa.DictionaryArray:
+        codes = self.codes
+        indices = [codes[value] if value in codes else self._add(value) for value in column]
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(self.values, pa.string()))
+
+"""
+Write-only file object that hands back what was written since the last drain.
+
+NOTE: tell() keeps counting across drains, the Parquet writer records absolute offsets.
+"""
+class ChunkSink(io.RawIOBase):
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def climate_schema(columns: Sequence[str]) -> pa.Schema:
+    return pa.schema([(name, FIELD_TYPES[name]) for name in columns])
+
+"""
+Transposes row chunks into record batches of the given schema.
+"""
+def record_batches(chunks: Iterable[Sequence[tuple]], schema: pa.Schema) -> Iterator[pa.RecordBatch]:
+    encoders = {field.name: DictionaryEncoder() for field in schema if field.type == DICTIONARY}
+    for rows in chunks:
+        if not rows:
+            continue
+        arrays = []
+        for field, column in zip(schema, zip(*rows)):
+            if field.name in encoders:
+                arrays.append(encoders[field.name].encode(column))
+            else:
+                arrays.append(pa.array(column, field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def arrow_stream(chunks: Iterable[Sequence[tuple]], columns: Sequence[str]) -> Iterator[bytes]:
+    schema = climate_schema(columns)
+    sink = ChunkSink()
+    options = ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    with ipc.new_stream(sink, schema, options=options) as writer:
+        yield sink.drain()
+        for batch in record_batches(chunks, schema):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+def parquet_file(chunks: Iterable[Sequence[tuple]], columns: Sequence[str]) -> Iterator[bytes]:
+    schema = climate_schema(columns)
+    sink = ChunkSink()
+    pending: List[pa.RecordBatch] = []
+    pending_rows = 0
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for batch in record_batches(chunks, schema):
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows >= PARQUET_ROW_GROUP_ROWS:
+                writer.write_table(pa.Table.from_batches(pending, schema=schema))
+                pending, pending_rows = [], 0
+                yield sink.drain()
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending, schema=schema))
+    yield sink.drain()
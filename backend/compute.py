@@ -0,0 +1,215 @@
+import asyncio
+import importlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional, Sequence
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+import numpy as np
+from .instrumentation import profiling, timed
+
+"""
+Process pool for CPU-bound analysis.
+
+NumPy releases the GIL inside its kernels, but the Python glue around them (grouping,
+formatting, building response dicts) does not, so a couple of large trend requests on the
+threadpool still slow down every other endpoint. Large inputs are therefore handed to a
+bounded pool of worker processes instead, split into partitions of whole groups (e.g. one
+or more metrics each) so a wide request is spread over several cores.
+
+- At most COMPUTE_MAX_PENDING requests may have work in the pool, any more get a 503 with
+  Retry-After instead of queueing up behind it.
+- A request waits at most COMPUTE_TIMEOUT_SECONDS for its partitions and gets a 504 after
+  that. Partitions that have not started yet are cancelled, running ones keep their slot
+  until they finish, so the limit always reflects the work actually in the pool.
+- Inputs below COMPUTE_MIN_ROWS stay on the threadpool, where shipping the arrays to a
+  process would cost more than the work.
+- When a worker dies (e.g. OOM killed) the request that finds the pool broken gets a 503 and
+  the pool is replaced in the background, analysis stays on the threadpool until it's warm.
+
+The pool is started in the background and shut down by the app lifespan. With COMPUTE_WORKERS=0, in tests and
+in profiled requests everything runs through `offload` as before.
+"""
+
+load_dotenv()
+
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", 0))
+COMPUTE_MAX_PENDING = int(os.getenv("COMPUTE_MAX_PENDING", max(COMPUTE_WORKERS, 1) * 4))
+COMPUTE_TIMEOUT_SECONDS = float(os.getenv("COMPUTE_TIMEOUT_SECONDS", 30))
+COMPUTE_MIN_ROWS = int(os.getenv("COMPUTE_MIN_ROWS", 50_000))
+
+# seconds a client is asked to wait when the pool is saturated
+RETRY_AFTER_SECONDS = 1
+
+_pool: Optional[ProcessPoolExecutor] = None
+_workers = 0
+# requests with partitions still in the pool, only touched on the event loop
+_pending = 0
+# held while a broken pool is replaced, so shutdown can't race the new workers
+_restart_lock = threading.Lock()
+_restart: Optional[asyncio.Task] = None
+
+def _import_modules(modules: Sequence[str]):
+    for module in modules:
+        importlib.import_module(module)
+
+def _ready() -> bool:
+    return True
+
+"""
+Starts the worker processes and imports `warm_up` modules in each of them, so the first
+request doesn't pay for process startup. Blocks until they are up, the app runs it as a
+background startup task. Falls back to the threadpool if they can't start.
+"""
+def start_pool(workers: int = COMPUTE_WORKERS, warm_up: Sequence[str] = ("backend.routes.trends",)):
+    global _pool, _workers
+    if workers <= 0 or _pool is not None:
+        return
+    # NOTE: spawn, forking a process that already runs an event loop and DB pools is not safe
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_import_modules,
+        initargs=(tuple(warm_up),)
+    )
+    try:
+        for future in [pool.submit(_ready) for _ in range(workers)]:
+            future.result()
+    except BrokenProcessPool:
+        # e.g. the app was started from a script without an `if __name__ == "__main__"` guard
+        print("COMPUTE WORKERS FAILED TO START, ANALYSIS STAYS ON THE THREADPOOL")
+        pool.shutdown(wait=True, cancel_futures=True)
+        return
+    # only published once warm, requests before that stay on the threadpool
+    _pool, _workers = pool, workers
+
+def shutdown_pool():
+    global _pool, _workers
+    with _restart_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool, _workers = None, 0
+
+"""
+Replaces `broken` with a new pool of as many workers. It's unpublished right away, so
+pool_partitions keeps new work on the threadpool, and the blocking shutdown and warm up run
+on the threadpool instead of the event loop. Requests that find the same broken pool later
+don't restart it again.
+"""
+def restart_pool(broken: ProcessPoolExecutor):
+    global _pool, _workers, _restart
+    if _pool is not broken:
+        return
+    workers = _workers
+    _pool, _workers = None, 0
+
+    def replace():
+        with _restart_lock:
+            broken.shutdown(wait=True, cancel_futures=True)
+            start_pool(workers)
+
+    _restart = asyncio.get_running_loop().create_task(run_in_threadpool(replace), name="compute restart")
+
+def workers_restarted() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Analysis workers restarted, retry shortly",
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
+
+def pending() -> int:
+    return _pending
+
+"""
+Number of partitions to split `rows` rows of work into, 0 when it should stay on the
+threadpool.
+"""
+def pool_partitions(rows: int) -> int:
+    if _pool is None or rows < COMPUTE_MIN_ROWS or profiling():
+        return 0
+    return _workers
+
+"""
+Splits row positions into at most `parts` partitions of whole groups, balanced by row count.
+Groups are assigned largest first to the partition with the fewest rows so far.
+"""
+def split_groups(keys: np.ndarray, parts: int) -> List[np.ndarray]:
+    if keys.dtype.kind in "iu" and len(keys) and 0 <= keys.min() and keys.max() < 1 << 16:
+        # small integer ids (metrics, locations) are counted without sorting the rows
+        counts = np.bincount(keys)
+        codes = np.flatnonzero(counts)
+        counts = counts[codes]
+    else:
+        codes, keys, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        codes = np.arange(len(codes))
+
+    parts = max(1, min(parts, len(codes)))
+    if parts == 1:
+        return [np.arange(len(keys))]
+
+    loads = [0] * parts
+    part_of_code = np.zeros(codes[-1] + 1, dtype=np.int64)
+    for index in np.argsort(-counts, kind="stable"):
+        target = loads.index(min(loads))
+        part_of_code[codes[index]] = target
+        loads[target] += counts[index]
+
+    part_of_row = part_of_code[keys]
+    return [np.flatnonzero(part_of_row == part) for part in range(parts)]
+
+"""
+Runs `function(*arguments)` for every argument tuple in the process pool and returns the
+results in order. Raises 503 when the pool is saturated and 504 when the results don't come
+back within COMPUTE_TIMEOUT_SECONDS.
+"""
+async def run_in_pool(function: Callable, arguments: List[tuple]) -> List[Any]:
+    global _pending
+    if _pending >= COMPUTE_MAX_PENDING:
+        raise HTTPException(
+            status_code=503,
+            detail="Analysis capacity is saturated, retry shortly",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+
+    loop = asyncio.get_running_loop()
+    pool = _pool
+    if pool is None:
+        # replaced by a restart since the caller partitioned its work
+        raise workers_restarted()
+    with timed("compute"):
+        try:
+            futures = [pool.submit(function, *args) for args in arguments]
+        except BrokenProcessPool:
+            restart_pool(pool)
+            raise workers_restarted()
+
+        # the slot is freed once every partition has finished or was cancelled, not when the request gives up
+        _pending += 1
+        left = [len(futures)]
+        def partition_done():
+            global _pending
+            left[0] -= 1
+            if not left[0]:
+                _pending -= 1
+        for future in futures:
+            future.add_done_callback(lambda _: loop.call_soon_threadsafe(partition_done))
+
+        waiters = [asyncio.wrap_future(future) for future in futures]
+        _, not_done = await asyncio.wait(waiters, timeout=COMPUTE_TIMEOUT_SECONDS)
+        if not_done:
+            for future in futures:
+                future.cancel()
+            for waiter in not_done:
+                # nobody reads the late results, retrieve them so they aren't logged as lost
+                waiter.add_done_callback(lambda waiter: waiter.cancelled() or waiter.exception())
+            raise HTTPException(status_code=504, detail=f"Analysis took longer than {COMPUTE_TIMEOUT_SECONDS:g}s")
+        try:
+            return [waiter.result() for waiter in waiters]
+        except BrokenProcessPool:
+            # a worker died while running a partition
+            restart_pool(pool)
+            raise workers_restarted()
@@ -0,0 +1,118 @@
+import csv
+import io
+import datetime
+from typing import Dict, Iterable, List, Sequence, Tuple
+from sqlalchemy import Connection, Engine, Row, text
+from .partitions import ensure_partitions
+from .rollups import refresh_rollups_from_staging
+
+"""
+Bulk writes into CLIMATEDATA.
+
+Rows are streamed into a temporary staging table with Postgres COPY and then merged in a
+single INSERT ... ON CONFLICT, so a batch costs one transaction and a handful of round
+trips no matter how many readings it holds. Re-sending a reading for the same
+(location_id, metric_id, date) overwrites it instead of creating a duplicate.
+The monthly rollups for the touched months are refreshed in the same transaction, and the
+yearly partitions the batch falls into are created first when missing.
+"""
+
+CLIMATE_COLUMNS = ("location_id", "metric_id", "date", "value", "quality")
+
+CREATE_STAGING = """
+CREATE TEMPORARY TABLE climatedata_staging (
+    seq BIGINT GENERATED ALWAYS AS IDENTITY,
+    location_id INTEGER NOT NULL,
+    metric_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    quality SMALLINT NOT NULL
+) ON COMMIT DROP
+"""
+
+COPY_STAGING = f"COPY climatedata_staging ({', '.join(CLIMATE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+# NOTE: DISTINCT ON keeps the last reading per key within a batch since ON CONFLICT
+# can't touch the same row twice in one statement. Every part of the statement sees the
+# table as it was before the INSERT, which is how `previous` holds the overwritten values.
+MERGE_STAGING = """
+WITH incoming AS (
+    SELECT DISTINCT ON (location_id, metric_id, date) location_id, metric_id, date, value, quality
+    FROM climatedata_staging
+    ORDER BY location_id, metric_id, date, seq DESC
+), previous AS (
+    SELECT c.location_id, c.metric_id, c.date, c.value
+    FROM climatedata c
+    JOIN incoming i ON i.location_id = c.location_id AND i.metric_id = c.metric_id AND i.date = c.date
+), written AS (
+    INSERT INTO climatedata (location_id, metric_id, date, value, quality)
+    SELECT location_id, metric_id, date, value, quality FROM incoming
+    ON CONFLICT (location_id, metric_id, date) DO UPDATE
+    SET value = EXCLUDED.value, quality = EXCLUDED.quality
+    WHERE (climatedata.value, climatedata.quality) IS DISTINCT FROM (EXCLUDED.value, EXCLUDED.quality)
+    RETURNING id, location_id, metric_id, date, value, quality
+)
+SELECT w.id, w.location_id, w.metric_id, w.date, w.value, w.quality, p.value AS previous_value
+FROM written w
+LEFT JOIN previous p ON p.location_id = w.location_id AND p.metric_id = w.metric_id AND p.date = w.date
+"""
+
+# NOTE: unlike MERGE_STAGING existing readings are kept, the first reading per key within a
+# batch is the one inserted
+INSERT_STAGING = """
+INSERT INTO climatedata (location_id, metric_id, date, value, quality)
+SELECT DISTINCT ON (location_id, metric_id, date) location_id, metric_id, date, value, quality
+FROM climatedata_staging
+ORDER BY location_id, metric_id, date, seq
+ON CONFLICT (location_id, metric_id, date) DO NOTHING
+RETURNING id, location_id, metric_id, date, value, quality, NULL::float8 AS previous_value
+"""
+
+def _stage(conn: Connection, rows: Sequence[Sequence]):
+    ensure_partitions(conn, (row[2] for row in rows))
+    conn.execute(text(CREATE_STAGING))
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(COPY_STAGING, _to_csv(rows))
+    finally:
+        cursor.close()
+
+"""
+Upserts a batch of (location_id, metric_id, date, value, quality) tuples in one transaction.
+
+Returns the readings inserted or changed as (id, location_id, metric_id, date, value, quality,
+previous_value) rows, previous_value being the value a changed reading had before, None for
+inserted ones.
+"""
+def upsert_climate_rows(engine: Engine, rows: Sequence[Sequence]) -> List[Row]:
+    if not rows:
+        return []
+
+    with engine.begin() as conn:
+        _stage(conn, rows)
+        written = conn.execute(text(MERGE_STAGING)).all()
+        refresh_rollups_from_staging(conn)
+        return written
+
+"""
+Inserts a batch of (location_id, metric_id, date, value, quality) tuples in one transaction,
+skipping the ones whose (location_id, metric_id, date) already has a reading.
+
+Returns the inserted readings, (id, location_id, metric_id, date, value, quality, previous_value)
+rows like upsert_climate_rows, by (location_id, metric_id, date).
+"""
+def insert_climate_rows(engine: Engine, rows: Sequence[Sequence]) -> Dict[Tuple[int, int, datetime.date], Row]:
+    if not rows:
+        return {}
+
+    with engine.begin() as conn:
+        _stage(conn, rows)
+        inserted = {(row.location_id, row.metric_id, row.date): row for row in conn.execute(text(INSERT_STAGING))}
+        refresh_rollups_from_staging(conn)
+        return inserted
+
+def _to_csv(rows: Iterable[Sequence]) -> io.StringIO:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,340 @@
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import Connection, Engine, text
+from sqlmodel import SQLModel, Field
+
+"""
+Versioned schema migrations.
+
+Every change to the database schema is appended to MIGRATIONS as a new version and is
+never edited once released. `migrate` applies whatever versions a database is missing,
+in order, and records them in the SCHEMA_VERSION table, so dev databases and long lived
+production databases converge on the same schema.
+
+NOTE: version 1 matches what `SQLModel.metadata.create_all` used to produce, so databases
+created before migrations existed are adopted as-is and then upgraded.
+
+Apply pending migrations by hand with:
+
+`python -m backend.dal.migrations`
+"""
+
+# arbitrary key so concurrent workers starting up don't migrate at the same time
+MIGRATION_LOCK_KEY = 804_2025
+
+"""
+Schema version class that correlates to the SCHEMA_VERSION table.
+
+RAW SQL:
+CREATE TABLE IF NOT EXISTS SCHEMA_VERSION (
+	VERSION INTEGER PRIMARY KEY,
+	DESCRIPTION VARCHAR NOT NULL,
+	APPLIED_AT TIMESTAMP NOT NULL
+);
+"""
+class SchemaVersion(SQLModel, table=True):
+    __tablename__ = "schema_version"
+
+    version: int = Field(primary_key=True)
+    description: str
+    applied_at: datetime
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    statements: List[str]
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline tables", [
+        """
+        CREATE TABLE IF NOT EXISTS locations (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR NOT NULL,
+            country VARCHAR NOT NULL,
+            latitude FLOAT NOT NULL,
+            longitude FLOAT NOT NULL,
+            region VARCHAR NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS metrics (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR NOT NULL,
+            display_name VARCHAR NOT NULL,
+            unit VARCHAR NOT NULL,
+            description VARCHAR NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS climatedata (
+            id SERIAL PRIMARY KEY,
+            location_id INTEGER NOT NULL REFERENCES locations (id),
+            metric_id INTEGER NOT NULL REFERENCES metrics (id),
+            date VARCHAR NOT NULL,
+            value FLOAT NOT NULL,
+            quality VARCHAR NOT NULL
+        )
+        """,
+    ]),
+    Migration(2, "store climatedata.date as DATE", [
+        "ALTER TABLE climatedata ALTER COLUMN date TYPE DATE USING date::date",
+    ]),
+    Migration(3, "composite indexes for filtered reads", [
+        """
+        CREATE INDEX IF NOT EXISTS ix_climatedata_location_metric_date
+        ON climatedata (location_id, metric_id, date) INCLUDE (value, quality)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_climatedata_metric_date
+        ON climatedata (metric_id, date) INCLUDE (location_id, value, quality)
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_climatedata_date_id ON climatedata (date, id)",
+        "CREATE INDEX IF NOT EXISTS ix_metrics_name ON metrics (name)",
+        "ANALYZE climatedata",
+    ]),
+    Migration(4, "one reading per location, metric and date", [
+        # keep the latest reading when older databases already hold duplicates
+        """
+        DELETE FROM climatedata c
+        USING climatedata newer
+        WHERE c.location_id = newer.location_id
+            AND c.metric_id = newer.metric_id
+            AND c.date = newer.date
+            AND c.id < newer.id
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_climatedata_location_metric_date
+        ON climatedata (location_id, metric_id, date) INCLUDE (value, quality)
+        """,
+        "DROP INDEX IF EXISTS ix_climatedata_location_metric_date",
+    ]),
+    Migration(5, "monthly rollups for summaries", [
+        """
+        CREATE TABLE IF NOT EXISTS climate_rollup_monthly (
+            location_id INTEGER NOT NULL REFERENCES locations (id),
+            metric_id INTEGER NOT NULL REFERENCES metrics (id),
+            period DATE NOT NULL,
+            quality VARCHAR NOT NULL,
+            reading_count BIGINT NOT NULL,
+            value_sum DOUBLE PRECISION NOT NULL,
+            value_min DOUBLE PRECISION NOT NULL,
+            value_max DOUBLE PRECISION NOT NULL,
+            weighted_sum DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (location_id, metric_id, period, quality)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_climate_rollup_monthly_metric_period ON climate_rollup_monthly (metric_id, period)",
+        """
+        INSERT INTO climate_rollup_monthly
+            (location_id, metric_id, period, quality, reading_count, value_sum, value_min, value_max, weighted_sum)
+        SELECT
+            location_id,
+            metric_id,
+            date_trunc('month', date)::date,
+            quality,
+            COUNT(*),
+            SUM(value),
+            MIN(value),
+            MAX(value),
+            SUM(value * CASE quality
+                WHEN 'excellent' THEN 1.0
+                WHEN 'good' THEN 0.75
+                WHEN 'questionable' THEN 0.5
+                WHEN 'poor' THEN 0.25
+                ELSE 0
+            END)
+        FROM climatedata
+        GROUP BY location_id, metric_id, date_trunc('month', date)::date, quality
+        ON CONFLICT DO NOTHING
+        """,
+    ]),
+    Migration(6, "quality as a SMALLINT ordinal with a weights lookup table", [
+        """
+        CREATE TABLE IF NOT EXISTS quality_levels (
+            ordinal SMALLINT PRIMARY KEY,
+            name VARCHAR NOT NULL UNIQUE,
+            weight DOUBLE PRECISION NOT NULL
+        )
+        """,
+        """
+        INSERT INTO quality_levels (ordinal, name, weight) VALUES
+            (1, 'poor', 0.25),
+            (2, 'questionable', 0.5),
+            (3, 'good', 0.75),
+            (4, 'excellent', 1.0)
+        ON CONFLICT DO NOTHING
+        """,
+        # NOTE: an unknown quality maps to NULL and fails the migration instead of being guessed
+        """
+        ALTER TABLE climatedata ALTER COLUMN quality TYPE SMALLINT USING CASE lower(quality)
+            WHEN 'poor' THEN 1
+            WHEN 'questionable' THEN 2
+            WHEN 'good' THEN 3
+            WHEN 'excellent' THEN 4
+        END
+        """,
+        "ALTER TABLE climatedata ADD CONSTRAINT ck_climatedata_quality CHECK (quality BETWEEN 1 AND 4)",
+        # rollups are rebuilt from the converted rows rather than converted in place
+        "TRUNCATE climate_rollup_monthly",
+        "ALTER TABLE climate_rollup_monthly ALTER COLUMN quality TYPE SMALLINT USING quality::smallint",
+        """
+        INSERT INTO climate_rollup_monthly
+            (location_id, metric_id, period, quality, reading_count, value_sum, value_min, value_max, weighted_sum)
+        SELECT
+            c.location_id,
+            c.metric_id,
+            date_trunc('month', c.date)::date,
+            c.quality,
+            COUNT(*),
+            SUM(c.value),
+            MIN(c.value),
+            MAX(c.value),
+            SUM(c.value * q.weight)
+        FROM climatedata c
+        JOIN quality_levels q ON q.ordinal = c.quality
+        GROUP BY c.location_id, c.metric_id, date_trunc('month', c.date)::date, c.quality
+        """,
+        "ANALYZE climatedata",
+    ]),
+    # NOTE: partition names and bounds need to be kept in sync with dal/partitions.py
+    Migration(7, "range partition climatedata by year", [
+        "ALTER TABLE climatedata RENAME TO climatedata_unpartitioned",
+        "ALTER TABLE climatedata_unpartitioned RENAME CONSTRAINT climatedata_pkey TO climatedata_unpartitioned_pkey",
+        "DROP INDEX ux_climatedata_location_metric_date, ix_climatedata_metric_date, ix_climatedata_date_id",
+        # the partition key has to be part of every unique constraint, ids stay unique through the sequence
+        """
+        CREATE TABLE climatedata (
+            id INTEGER NOT NULL DEFAULT nextval('climatedata_id_seq'),
+            location_id INTEGER NOT NULL REFERENCES locations (id),
+            metric_id INTEGER NOT NULL REFERENCES metrics (id),
+            date DATE NOT NULL,
+            value FLOAT NOT NULL,
+            quality SMALLINT NOT NULL CONSTRAINT ck_climatedata_quality CHECK (quality BETWEEN 1 AND 4),
+            PRIMARY KEY (id, date)
+        ) PARTITION BY RANGE (date)
+        """,
+        "ALTER SEQUENCE climatedata_id_seq OWNED BY climatedata.id",
+        """
+        DO $$
+        DECLARE
+            year INTEGER;
+        BEGIN
+            FOR year IN SELECT DISTINCT EXTRACT(YEAR FROM date)::int FROM climatedata_unpartitioned LOOP
+                EXECUTE format(
+                    'CREATE TABLE climatedata_y%s PARTITION OF climatedata FOR VALUES FROM (%L) TO (%L)',
+                    year, make_date(year, 1, 1), make_date(year + 1, 1, 1)
+                );
+            END LOOP;
+        END $$
+        """,
+        """
+        INSERT INTO climatedata (id, location_id, metric_id, date, value, quality)
+        SELECT id, location_id, metric_id, date, value, quality FROM climatedata_unpartitioned
+        """,
+        "DROP TABLE climatedata_unpartitioned",
+        # indexes on the parent cascade to every current and future partition
+        """
+        CREATE UNIQUE INDEX ux_climatedata_location_metric_date
+        ON climatedata (location_id, metric_id, date) INCLUDE (value, quality)
+        """,
+        """
+        CREATE INDEX ix_climatedata_metric_date
+        ON climatedata (metric_id, date) INCLUDE (location_id, value, quality)
+        """,
+        "CREATE INDEX ix_climatedata_date_id ON climatedata (date, id)",
+        "ANALYZE climatedata",
+    ]),
+    # NOTE: x is the reading's day offset from analytics/trends.REFERENCE_DATE, 2000-01-01
+    Migration(8, "trend regression moments on the monthly rollups", [
+        """
+        ALTER TABLE climate_rollup_monthly
+            ADD COLUMN day_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            ADD COLUMN day_sq_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            ADD COLUMN day_value_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            ADD COLUMN value_sq_sum DOUBLE PRECISION NOT NULL DEFAULT 0
+        """,
+        """
+        UPDATE climate_rollup_monthly r
+        SET day_sum = s.day_sum, day_sq_sum = s.day_sq_sum, day_value_sum = s.day_value_sum, value_sq_sum = s.value_sq_sum
+        FROM (
+            SELECT
+                c.location_id,
+                c.metric_id,
+                date_trunc('month', c.date)::date AS period,
+                c.quality,
+                SUM(c.x) AS day_sum,
+                SUM(c.x * c.x) AS day_sq_sum,
+                SUM(c.x * c.value) AS day_value_sum,
+                SUM(c.value * c.value) AS value_sq_sum
+            FROM (SELECT *, (date - DATE '2000-01-01')::float8 AS x FROM climatedata) c
+            GROUP BY c.location_id, c.metric_id, date_trunc('month', c.date)::date, c.quality
+        ) s
+        WHERE r.location_id = s.location_id
+            AND r.metric_id = s.metric_id
+            AND r.period = s.period
+            AND r.quality = s.quality
+        """,
+        """
+        ALTER TABLE climate_rollup_monthly
+            ALTER COLUMN day_sum DROP DEFAULT,
+            ALTER COLUMN day_sq_sum DROP DEFAULT,
+            ALTER COLUMN day_value_sum DROP DEFAULT,
+            ALTER COLUMN value_sq_sum DROP DEFAULT
+        """,
+    ]),
+    # NOTE: the indexed expression is dal/spatial.POSITION, queries must use it verbatim
+    Migration(9, "spatial index on location positions", [
+        "CREATE INDEX IF NOT EXISTS ix_locations_position ON locations USING gist (point(longitude, latitude))",
+        "ANALYZE locations",
+    ]),
+]
+
+"""
+Returns the highest applied version, or 0 for an empty database.
+"""
+def current_version(conn: Connection) -> int:
+    SchemaVersion.__table__.create(conn, checkfirst=True)
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar_one()
+
+"""
+Applies pending migrations on an open connection. The caller owns the transaction.
+
+Returns the list of versions that were applied.
+"""
+def apply_migrations(conn: Connection, target: Optional[int] = None) -> List[int]:
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    # index builds and backfills can legitimately outlast DB_STATEMENT_TIMEOUT_MS
+    conn.execute(text("SET LOCAL statement_timeout = 0"))
+    version = current_version(conn)
+
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        if target is not None and migration.version > target:
+            break
+        for statement in migration.statements:
+            conn.execute(text(statement))
+        conn.execute(
+            text("INSERT INTO schema_version (version, description, applied_at) VALUES (:version, :description, now())"),
+            {"version": migration.version, "description": migration.description}
+        )
+        applied.append(migration.version)
+    return applied
+
+"""
+Brings the database up to the latest schema version in a single transaction.
+"""
+def migrate(engine: Engine, target: Optional[int] = None) -> List[int]:
+    with engine.begin() as conn:
+        return apply_migrations(conn, target)
+
+if __name__ == "__main__":
+    from .engine import engine
+
+    target = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    applied = migrate(engine, target)
+    print(f"APPLIED MIGRATIONS: {applied}" if applied else "SCHEMA UP TO DATE")
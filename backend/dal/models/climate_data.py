@@ -1,24 +1,58 @@
+import datetime
 from typing import Optional
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import VARCHAR, DATE, DOUBLE_PRECISION
+from sqlalchemy import VARCHAR, DATE, DOUBLE_PRECISION, Column, Index
+from ..quality import QualityType
 
 """
 Climate data class that correlates to CLIMATEDATA table.
 
 RAW SQL:
 CREATE TABLE IF NOT EXISTS CLIMATEDATA (
-	ID SERIAL PRIMARY KEY,
+	ID SERIAL,
 	LOCATION_ID INTEGER NOT NULL REFERENCES LOCATIONS (ID),
 	METRIC_ID INTEGER NOT NULL REFERENCES METRICS (ID),
 	DATE DATE NOT NULL,
 	VALUE DOUBLE PRECISION,
-	QUALITY VARCHAR(50)
-);
+	QUALITY SMALLINT NOT NULL CHECK (QUALITY BETWEEN 1 AND 4),
+	PRIMARY KEY (ID, DATE)
+) PARTITION BY RANGE (DATE);
+
+CREATE TABLE CLIMATEDATA_Y2025 PARTITION OF CLIMATEDATA FOR VALUES FROM ('2025-01-01') TO ('2026-01-01');
+
+CREATE UNIQUE INDEX UX_CLIMATEDATA_LOCATION_METRIC_DATE ON CLIMATEDATA (LOCATION_ID, METRIC_ID, DATE) INCLUDE (VALUE, QUALITY);
+CREATE INDEX IX_CLIMATEDATA_METRIC_DATE ON CLIMATEDATA (METRIC_ID, DATE) INCLUDE (LOCATION_ID, VALUE, QUALITY);
+CREATE INDEX IX_CLIMATEDATA_DATE_ID ON CLIMATEDATA (DATE, ID);
+
+NOTE: the schema is owned by dal/migrations.py, these declarations need to be kept in sync with it.
+Partitions are created per year by dal/partitions.py.
 """
+
 class ClimateData(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
+    __table_args__ = (
+        # one reading per location, metric and day. Doubles as the conflict target for
+        # idempotent bulk ingestion and covers location scoped reads so the heap is skipped
+        Index(
+            "ux_climatedata_location_metric_date",
+            "location_id", "metric_id", "date",
+            unique=True,
+            postgresql_include=["value", "quality"]
+        ),
+        # metric scoped reads across every location
+        Index(
+            "ix_climatedata_metric_date",
+            "metric_id", "date",
+            postgresql_include=["location_id", "value", "quality"]
+        ),
+        # unfiltered and date-only pages, ordered by the (date, id) keyset
+        Index("ix_climatedata_date_id", "date", "id"),
+    )
+
+    # the partition key is part of the primary key, ids are still unique through the sequence
+    id: Optional[int] = Field(default=None, primary_key=True, sa_column_kwargs={"autoincrement": True})
     location_id: int = Field(foreign_key="locations.id", nullable=False)
     metric_id: int = Field(foreign_key="metrics.id", nullable=False)
-    date: str = Field(sa_column=DATE)
+    date: datetime.date = Field(sa_column=Column(DATE, primary_key=True, nullable=False))
     value: float
-    quality: str
+    # stored as its SMALLINT ordinal, see dal/quality.py
+    quality: str = Field(sa_column=Column(QualityType, nullable=False))
@@ -0,0 +1,58 @@
+import datetime
+from sqlmodel import SQLModel, Field
+from sqlalchemy import DATE, Column, Index
+from ..quality import QualityType
+
+"""
+Monthly rollup class that correlates to the CLIMATE_ROLLUP_MONTHLY table.
+
+One row per location, metric, calendar month and quality level holding the aggregates
+the summary endpoint needs, so long ranges are answered without touching CLIMATEDATA.
+Maintained by dal/rollups.py whenever readings are written.
+
+The DAY_* and VALUE_SQ_SUM columns are the regression moments of the trends endpoint,
+with x the reading's day offset from analytics/trends.REFERENCE_DATE and y its value.
+
+RAW SQL:
+CREATE TABLE IF NOT EXISTS CLIMATE_ROLLUP_MONTHLY (
+	LOCATION_ID INTEGER NOT NULL REFERENCES LOCATIONS (ID),
+	METRIC_ID INTEGER NOT NULL REFERENCES METRICS (ID),
+	PERIOD DATE NOT NULL,
+	QUALITY SMALLINT NOT NULL,
+	READING_COUNT BIGINT NOT NULL,
+	VALUE_SUM DOUBLE PRECISION NOT NULL,
+	VALUE_MIN DOUBLE PRECISION NOT NULL,
+	VALUE_MAX DOUBLE PRECISION NOT NULL,
+	WEIGHTED_SUM DOUBLE PRECISION NOT NULL,
+	DAY_SUM DOUBLE PRECISION NOT NULL,
+	DAY_SQ_SUM DOUBLE PRECISION NOT NULL,
+	DAY_VALUE_SUM DOUBLE PRECISION NOT NULL,
+	VALUE_SQ_SUM DOUBLE PRECISION NOT NULL,
+	PRIMARY KEY (LOCATION_ID, METRIC_ID, PERIOD, QUALITY)
+);
+
+CREATE INDEX IX_CLIMATE_ROLLUP_MONTHLY_METRIC_PERIOD ON CLIMATE_ROLLUP_MONTHLY (METRIC_ID, PERIOD);
+"""
+class ClimateRollupMonthly(SQLModel, table=True):
+    __tablename__ = "climate_rollup_monthly"
+    __table_args__ = (
+        Index("ix_climate_rollup_monthly_metric_period", "metric_id", "period"),
+    )
+
+    location_id: int = Field(foreign_key="locations.id", primary_key=True)
+    metric_id: int = Field(foreign_key="metrics.id", primary_key=True)
+    # first day of the month
+    period: datetime.date = Field(sa_column=Column(DATE, primary_key=True))
+    # stored as its SMALLINT ordinal, see dal/quality.py
+    quality: str = Field(sa_column=Column(QualityType, primary_key=True))
+    reading_count: int
+    value_sum: float
+    value_min: float
+    value_max: float
+    # sum of value * quality weight
+    weighted_sum: float
+    # regression moments: Σx, Σx², Σxy, Σy²
+    day_sum: float
+    day_sq_sum: float
+    day_value_sum: float
+    value_sq_sum: float
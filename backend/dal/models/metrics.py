@@ -12,10 +12,12 @@ CREATE TABLE IF NOT EXISTS METRICS (
 	UNIT VARCHAR(50),
 	DESCRIPTION TEXT
 );
+
+CREATE INDEX IX_METRICS_NAME ON METRICS (NAME);
 """
 class Metrics(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    name: str
+    name: str = Field(index=True)
     display_name: str
     unit: str
     description: str
@@ -0,0 +1,21 @@
+from sqlmodel import SQLModel, Field
+
+"""
+Quality level class that correlates to the QUALITY_LEVELS lookup table.
+
+One row per quality level: the SMALLINT ordinal stored in CLIMATEDATA.QUALITY, its API name
+and the weight it contributes to quality-weighted averages. Mirrors dal/quality.py.
+
+RAW SQL:
+CREATE TABLE IF NOT EXISTS QUALITY_LEVELS (
+	ORDINAL SMALLINT PRIMARY KEY,
+	NAME VARCHAR NOT NULL UNIQUE,
+	WEIGHT DOUBLE PRECISION NOT NULL
+);
+"""
+class QualityLevels(SQLModel, table=True):
+    __tablename__ = "quality_levels"
+
+    ordinal: int = Field(primary_key=True)
+    name: str = Field(unique=True)
+    weight: float
@@ -0,0 +1,144 @@
+import argparse
+import datetime
+from typing import Iterable, List, Tuple
+from sqlalchemy import Connection, Engine, text
+
+"""
+Yearly range partitions of CLIMATEDATA.
+
+Every reading lives in the partition of its year, `climatedata_y<year>`, so date bounded
+reads only touch the partitions their range overlaps no matter how much history is kept.
+There is no default partition: writers call `ensure_partitions` for the dates they are about
+to insert and missing years are created on the fly.
+
+Old years are retired by detaching their partitions. A detached partition is renamed to
+`climatedata_archive_y<year>` and kept as a standalone table to dump or drop, or dropped
+right away with --drop. The monthly rollups of detached years are deleted with them so
+summaries never count readings that are no longer in CLIMATEDATA.
+
+`python -m backend.dal.partitions list`
+`python -m backend.dal.partitions detach --before 2015 [--drop]`
+
+NOTE: migration 7 in dal/migrations.py creates the partitions of existing data, the
+names and bounds need to be kept in sync with it.
+"""
+
+# arbitrary key so concurrent writers don't race each other creating the same partition
+PARTITION_LOCK_KEY = 804_2026
+
+ATTACHED_PARTITIONS = """
+SELECT c.relname AS name
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = 'climatedata'::regclass
+ORDER BY c.relname
+"""
+
+MISSING_YEARS = """
+SELECT y.year
+FROM unnest(CAST(:years AS INTEGER[])) AS y(year)
+WHERE NOT EXISTS (
+    SELECT 1 FROM pg_inherits i
+    WHERE i.inhparent = 'climatedata'::regclass
+    AND i.inhrelid = to_regclass('climatedata_y' || y.year)
+)
+"""
+
+CREATE_PARTITION = """
+CREATE TABLE IF NOT EXISTS {name} PARTITION OF climatedata
+FOR VALUES FROM ('{start}') TO ('{end}')
+"""
+
+FOREIGN_KEYS = "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:name AS regclass) AND contype = 'f'"
+
+def partition_name(year: int) -> str:
+    return f"climatedata_y{year}"
+
+def archive_name(year: int) -> str:
+    return f"climatedata_archive_y{year}"
+
+def partition_bounds(year: int) -> Tuple[datetime.date, datetime.date]:
+    return datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+
+def as_date(value) -> datetime.date:
+    return value if isinstance(value, datetime.date) else datetime.date.fromisoformat(str(value))
+
+"""
+Creates the partitions that the given dates fall into, when missing. Runs on the caller's
+connection so the partitions commit or roll back together with the rows written into them.
+
+NOTE: the lookup takes no locks so the common case, every year already present, costs a
+single catalog query. The advisory lock is only taken when a partition has to be created.
+"""
+def ensure_partitions(conn: Connection, dates: Iterable) -> List[int]:
+    years = sorted({as_date(date).year for date in dates})
+    if not years:
+        return []
+
+    missing = conn.execute(text(MISSING_YEARS), {"years": years}).scalars().all()
+    if not missing:
+        return []
+
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+    for year in missing:
+        start, end = partition_bounds(year)
+        conn.execute(text(CREATE_PARTITION.format(name=partition_name(year), start=start, end=end)))
+    return list(missing)
+
+"""
+Returns the years that currently have an attached partition.
+"""
+def attached_years(conn: Connection) -> List[int]:
+    names = conn.execute(text(ATTACHED_PARTITIONS)).scalars().all()
+    return [int(name.removeprefix("climatedata_y")) for name in names if name.startswith("climatedata_y")]
+
+"""
+Detaches every partition of a year before `before_year`, in one transaction.
+
+Returns the detached years.
+"""
+def detach_partitions(engine: Engine, before_year: int, drop: bool = False) -> List[int]:
+    with engine.begin() as conn:
+        years = [year for year in attached_years(conn) if year < before_year]
+        for year in years:
+            name = partition_name(year)
+            conn.execute(text(f"ALTER TABLE climatedata DETACH PARTITION {name}"))
+            if drop:
+                conn.execute(text(f"DROP TABLE {name}"))
+                continue
+
+            # archives keep no references, so they can be dropped independently of the live schema
+            for constraint in conn.execute(text(FOREIGN_KEYS), {"name": name}).scalars().all():
+                conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {constraint}"))
+            conn.execute(text(f"ALTER TABLE {name} ALTER COLUMN id DROP DEFAULT"))
+            conn.execute(text(f"ALTER TABLE {name} RENAME TO {archive_name(year)}"))
+
+        if years:
+            conn.execute(
+                text("DELETE FROM climate_rollup_monthly WHERE period < :cutoff"),
+                {"cutoff": datetime.date(before_year, 1, 1)}
+            )
+        return years
+
+if __name__ == "__main__":
+    from ..cache import bump_data_version
+    from .engine import engine
+
+    parser = argparse.ArgumentParser(description="Manage the yearly partitions of CLIMATEDATA.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list the years with an attached partition")
+    detach = commands.add_parser("detach", help="detach the partitions of every year before --before")
+    detach.add_argument("--before", type=int, required=True)
+    detach.add_argument("--drop", action="store_true", help="drop the detached partitions instead of archiving them")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        with engine.connect() as conn:
+            print("\n".join(partition_name(year) for year in attached_years(conn)) or "NO PARTITIONS")
+    else:
+        years = detach_partitions(engine, args.before, args.drop)
+        if years:
+            # only reaches servers that share the version through CACHE_URL
+            bump_data_version()
+        action = "DROPPED" if args.drop else "ARCHIVED"
+        print(f"{action} PARTITIONS: {years}" if years else "NOTHING TO DETACH")
@@ -0,0 +1,59 @@
+from typing import Dict, List, Optional
+from sqlalchemy import SmallInteger
+from sqlalchemy.types import TypeDecorator
+
+"""
+Quality level registry.
+
+Quality is stored as a SMALLINT ordinal, 1 (poor) through 4 (excellent), so "at or above a
+threshold" is a plain `quality >= n` range predicate and every row carries 2 bytes instead of
+a string. The QUALITY_LEVELS table (models/quality_levels.py) holds the same ordinals, names and
+weights for SQL that needs the weights, rollups and summaries join against it.
+
+The API keeps speaking in quality names, this module is the only place that maps between the two.
+
+NOTE: the table is seeded by dal/migrations.py, these values need to be kept in sync with it.
+"""
+
+# Quality levels from worst to best, ordinal = position + 1
+QUALITY_CODES: List[str] = ["poor", "questionable", "good", "excellent"]
+
+# Weight each quality level contributes to quality-weighted averages
+QUALITY_WEIGHTS: Dict[str, float] = {
+    "excellent": 1.0,
+    "good": 0.75,
+    "questionable": 0.5,
+    "poor": 0.25,
+}
+
+_ORDINALS = {name: ordinal for ordinal, name in enumerate(QUALITY_CODES, start=1)}
+
+"""
+Returns the stored ordinal of a quality name, case insensitive.
+
+Raises ValueError for unknown names.
+"""
+def quality_ordinal(name: str) -> int:
+    ordinal = _ORDINALS.get(name.lower())
+    if ordinal is None:
+        raise ValueError(f"quality must be one of {QUALITY_CODES}")
+    return ordinal
+
+def quality_name(ordinal: int) -> str:
+    return QUALITY_CODES[ordinal - 1]
+
+"""
+Column type that stores quality names as their SMALLINT ordinal and reads them back as names,
+so ORM models and selects keep working with names.
+"""
+class QualityType(TypeDecorator):
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[str], dialect) -> Optional[int]:
+        if value is None or isinstance(value, int):
+            return value
+        return quality_ordinal(value)
+
+    def process_result_value(self, value: Optional[int], dialect) -> Optional[str]:
+        return None if value is None else quality_name(value)
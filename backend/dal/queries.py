@@ -0,0 +1,150 @@
+import datetime
+import os
+from dataclasses import dataclass, fields, replace
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+from sqlalchemy import Integer, TextClause, select, text
+from dotenv import load_dotenv
+from .models.climate_data import ClimateData
+from .models.metrics import Metrics
+from .spatial import within, within_params
+
+"""
+Shared reading filters and statement builder for the read routes.
+
+Every read route filters CLIMATEDATA by the same optional parameters. ReadingFilters holds
+them once parsed and renders them two ways from one definition (PREDICATES): as raw SQL over
+a CLIMATEDATA alias for the aggregate queries, and as SQLAlchemy expressions for the selects
+of /climate. Only the filters that are set are emitted. A catch-all like
+`(:start_date IS NULL OR date >= :start_date)` defeats partition pruning and index range
+scans and makes Postgres settle for one generic plan.
+
+Raw SQL goes through `statement`, which keeps one TextClause per distinct SQL string. There
+are only a handful per route and filter combination, so:
+- the SQL text is parsed into a TextClause once instead of on every request
+- SQLAlchemy's compiled cache is hit from the second execution of a statement on
+- with DB_ASYNC, asyncpg prepares each distinct statement once per connection and reuses
+  the server side prepared statement after that, see dal/engine.py
+Both caches report their hits on /metrics.
+"""
+
+load_dotenv()
+
+# ids of the stations within near_radius_km of (near_lat, near_lon), answered by the spatial index
+NEAR_LOCATION_IDS = f"SELECT station.id FROM locations station WHERE {within('station', 'near_')}"
+
+# distinct SQL strings kept as parsed statements, far more than the routes can produce
+STATEMENT_CACHE_SIZE = int(os.getenv("STATEMENT_CACHE_SIZE", 512))
+
+# filter -> (predicate over a CLIMATEDATA alias `{alias}`, SQLAlchemy predicate over ClimateData)
+# NOTE: filters set to several values use LIST_PREDICATES, the value is bound as one array parameter
+PREDICATES = {
+    "location_id": ("{alias}.location_id = :location_id", lambda value: ClimateData.location_id == value),
+    "start_date": ("{alias}.date >= :start_date", lambda value: ClimateData.date >= value),
+    "end_date": ("{alias}.date <= :end_date", lambda value: ClimateData.date <= value),
+    "metric": (
+        "{alias}.metric_id IN (SELECT id FROM metrics WHERE name = :metric)",
+        lambda value: ClimateData.metric_id.in_(select(Metrics.id).where(Metrics.name == value))
+    ),
+    "metric_id": ("{alias}.metric_id = :metric_id", lambda value: ClimateData.metric_id == value),
+    "min_quality": ("{alias}.quality >= :min_quality", lambda value: ClimateData.quality >= value),
+    "near": (
+        "{alias}.location_id IN (" + NEAR_LOCATION_IDS + ")",
+        lambda value: ClimateData.location_id.in_(
+            text(NEAR_LOCATION_IDS).bindparams(**within_params(*value, "near_")).columns(id=Integer)
+        )
+    ),
+}
+
+LIST_PREDICATES = {
+    "location_id": (
+        "{alias}.location_id = ANY(CAST(:location_id AS INTEGER[]))",
+        lambda value: ClimateData.location_id.in_(value)
+    ),
+    "metric": (
+        "{alias}.metric_id IN (SELECT id FROM metrics WHERE name = ANY(CAST(:metric AS TEXT[])))",
+        lambda value: ClimateData.metric_id.in_(select(Metrics.id).where(Metrics.name.in_(value)))
+    ),
+    "metric_id": (
+        "{alias}.metric_id = ANY(CAST(:metric_id AS INTEGER[]))",
+        lambda value: ClimateData.metric_id.in_(value)
+    ),
+}
+
+def _predicate(name: str, value):
+    return LIST_PREDICATES[name] if name in LIST_PREDICATES and isinstance(value, tuple) else PREDICATES[name]
+
+"""
+Normalizes a filter given one or several values: a single value stays a scalar so the common
+case keeps its plain equality, several become a sorted tuple so equal sets share cache entries.
+"""
+def _one_or_many(value):
+    if not isinstance(value, (list, tuple, set)):
+        return value
+    values = sorted(set(value))
+    if len(values) <= 1:
+        return values[0] if values else None
+    return tuple(values)
+
+"""
+Parsed filters of a read request. Hashable, so it doubles as a cache key.
+
+location_id and metric take one value or a list of them. near is a (lat, lon, radius_km)
+circle, readings of the stations inside it pass. The read routes swap metric names for
+metric_id before querying, see dimensions.py.
+
+NOTE: metric names are stored lower case, the metric filter is normalized to match.
+"""
+@dataclass(frozen=True)
+class ReadingFilters:
+    location_id: Union[int, Tuple[int, ...], None] = None
+    start_date: Optional[datetime.date] = None
+    end_date: Optional[datetime.date] = None
+    metric: Union[str, Tuple[str, ...], None] = None
+    metric_id: Union[int, Tuple[int, ...], None] = None
+    min_quality: Optional[int] = None
+    near: Optional[Tuple[float, float, float]] = None
+
+    def __post_init__(self):
+        metric = self.metric
+        if isinstance(metric, str):
+            metric = metric.lower()
+        elif metric:
+            metric = [name.lower() for name in metric]
+        object.__setattr__(self, "metric", _one_or_many(metric))
+        object.__setattr__(self, "location_id", _one_or_many(self.location_id))
+        object.__setattr__(self, "metric_id", _one_or_many(self.metric_id))
+
+    def active(self) -> Dict[str, Any]:
+        return {field.name: getattr(self, field.name) for field in fields(self) if getattr(self, field.name)}
+
+    def params(self) -> dict:
+        params = {}
+        for name, value in self.active().items():
+            if name == "near":
+                params.update(within_params(*value, "near_"))
+            elif isinstance(value, tuple):
+                # drivers bind lists, not tuples, as arrays
+                params[name] = list(value)
+            else:
+                params[name] = value
+        return params
+
+    def predicates(self, alias: str) -> List[str]:
+        return [_predicate(name, value)[0].format(alias=alias) for name, value in self.active().items()]
+
+    def where(self, alias: str) -> str:
+        return " AND ".join(self.predicates(alias)) or "TRUE"
+
+    def clauses(self) -> list:
+        return [_predicate(name, value)[1](value) for name, value in self.active().items()]
+
+    def without_dates(self) -> "ReadingFilters":
+        return replace(self, start_date=None, end_date=None)
+
+"""
+Returns the statement for a SQL string, parsed once and reused by every later request.
+"""
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def statement(sql: str) -> TextClause:
+    return text(sql)
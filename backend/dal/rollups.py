@@ -0,0 +1,132 @@
+from typing import Iterable, Tuple
+from sqlalchemy import Connection, text
+from ..analytics.trends import REFERENCE_DATE
+
+"""
+Incremental maintenance of CLIMATE_ROLLUP_MONTHLY.
+
+Whenever readings are written the affected (location, metric, month) keys are re-aggregated
+from CLIMATEDATA inside the same transaction. Each key covers at most a month of readings
+per series, read through the covering index, so the cost tracks the size of the write and
+not the size of the table. Recomputing (rather than adding deltas) keeps MIN/MAX correct
+when an upsert overwrites an existing reading.
+
+Next to the summary aggregates every row keeps the regression moments of the trend engine
+(analytics/trends.py), so trends over whole months are answered from the rollups too.
+"""
+
+# x of the trend regression, a reading's day offset from REFERENCE_DATE
+DAY_OFFSET = f"(c.date - DATE '{REFERENCE_DATE}')::float8"
+
+ROLLUP_COLUMNS = """(
+    location_id, metric_id, period, quality, reading_count, value_sum, value_min, value_max, weighted_sum,
+    day_sum, day_sq_sum, day_value_sum, value_sq_sum
+)"""
+
+ROLLUP_AGGREGATES = f"""
+    COUNT(*),
+    SUM(c.value),
+    MIN(c.value),
+    MAX(c.value),
+    SUM(c.value * q.weight),
+    SUM({DAY_OFFSET}),
+    SUM({DAY_OFFSET} * {DAY_OFFSET}),
+    SUM({DAY_OFFSET} * c.value),
+    SUM(c.value * c.value)"""
+
+# keys touched by a bulk load, read from the staging table in dal/bulk.py
+KEYS_FROM_STAGING = """
+SELECT DISTINCT location_id, metric_id, date_trunc('month', date)::date AS period
+FROM climatedata_staging
+"""
+
+KEYS_FROM_ARRAYS = """
+SELECT DISTINCT location_id, metric_id, date_trunc('month', date)::date AS period
+FROM unnest(CAST(:location_ids AS INTEGER[]), CAST(:metric_ids AS INTEGER[]), CAST(:dates AS DATE[]))
+    AS k(location_id, metric_id, date)
+"""
+
+DELETE_ROLLUPS = """
+DELETE FROM climate_rollup_monthly r
+USING ({keys}) k
+WHERE r.location_id = k.location_id
+    AND r.metric_id = k.metric_id
+    AND r.period = k.period
+"""
+
+INSERT_ROLLUPS = f"""
+INSERT INTO climate_rollup_monthly {ROLLUP_COLUMNS}
+SELECT
+    c.location_id,
+    c.metric_id,
+    k.period,
+    c.quality,{ROLLUP_AGGREGATES}
+FROM ({{keys}}) k
+JOIN climatedata c
+    ON c.location_id = k.location_id
+    AND c.metric_id = k.metric_id
+    AND c.date >= k.period
+    AND c.date < (k.period + INTERVAL '1 month')::date
+JOIN quality_levels q ON q.ordinal = c.quality
+GROUP BY c.location_id, c.metric_id, k.period, c.quality
+"""
+
+# NOTE: taken in key order so two writes touching the same keys can't deadlock
+LOCK_ROLLUPS = """
+SELECT pg_advisory_xact_lock(hashtextextended('climate_rollup_monthly:' || location_id || ':' || metric_id || ':' || period, 0))
+FROM ({keys} ORDER BY location_id, metric_id, period) k
+"""
+
+"""
+Recomputes the rollups of the keys selected by `keys`.
+
+Concurrent writes to the same (location, metric, month) are serialized on a transaction level
+advisory lock per key. At READ COMMITTED the DELETE of the second writer doesn't see the rows
+the first one inserted and not yet committed, so without it the second INSERT would fail on
+the primary key. Once the lock is held the first writer has committed and the recomputation
+sees its readings.
+"""
+def _refresh(conn: Connection, keys: str, params: dict = None):
+    conn.execute(text(LOCK_ROLLUPS.format(keys=keys)), params or {})
+    conn.execute(text(DELETE_ROLLUPS.format(keys=keys)), params or {})
+    conn.execute(text(INSERT_ROLLUPS.format(keys=keys)), params or {})
+
+"""
+Refreshes the rollups for every month touched by the rows in the bulk staging table.
+"""
+def refresh_rollups_from_staging(conn: Connection):
+    _refresh(conn, KEYS_FROM_STAGING)
+
+"""
+Refreshes the rollups for the given (location_id, metric_id, date) readings.
+"""
+def refresh_rollups(conn: Connection, readings: Iterable[Tuple[int, int, object]]):
+    location_ids, metric_ids, dates = [], [], []
+    for location_id, metric_id, date in readings:
+        location_ids.append(location_id)
+        metric_ids.append(metric_id)
+        dates.append(date)
+    if not dates:
+        return
+    _refresh(conn, KEYS_FROM_ARRAYS, {"location_ids": location_ids, "metric_ids": metric_ids, "dates": dates})
+
+# every month of every series in one grouped scan, for loads that bypass the write paths
+REBUILD_ROLLUPS = f"""
+INSERT INTO climate_rollup_monthly {ROLLUP_COLUMNS}
+SELECT
+    c.location_id,
+    c.metric_id,
+    date_trunc('month', c.date)::date AS period,
+    c.quality,{ROLLUP_AGGREGATES}
+FROM climatedata c
+JOIN quality_levels q ON q.ordinal = c.quality
+GROUP BY c.location_id, c.metric_id, period, c.quality
+"""
+
+"""
+Rebuilds every rollup from CLIMATEDATA. Meant for bulk loads written straight into the
+table, e.g. benchmarks/generate.py, where refreshing per batch would cost more than the load.
+"""
+def rebuild_rollups(conn: Connection):
+    conn.execute(text("TRUNCATE climate_rollup_monthly"))
+    conn.execute(text(REBUILD_ROLLUPS))
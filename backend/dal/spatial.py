@@ -0,0 +1,95 @@
+import math
+from typing import Dict, List, Tuple
+
+"""
+Spatial predicates over LOCATIONS.
+
+Positions are indexed with a GiST index on `point(longitude, latitude)` (migration 9), which
+core Postgres supports without PostGIS. Every query first narrows the stations with a box
+containment (`<@`) the index answers, then keeps the ones within the exact great circle
+(haversine) distance, so only the stations near the edge of the box are ever measured.
+
+k-nearest queries widen the radius until it holds k stations, see routes/locations.py. The
+index's own `<->` ordering measures degrees, not kilometers, so it is not used for ranking.
+"""
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# half the circumference, every point on earth is within it
+MAX_RADIUS_KM = math.pi * EARTH_RADIUS_KM
+
+# NOTE: the expression must match ix_locations_position for the index to be used
+POSITION = "point({alias}.longitude, {alias}.latitude)"
+
+IN_BOX = POSITION + " <@ box(point(:{prefix}west, :{prefix}south), point(:{prefix}east, :{prefix}north))"
+
+DISTANCE_KM = (
+    f"2 * {EARTH_RADIUS_KM} * asin(least(1, sqrt("
+    "power(sin(radians({alias}.latitude - :{prefix}lat) / 2), 2) + "
+    "cos(radians(:{prefix}lat)) * cos(radians({alias}.latitude)) * power(sin(radians({alias}.longitude - :{prefix}lon) / 2), 2)"
+    ")))"
+)
+
+WITHIN = IN_BOX + " AND " + DISTANCE_KM + " <= :{prefix}radius_km"
+
+def in_box(alias: str, prefix: str) -> str:
+    return IN_BOX.format(alias=alias, prefix=prefix)
+
+def distance_km(alias: str, prefix: str) -> str:
+    return DISTANCE_KM.format(alias=alias, prefix=prefix)
+
+def within(alias: str, prefix: str) -> str:
+    return WITHIN.format(alias=alias, prefix=prefix)
+
+"""
+Great circle (haversine) distance in km between two points, DISTANCE_KM in Python.
+"""
+def great_circle_km(lat: float, lon: float, other_lat: float, other_lon: float) -> float:
+    a = math.sin(math.radians(other_lat - lat) / 2) ** 2 \
+        + math.cos(math.radians(lat)) * math.cos(math.radians(other_lat)) * math.sin(math.radians(other_lon - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+"""
+The (west, south, east, north) box around every point within `radius_km` of (lat, lon).
+
+Near the poles or across the antimeridian the box spans every longitude, the distance check
+still keeps the result exact.
+"""
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    angle = radius_km / EARTH_RADIUS_KM
+    south = max(-90.0, lat - math.degrees(angle))
+    north = min(90.0, lat + math.degrees(angle))
+    if south == -90.0 or north == 90.0 or angle >= math.pi / 2:
+        return -180.0, south, 180.0, north
+
+    # widest longitude offset of the circle
+    ratio = math.sin(angle) / math.cos(math.radians(lat))
+    if ratio >= 1:
+        return -180.0, south, 180.0, north
+    offset = math.degrees(math.asin(ratio))
+    if lon - offset < -180.0 or lon + offset > 180.0:
+        return -180.0, south, 180.0, north
+    return lon - offset, south, lon + offset, north
+
+def box_params(west: float, south: float, east: float, north: float, prefix: str) -> Dict[str, float]:
+    return {f"{prefix}west": float(west), f"{prefix}south": float(south), f"{prefix}east": float(east), f"{prefix}north": float(north)}
+
+"""
+Parameters of `within` for the points within `radius_km` of (lat, lon).
+"""
+def within_params(lat: float, lon: float, radius_km: float, prefix: str) -> Dict[str, float]:
+    return {
+        **box_params(*bounding_box(lat, lon, radius_km), prefix),
+        f"{prefix}lat": float(lat),
+        f"{prefix}lon": float(lon),
+        f"{prefix}radius_km": float(radius_km)
+    }
+
+"""
+Splits a (west, south, east, north) box into boxes the index can answer, two when it crosses
+the antimeridian (west > east).
+"""
+def split_box(west: float, south: float, east: float, north: float) -> List[Tuple[float, float, float, float]]:
+    if west <= east:
+        return [(west, south, east, north)]
+    return [(west, south, 180.0, north), (-180.0, south, east, north)]
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, List, Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session, select
+from .cache import shared
+from .dal.engine import engine, fetch_scalars, reading_from_primary
+from .dal.models.locations import Locations
+from .dal.models.metrics import Metrics
+from .dal.queries import ReadingFilters
+
+"""
+In-process registry of the dimension tables, LOCATIONS and METRICS.
+
+Both are tiny and almost never change, so instead of joining them onto every CLIMATEDATA row
+the read routes resolve metric names to ids before querying and attach location and metric
+attributes to the result rows in Python. The fact table queries stay single table index scans.
+
+The registry is loaded at startup and reloaded on the next read after a location or metric is
+written. Writes bump the dimensions version, shared through the cache backend when CACHE_URL
+is set so every worker sees it, and a read that finds a newer version than the one it loaded
+reloads both tables.
+"""
+
+DIMENSIONS_VERSION_KEY = "ecovision:dimensions_version"
+
+# NOTE: ids are SERIAL and positive, unknown metric names resolve to an id no row has
+UNKNOWN_METRIC_ID = -1
+
+@dataclass(frozen=True)
+class Dimensions:
+    version: int
+    locations: Dict[int, Locations]
+    metrics: Dict[int, Metrics]
+    metric_ids: Dict[str, int]
+
+    @classmethod
+    def of(cls, version: int, locations: List[Locations], metrics: List[Metrics]) -> "Dimensions":
+        return cls(
+            version=version,
+            locations={location.id: location for location in locations},
+            metrics={metric.id: metric for metric in metrics},
+            metric_ids={metric.name.lower(): metric.id for metric in metrics}
+        )
+
+    def covers(self, location_ids: Iterable[int], metric_ids: Iterable[int], metric_names: Iterable[str] = ()) -> bool:
+        return all(location_id in self.locations for location_id in location_ids) \
+            and all(metric_id in self.metrics for metric_id in metric_ids) \
+            and all(name.lower() in self.metric_ids for name in metric_names)
+
+    """
+    Swaps the metric names of `filters` for their ids, so queries filter on
+    CLIMATEDATA.METRIC_ID directly instead of looking the names up in METRICS.
+    """
+    def resolve(self, filters: ReadingFilters) -> ReadingFilters:
+        if not filters.metric:
+            return filters
+        metric_ids = [self.metric_ids[name] for name in filter_metric_names(filters) if name in self.metric_ids]
+        return replace(filters, metric=None, metric_id=metric_ids or UNKNOWN_METRIC_ID)
+
+    """
+    Maps every location id to its group key for group_by, the id itself for "location".
+
+    NOTE: keys are strings, they end up as JSON object keys either way.
+    """
+    def location_groups(self, group_by: str) -> Dict[int, str]:
+        column = "id" if group_by == "location" else group_by
+        return {location_id: str(getattr(location, column)) for location_id, location in self.locations.items()}
+
+def filter_metric_names(filters: ReadingFilters) -> tuple:
+    return filters.metric if isinstance(filters.metric, tuple) else (filters.metric,)
+
+_current: Optional[Dimensions] = None
+_local_version = 0
+_version_lock = threading.Lock()
+
+def dimensions_version() -> int:
+    if shared is not None:
+        return shared.get_int(DIMENSIONS_VERSION_KEY)
+    return _local_version
+
+"""
+Marks the loaded dimensions stale. Called by every path that writes locations or metrics.
+"""
+def bump_dimensions_version():
+    global _local_version
+    with _version_lock:
+        _local_version += 1
+    if shared is not None:
+        shared.incr(DIMENSIONS_VERSION_KEY)
+
+"""
+Loads the dimensions synchronously, e.g. at startup.
+"""
+def load_dimensions() -> Dimensions:
+    global _current
+    # the version is read first, a write landing during the load only triggers another reload
+    version = dimensions_version()
+    with Session(engine) as session:
+        _current = Dimensions.of(version, session.exec(select(Locations)).all(), session.exec(select(Metrics)).all())
+    return _current
+
+"""
+Synchronous counterpart of dimensions() for code running outside the event loop, e.g. bulk
+ingestion in a worker thread or from the CLI.
+"""
+def current_dimensions(location_ids: Iterable[int] = (), metric_ids: Iterable[int] = ()) -> Dimensions:
+    current = _current
+    if current is None or current.version != dimensions_version() or not current.covers(location_ids, metric_ids):
+        current = load_dimensions()
+    return current
+
+"""
+Resolves the metric names of `filters` to ids, see Dimensions.resolve. Filters without a
+metric are returned as they are, without touching the registry.
+
+A name the registry doesn't know reloads it once, like a missing id, so a metric created
+through another worker resolves before it falls back to UNKNOWN_METRIC_ID.
+"""
+async def resolve_metrics(filters: ReadingFilters) -> ReadingFilters:
+    if not filters.metric:
+        return filters
+    return (await dimensions(metric_names=filter_metric_names(filters))).resolve(filters)
+
+"""
+Returns the current dimensions, reloading them when a write made them stale.
+
+Rows can reference a location or metric written after the version was checked, callers pass
+the ids their rows hold, or the metric names they filter on, and the dimensions are reloaded
+when any of them is missing.
+"""
+async def dimensions(location_ids: Iterable[int] = (), metric_ids: Iterable[int] = (), metric_names: Iterable[str] = ()) -> Dimensions:
+    global _current
+    version = await run_in_threadpool(dimensions_version) if shared is not None else _local_version
+    current = _current
+    if current is None or current.version != version or not current.covers(location_ids, metric_ids, metric_names):
+        # NOTE: from the primary, a lagging replica would store the old rows under the new version
+        with reading_from_primary():
+            locations, metrics = await asyncio.gather(fetch_scalars(select(Locations)), fetch_scalars(select(Metrics)))
+        current = _current = Dimensions.of(version, locations, metrics)
+    return current
@@ -0,0 +1,208 @@
+import argparse
+import csv
+import datetime
+import io
+import json
+import time
+from itertools import islice
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from pydantic import BaseModel, ValidationError, field_validator
+from .cache import bump_data_version
+from .dal.bulk import upsert_climate_rows
+from .dal.engine import engine
+from .dal.quality import quality_ordinal
+from .dimensions import Dimensions, current_dimensions
+from .live import broadcaster
+
+"""
+Bulk ingestion of climate readings from JSON, NDJSON or CSV.
+
+Records are parsed lazily, validated in batches and written through the COPY based
+upsert in dal/bulk.py. Used by POST /api/v1/climate/bulk, the seed flow and the CLI:
+
+`python -m backend.ingest ../data/sample_data.json`
+"""
+
+BATCH_SIZE = 10_000
+
+# Cap the errors echoed back so one bad file can't produce a huge response
+MAX_REPORTED_ERRORS = 50
+
+FORMATS = ["json", "ndjson", "csv"]
+
+CONTENT_TYPES = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "text/csv": "csv",
+}
+
+"""
+A single climate reading as accepted by the ingestion pipeline.
+"""
+class ClimateRecord(BaseModel):
+    location_id: int
+    metric_id: int
+    date: datetime.date
+    value: float
+    quality: str
+
+    @field_validator("quality")
+    @classmethod
+    def known_quality(cls, quality: str) -> str:
+        quality_ordinal(quality)
+        return quality.lower()
+
+    def as_row(self) -> Tuple:
+        return (self.location_id, self.metric_id, self.date, self.value, quality_ordinal(self.quality))
+
+class IngestError(BaseModel):
+    record: int
+    error: str
+
+class IngestReport(BaseModel):
+    received: int
+    written: int
+    rejected: int
+    elapsed_seconds: float
+    rows_per_second: float
+    errors: List[IngestError]
+
+"""
+Maps a request Content-Type header onto an ingest format.
+"""
+def format_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    if not content_type:
+        return None
+    return CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+
+"""
+Maps a file name onto an ingest format by its extension.
+"""
+def format_from_path(path: str) -> Optional[str]:
+    extension = path.rsplit(".", 1)[-1].lower()
+    return extension if extension in FORMATS else None
+
+"""
+Yields raw records from a binary stream.
+
+JSON accepts either a list of readings or a seed style document with a "climate_data" key.
+NDJSON and CSV are read line by line so large uploads are never fully materialized.
+
+Raises ValueError for a body that can't be read as records at all.
+"""
+def parse_records(stream: BinaryIO, format: str) -> Iterator[Dict[str, Any]]:
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    try:
+        if format == "json":
+            document = json.load(text)
+            if isinstance(document, dict):
+                document = document.get("climate_data", [])
+            if not isinstance(document, list):
+                raise ValueError("expected a list of readings or an object with a climate_data list")
+            yield from document
+        elif format == "ndjson":
+            for line in text:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            try:
+                yield from csv.DictReader(text)
+            except csv.Error as e:
+                raise ValueError(str(e))
+    finally:
+        # the caller owns the underlying stream
+        text.detach()
+
+"""
+Validates a batch of raw records. Invalid records are reported and skipped.
+
+With a `registry`, called with the batch's location and metric ids like dimensions(), records
+referencing a location or metric that doesn't exist are reported too instead of failing the
+write of the whole batch on the foreign keys.
+"""
+def validate_batch(
+    records: List[Dict[str, Any]],
+    offset: int = 0,
+    registry: Optional[Callable[[Iterable[int], Iterable[int]], Dimensions]] = None
+    ) -> Tuple[List[Tuple], List[IngestError]]:
+    validated = []
+    errors = []
+    for index, record in enumerate(records, start=offset):
+        try:
+            validated.append((index, ClimateRecord.model_validate(record).as_row()))
+        except ValidationError as e:
+            errors.append(IngestError(record=index, error=str(e.errors(include_url=False))))
+    if registry is None or not validated:
+        return [row for _, row in validated], errors
+
+    known = registry({row[0] for _, row in validated}, {row[1] for _, row in validated})
+    rows = []
+    for index, row in validated:
+        if row[0] not in known.locations:
+            errors.append(IngestError(record=index, error=f"Unknown location_id {row[0]}"))
+        elif row[1] not in known.metrics:
+            errors.append(IngestError(record=index, error=f"Unknown metric_id {row[1]}"))
+        else:
+            rows.append(row)
+    errors.sort(key=lambda error: error.record)
+    return rows, errors
+
+def batched(records: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(records)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+"""
+Validates and upserts records batch by batch. Each batch commits on its own, which is
+safe to retry since writes are idempotent on (location_id, metric_id, date).
+"""
+def ingest_records(records: Iterable[Dict[str, Any]], batch_size: int = BATCH_SIZE) -> IngestReport:
+    start = time.perf_counter()
+    received = 0
+    written = 0
+    errors: List[IngestError] = []
+
+    try:
+        for batch in batched(records, batch_size):
+            rows, batch_errors = validate_batch(batch, offset=received, registry=current_dimensions)
+            written_rows = upsert_climate_rows(engine, rows)
+            written += len(written_rows)
+            broadcaster.publish(written_rows)
+            errors.extend(batch_errors)
+            received += len(batch)
+    finally:
+        # batches committed before a parse error still invalidate cached responses
+        if written:
+            bump_data_version()
+
+    elapsed = time.perf_counter() - start
+    return IngestReport(
+        received=received,
+        written=written,
+        rejected=len(errors),
+        elapsed_seconds=round(elapsed, 3),
+        rows_per_second=round(received / elapsed, 1) if elapsed else 0.0,
+        errors=errors[:MAX_REPORTED_ERRORS]
+    )
+
+def ingest_stream(stream: BinaryIO, format: str, batch_size: int = BATCH_SIZE) -> IngestReport:
+    return ingest_records(parse_records(stream, format), batch_size)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk load climate readings into CLIMATEDATA.")
+    parser.add_argument("path", help="JSON, NDJSON or CSV file")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    format = args.format or format_from_path(args.path)
+    if format is None:
+        parser.error("could not infer the format from the file name, pass --format")
+
+    with open(args.path, "rb") as file:
+        report = ingest_stream(file, format, args.batch_size)
+    print(report.model_dump_json(indent=2))
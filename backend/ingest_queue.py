@@ -0,0 +1,172 @@
+import asyncio
+import os
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from .instrumentation import INGEST_BATCH_ROWS, INGEST_READINGS
+
+"""
+Group commit for single reading writes.
+
+Sensors POST one reading at a time, and a Session, commit and refresh per reading spends the
+database's time on fsyncs and round trips. With INGEST_QUEUE_ENABLED, POST /create_climate
+validates the reading and puts it on this queue. A single writer task takes up to
+INGEST_BATCH_SIZE readings at a time, waiting at most INGEST_BATCH_WINDOW_MS for a batch to
+fill, and writes each batch in one transaction through `write`.
+
+- At most INGEST_QUEUE_MAX_PENDING readings may wait, any more get a 503 with Retry-After.
+- A batch that fails as a whole is retried one reading at a time, so one bad reading fails
+  alone instead of taking its batch with it.
+- The app lifespan starts the writer and, on shutdown, stops taking readings and waits for the
+  queued ones to be written.
+"""
+
+load_dotenv()
+
+INGEST_QUEUE_ENABLED = os.getenv("INGEST_QUEUE_ENABLED", "false").strip().lower() in ("1", "true", "yes")
+INGEST_QUEUE_MAX_PENDING = int(os.getenv("INGEST_QUEUE_MAX_PENDING", 10_000))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 500))
+INGEST_BATCH_WINDOW_MS = float(os.getenv("INGEST_BATCH_WINDOW_MS", 20))
+
+# seconds a client is asked to wait when the queue is full
+RETRY_AFTER_SECONDS = 1
+
+"""
+A queued write, `future` is only set when the client waits for the result.
+"""
+@dataclass
+class QueuedWrite:
+    item: Any
+    future: Optional[asyncio.Future] = None
+
+"""
+Batches queued items into calls of `write(items) -> results`, one result per item in order. A
+result that is an exception fails its item alone. `on_written(items)` is called after every
+batch that wrote something.
+"""
+class IngestQueue:
+    def __init__(
+        self,
+        name: str,
+        write: Callable[[Sequence], List],
+        on_written: Optional[Callable[[Sequence], None]] = None,
+        max_pending: int = INGEST_QUEUE_MAX_PENDING,
+        batch_size: int = INGEST_BATCH_SIZE,
+        window_ms: float = INGEST_BATCH_WINDOW_MS
+    ):
+        self.name = name
+        self.write = write
+        self.on_written = on_written
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.window_seconds = window_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._pending = 0
+        self._closing = False
+
+    def running(self) -> bool:
+        return self._writer is not None and not self._closing
+
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self):
+        self._closing = False
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.get_running_loop().create_task(self._run(), name=f"{self.name}_ingest_queue")
+
+    """
+    Queues `item`. With `wait` returns its result once its batch is written, otherwise right away.
+    """
+    async def submit(self, item: Any, wait: bool = True) -> Any:
+        if not self.running():
+            raise HTTPException(status_code=503, detail="The ingestion queue is not accepting writes")
+        if self._pending >= self.max_pending:
+            raise HTTPException(
+                status_code=503,
+                detail="The ingestion queue is full, retry later",
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+            )
+
+        future = asyncio.get_running_loop().create_future() if wait else None
+        self._pending += 1
+        self._queue.put_nowait(QueuedWrite(item, future))
+        if future is None:
+            return None
+        # NOTE: shielded, a client disconnecting doesn't cancel the write
+        return await asyncio.shield(future)
+
+    """
+    Stops taking writes and waits until every queued one is written.
+    """
+    async def drain(self):
+        if not self.running():
+            return
+        self._closing = True
+        self._queue.put_nowait(None)
+        await self._writer
+        self._writer = None
+
+    async def _next_batch(self) -> List[Optional[QueuedWrite]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.window_seconds
+        while batch[-1] is not None and len(batch) < self.batch_size:
+            if self._queue.empty():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            closing = batch[-1] is None
+            writes = [write for write in batch if write is not None]
+            if writes:
+                await self._write_batch(writes)
+            if closing:
+                return
+
+    async def _write_batch(self, writes: List[QueuedWrite]):
+        items = [write.item for write in writes]
+        try:
+            results = await run_in_threadpool(self.write, items)
+        except Exception:
+            if len(writes) == 1:
+                traceback.print_exc()
+                results = [HTTPException(status_code=500, detail="The reading could not be written")]
+            else:
+                print(f"INGEST BATCH OF {len(writes)} FAILED, RETRYING ONE BY ONE")
+                for write in writes:
+                    await self._write_batch([write])
+                return
+
+        self._pending -= len(writes)
+        written = [item for item, result in zip(items, results) if not isinstance(result, Exception)]
+        INGEST_BATCH_ROWS.observe(len(items), self.name)
+        INGEST_READINGS.inc(self.name, "written", amount=len(written))
+        INGEST_READINGS.inc(self.name, "failed", amount=len(items) - len(written))
+        if written and self.on_written is not None:
+            try:
+                self.on_written(written)
+            except Exception:
+                traceback.print_exc()
+
+        for write, result in zip(writes, results):
+            if write.future is None or write.future.done():
+                continue
+            if isinstance(result, Exception):
+                write.future.set_exception(result)
+            else:
+                write.future.set_result(result)
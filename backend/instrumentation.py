@@ -0,0 +1,271 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+
+"""
+Request instrumentation.
+
+Every request gets a RequestTimings in a context variable. The hot paths add to it:
+- dal/engine.py: pool wait, DB time and rows fetched
+- routes/responses.py: JSON serialization
+- `offload`: NumPy compute handed to the threadpool
+
+dal/engine.py also counts statement executions by compiled cache result and the server side
+prepared statements asyncpg creates, so cache hit rates can be read off /metrics.
+
+The middleware folds the totals into process-wide histograms once the request is done.
+`/metrics` renders them in the Prometheus text exposition format, so any Prometheus
+compatible scraper can collect them with no agent or external service.
+
+Phases are summed per request, so work a route runs concurrently (e.g. the dashboard's
+parallel queries) can add up to more than the request's wall time.
+
+Profiling is opt-in with PROFILING_ENABLED. When it is on, `?profile=1` or an `X-Profile: 1`
+header runs a single request under cProfile and returns the report instead of the response
+body. A profiled request bypasses the response cache and runs its threadpool work inline,
+because cProfile only sees the thread it was started on.
+"""
+
+load_dotenv()
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").strip().lower() in ("1", "true", "yes")
+# lines of the cProfile report, sorted by cumulative time
+PROFILE_LINES = int(os.getenv("PROFILE_LINES", 60))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+PHASES = ("pool_wait", "db", "compute", "serialize")
+
+@dataclass
+class RequestTimings:
+    phases: Dict[str, float] = field(default_factory=lambda: dict.fromkeys(PHASES, 0.0))
+    rows: int = 0
+    profiling: bool = False
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+"""
+Adds the time spent in the block to a phase of the current request, if any.
+"""
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _current.get()
+        if timings is not None:
+            timings.phases[phase] += time.perf_counter() - start
+
+def record_rows(count: int):
+    timings = _current.get()
+    if timings is not None:
+        timings.rows += count
+
+def profiling() -> bool:
+    timings = _current.get()
+    return timings is not None and timings.profiling
+
+"""
+Runs blocking work on the threadpool, timed as `phase` unless it is None. Inline while the
+request is profiled.
+"""
+async def offload(function: Callable, *args, phase: Optional[str] = "compute") -> Any:
+    with timed(phase) if phase else nullcontext():
+        if profiling():
+            return function(*args)
+        return await run_in_threadpool(function, *args)
+
+"""
+Cumulative histogram keyed on a tuple of label values.
+"""
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            # per bucket counts, then sum and count
+            series = self._series.setdefault(label_values, [0] * len(self.buckets) + [0.0, 0])
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            labels = format_labels(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{{{labels},le=\"{bound:g}\"}} {cumulative}")
+            lines.append(f"{self.name}_bucket{{{labels},le=\"+Inf\"}} {series[-1]}")
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+"""
+Monotonic counter keyed on a tuple of label values.
+"""
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._series: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        with self._lock:
+            return self._series.get(label_values, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._series)
+        for label_values, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{{{format_labels(zip(self.labels, label_values))}}} {value:g}")
+        return lines
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_labels(pairs) -> str:
+    return ",".join(f'{name}="{escape(value)}"' for name, value in pairs)
+
+REQUEST_SECONDS = Histogram(
+    "ecovision_http_request_duration_seconds", "Request latency by route",
+    ["method", "route", "status"], LATENCY_BUCKETS
+)
+PHASE_SECONDS = Histogram(
+    "ecovision_request_phase_seconds", "Time per request spent waiting for a pooled connection, in the DB, in compute and serializing",
+    ["route", "phase"], LATENCY_BUCKETS
+)
+ROWS_FETCHED = Histogram(
+    "ecovision_db_rows_fetched", "Rows fetched from Postgres per request",
+    ["route"], ROW_BUCKETS
+)
+
+INGEST_BATCH_ROWS = Histogram(
+    "ecovision_ingest_batch_rows", "Readings per batch the ingestion queue commits",
+    ["queue"], ROW_BUCKETS
+)
+
+HISTOGRAMS = [REQUEST_SECONDS, PHASE_SECONDS, ROWS_FETCHED, INGEST_BATCH_ROWS]
+
+# result is SQLAlchemy's compiled cache outcome: cache_hit, cache_miss, caching_disabled or no_cache_key
+STATEMENT_EXECUTIONS = Counter(
+    "ecovision_db_statement_executions_total", "Statements executed by engine and compiled cache result",
+    ["engine", "result"]
+)
+STATEMENTS_PREPARED = Counter(
+    "ecovision_db_statements_prepared_total", "Server side prepared statements created, executions beyond these reused one",
+    ["engine"]
+)
+
+READ_FAILOVERS = Counter(
+    "ecovision_db_read_failovers_total", "Reads moved off a read replica that could not be reached",
+    ["replica"]
+)
+
+INGEST_READINGS = Counter(
+    "ecovision_ingest_queue_readings_total", "Readings taken off the ingestion queue by result: written or failed",
+    ["queue", "result"]
+)
+
+# event is reading, anomaly or overflow, counted once per subscriber it is sent to
+LIVE_EVENTS = Counter(
+    "ecovision_live_events_total", "Events sent to live stream subscribers by event",
+    ["event"]
+)
+
+COUNTERS = [STATEMENT_EXECUTIONS, STATEMENTS_PREPARED, READ_FAILOVERS, INGEST_READINGS, LIVE_EVENTS]
+
+"""
+Renders every histogram and counter plus the given gauges, `{name: (help, [(labels, value)])}`.
+"""
+def render_metrics(gauges: Dict[str, Tuple[str, List[Tuple[Dict[str, str], float]]]]) -> str:
+    lines = []
+    for metric in HISTOGRAMS + COUNTERS:
+        lines.extend(metric.render())
+    for name, (help, samples) in gauges.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            lines.append(f"{name}{{{format_labels(labels.items())}}} {value}" if labels else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+def wants_profile(request: Request) -> bool:
+    return PROFILING_ENABLED and "1" in (request.query_params.get("profile"), request.headers.get("x-profile"))
+
+"""
+Route template of the matched route, so label cardinality stays bounded by the app's routes.
+"""
+def route_label(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+async def profile_request(request: Request, call_next) -> Response:
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        response = await call_next(request)
+        # drain the body so streamed work is part of the profile
+        async for _ in response.body_iterator:
+            pass
+    finally:
+        profiler.disable()
+
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).strip_dirs().sort_stats("cumulative").print_stats(PROFILE_LINES)
+    timings = _current.get()
+    summary = " ".join(f"{phase}={seconds * 1000:.2f}ms" for phase, seconds in timings.phases.items())
+    return Response(
+        content=f"{request.method} {request.url.path} -> {response.status_code}\n{summary} rows={timings.rows}\n{report.getvalue()}",
+        media_type="text/plain",
+        headers={"X-Profile-Status": str(response.status_code)}
+    )
+
+async def instrument_requests(request: Request, call_next) -> Response:
+    timings = RequestTimings(profiling=wants_profile(request))
+    token = _current.set(timings)
+    start = time.perf_counter()
+    try:
+        if timings.profiling:
+            response = await profile_request(request, call_next)
+        else:
+            response = await call_next(request)
+    finally:
+        _current.reset(token)
+
+    route = route_label(request)
+    REQUEST_SECONDS.observe(time.perf_counter() - start, request.method, route, str(response.status_code))
+    for phase, seconds in timings.phases.items():
+        PHASE_SECONDS.observe(seconds, route, phase)
+    ROWS_FETCHED.observe(timings.rows, route)
+    return response
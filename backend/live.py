@@ -0,0 +1,488 @@
+import asyncio
+import datetime
+import json
+import os
+import traceback
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from fastapi import HTTPException
+from dotenv import load_dotenv
+from .analytics.trends import ANOMALY_SIGMA
+from .dal.engine import POSTGRES_URL, engine, fetch_all, reading_from_primary
+from .dal.quality import quality_name
+from .dal.queries import ReadingFilters, statement
+from .dal.spatial import great_circle_km
+from .dimensions import Dimensions, dimensions
+from .instrumentation import LIVE_EVENTS
+from .routes.responses import dumps
+
+"""
+Live stream of newly written readings and anomalies, served as Server-Sent Events by
+GET /api/v1/climate/live.
+
+Every write path (POST /create_climate directly or through the ingestion queue, and the bulk
+loads) publishes the readings it committed. A single dispatcher task per process matches them
+against the subscribers' filters and puts the serialized events on their queues, so an idle
+subscriber is one queue and one suspended response coroutine on the event loop, no connection
+and no polling.
+
+Fan-out across processes is set with LIVE_FANOUT:
+- `local` (default) hands the readings straight to this process' dispatcher, enough for a
+  single worker
+- `postgres` sends them with NOTIFY and every worker LISTENs on one connection, so subscribers
+  of any worker see the writes of every worker and of `python -m backend.ingest`
+
+Delivery is best effort. Readings written while a listener reconnects are not replayed, and a
+subscriber that falls LIVE_SUBSCRIBER_BUFFER events behind gets an `overflow` event and is
+disconnected, it can re-read /climate and subscribe again.
+
+Anomalies use the /trends definition, |z| > ANOMALY_SIGMA against the series' mean and standard
+deviation, evaluated incrementally: a series' running count, sum and sum of squares are seeded
+from the monthly rollups the first time a subscriber receives one of its readings and updated
+with every reading after that, an overwritten reading replacing its previous value. They are
+dropped when the last subscriber leaves.
+
+Readings are published after they commit, so the batches already waiting for dispatch when a
+series is seeded are in the rollups it's seeded from. Batches are numbered as they arrive and
+the seed records the last one, later dispatches skip the stats updates up to it.
+
+NOTE: asyncpg is only imported by the LISTEN connection of LIVE_FANOUT=postgres.
+"""
+
+load_dotenv()
+
+# local or postgres, see above
+LIVE_FANOUT = os.getenv("LIVE_FANOUT", "local").strip().lower()
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", 10_000))
+# events a subscriber may fall behind before it is disconnected
+LIVE_SUBSCRIBER_BUFFER = int(os.getenv("LIVE_SUBSCRIBER_BUFFER", 1000))
+# a comment is sent on idle streams so proxies don't time them out
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", 15))
+# a series needs this many readings before its z-scores are reported
+LIVE_MIN_READINGS = int(os.getenv("LIVE_MIN_READINGS", 30))
+
+NOTIFY_CHANNEL = "ecovision_readings"
+# NOTE: Postgres rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_PAYLOAD_BYTES = 7900
+NOTIFY = "SELECT pg_notify(:channel, :payload)"
+LISTEN_RETRY_SECONDS = 1
+
+# sent first, how long an EventSource waits before reconnecting after the stream ends
+RECONNECT_MS = 3000
+HEARTBEAT = b": keepalive\n\n"
+
+# running count, sum and sum of squares of the given series, from the monthly rollups
+SERIES_STATS_QUERY = """
+SELECT r.location_id, r.metric_id, SUM(r.reading_count) AS n, SUM(r.value_sum) AS total, SUM(r.value_sq_sum) AS squares
+FROM climate_rollup_monthly r
+JOIN unnest(CAST(:location_ids AS INTEGER[]), CAST(:metric_ids AS INTEGER[])) AS s(location_id, metric_id)
+    ON s.location_id = r.location_id AND s.metric_id = r.metric_id
+GROUP BY r.location_id, r.metric_id
+"""
+
+# (id, location_id, metric_id, date, value, quality ordinal, previous value) of a written reading,
+# the previous value is the one an overwritten reading had and None for a new one
+Reading = Tuple[int, int, int, datetime.date, float, int, Optional[float]]
+
+"""
+Running moments of one (location, metric) series. The batches numbered after `seeded_by`, the
+one being dispatched when they were seeded, up to `counted_through` were already in the rollups
+the moments were seeded from.
+"""
+class SeriesStats:
+    __slots__ = ("n", "total", "squares", "seeded_by", "counted_through")
+
+    def __init__(self, n: int = 0, total: float = 0.0, squares: float = 0.0, seeded_by: int = 0, counted_through: int = 0):
+        self.n = n
+        self.total = total
+        self.squares = squares
+        self.seeded_by = seeded_by
+        self.counted_through = counted_through
+
+    def counted(self, batch: int) -> bool:
+        return self.seeded_by < batch <= self.counted_through
+
+    def add(self, value: float):
+        self.n += 1
+        self.total += value
+        self.squares += value * value
+
+    def remove(self, value: float):
+        if self.n > 0:
+            self.n -= 1
+            self.total -= value
+            self.squares -= value * value
+
+    """
+    The z-score of `value` against the series so far, None until the series has
+    LIVE_MIN_READINGS readings or when it doesn't vary.
+    """
+    def z(self, value: float) -> Optional[float]:
+        if self.n < LIVE_MIN_READINGS:
+            return None
+        mean = self.total / self.n
+        variance = self.squares / self.n - mean * mean
+        if variance <= 0:
+            return None
+        return (value - mean) / variance ** 0.5
+
+def _id_set(value) -> Optional[Set[int]]:
+    if value is None:
+        return None
+    return set(value) if isinstance(value, tuple) else {value}
+
+"""
+A subscriber's filters, evaluated in Python against each published reading.
+
+NOTE: takes the filters with metric names already resolved to ids, see dimensions.resolve_metrics.
+"""
+class LiveFilter:
+    def __init__(self, filters: ReadingFilters, anomalies_only: bool = False):
+        self.location_ids = _id_set(filters.location_id)
+        self.metric_ids = _id_set(filters.metric_id)
+        self.start_date = filters.start_date
+        self.end_date = filters.end_date
+        self.min_quality = filters.min_quality
+        self.near = filters.near
+        self.anomalies_only = anomalies_only
+        # location id -> whether it is within the near circle
+        self._near_locations: Dict[int, bool] = {}
+
+    def matches(self, reading: Reading, registry: Dimensions) -> bool:
+        _, location_id, metric_id, date, _, quality, _ = reading
+        if self.location_ids is not None and location_id not in self.location_ids:
+            return False
+        if self.metric_ids is not None and metric_id not in self.metric_ids:
+            return False
+        if (self.start_date and date < self.start_date) or (self.end_date and date > self.end_date):
+            return False
+        if self.min_quality and quality < self.min_quality:
+            return False
+        if self.near:
+            near = self._near_locations.get(location_id)
+            if near is None:
+                lat, lon, radius_km = self.near
+                location = registry.locations[location_id]
+                near = self._near_locations[location_id] = great_circle_km(lat, lon, location.latitude, location.longitude) <= radius_km
+            return near
+        return True
+
+"""
+One open stream. Events are queued as serialized SSE messages, None ends the stream.
+"""
+class Subscriber:
+    def __init__(self, live_filter: LiveFilter, buffer: int):
+        self.filter = live_filter
+        self.buffer = buffer
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+
+    """
+    Queues `message`. Returns False, after replacing the backlog with an overflow event, when
+    the subscriber is more than `buffer` events behind.
+    """
+    def send(self, message: bytes) -> bool:
+        if self.closed:
+            return False
+        if self.queue.qsize() < self.buffer:
+            self.queue.put_nowait(message)
+            return True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(sse_message("overflow", {"buffer": self.buffer}))
+        LIVE_EVENTS.inc("overflow")
+        self.close()
+        return False
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.queue.put_nowait(None)
+
+def sse_message(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+"""
+A reading in the /climate row shape.
+"""
+def reading_data(reading: Reading, registry: Dimensions) -> Dict:
+    id, location_id, metric_id, date, value, quality, _ = reading
+    location, metric = registry.locations[location_id], registry.metrics[metric_id]
+    return {
+        "id": id,
+        "location_id": location_id,
+        "location_name": location.name,
+        "latitude": location.latitude,
+        "longitude": location.longitude,
+        "date": date,
+        "metric": metric.name,
+        "value": value,
+        "unit": metric.unit,
+        "quality": quality_name(quality)
+    }
+
+"""
+Splits readings into JSON arrays that each fit in one NOTIFY payload.
+"""
+def notify_payloads(readings: Iterable[Reading]) -> Iterator[str]:
+    chunk, size = [], 2
+    for id, location_id, metric_id, date, value, quality, previous in readings:
+        encoded = json.dumps([id, location_id, metric_id, str(date), value, quality, previous])
+        if chunk and size + len(encoded) + 1 > NOTIFY_PAYLOAD_BYTES:
+            yield "[" + ",".join(chunk) + "]"
+            chunk, size = [], 2
+        chunk.append(encoded)
+        size += len(encoded) + 1
+    if chunk:
+        yield "[" + ",".join(chunk) + "]"
+
+def parse_payload(payload: str) -> List[Reading]:
+    return [
+        (id, location_id, metric_id, datetime.date.fromisoformat(date), value, quality, previous)
+        for id, location_id, metric_id, date, value, quality, previous in json.loads(payload)
+    ]
+
+"""
+Fans published readings out to the subscribers of this process.
+
+Subscribers with a location_id filter are indexed by location, so a reading is only matched
+against the subscribers of its own station and the ones that take every station.
+"""
+class Broadcaster:
+    def __init__(self, max_subscribers: int = LIVE_MAX_SUBSCRIBERS, buffer: int = LIVE_SUBSCRIBER_BUFFER, fanout: str = LIVE_FANOUT):
+        self.max_subscribers = max_subscribers
+        self.buffer = buffer
+        self.fanout = fanout
+        self._by_location: Dict[int, Set[Subscriber]] = {}
+        self._everywhere: Set[Subscriber] = set()
+        self._subscribers: Set[Subscriber] = set()
+        self._stats: Dict[Tuple[int, int], SeriesStats] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inbox: Optional[asyncio.Queue] = None
+        # number of the last batch put in the inbox, only touched on the event loop
+        self._received = 0
+        self._tasks: List[asyncio.Task] = []
+
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._inbox = asyncio.Queue()
+        self._tasks = [self._loop.create_task(self._run(), name="live_dispatch")]
+        if self.fanout == "postgres":
+            self._tasks.append(self._loop.create_task(self._listen(), name="live_listen"))
+
+    """
+    Ends every open stream and stops dispatching.
+    """
+    async def stop(self):
+        self._loop = None
+        for subscriber in list(self._subscribers):
+            self.unsubscribe(subscriber)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def subscribe(self, live_filter: LiveFilter) -> Subscriber:
+        if not self.running():
+            raise HTTPException(status_code=503, detail="Live streams are not available")
+        if len(self._subscribers) >= self.max_subscribers:
+            raise HTTPException(status_code=503, detail="Too many live streams, retry later")
+
+        subscriber = Subscriber(live_filter, self.buffer)
+        if live_filter.location_ids is None:
+            self._everywhere.add(subscriber)
+        else:
+            for location_id in live_filter.location_ids:
+                self._by_location.setdefault(location_id, set()).add(subscriber)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscriber.close()
+        if subscriber not in self._subscribers:
+            return
+        self._subscribers.discard(subscriber)
+        if subscriber.filter.location_ids is None:
+            self._everywhere.discard(subscriber)
+        else:
+            for location_id in subscriber.filter.location_ids:
+                subscribers = self._by_location[location_id]
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._by_location[location_id]
+        if not self._subscribers:
+            # nothing keeps them current without subscribers, they are seeded again on demand
+            self._stats.clear()
+
+    """
+    Yields the subscriber's events as they arrive, with a heartbeat comment on idle streams.
+    Unsubscribes when the stream ends or the client disconnects.
+    """
+    async def stream(self, subscriber: Subscriber) -> AsyncIterator[bytes]:
+        try:
+            yield f"retry: {RECONNECT_MS}\n\n".encode()
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), LIVE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+    """
+    Publishes committed readings. Safe to call from any thread, e.g. the threadpool the write
+    paths run on, and a no-op in a process that isn't serving streams with LIVE_FANOUT=local.
+    """
+    def publish(self, readings: Sequence[Reading]):
+        if not readings:
+            return
+        if self.fanout == "postgres":
+            # NOTE: the readings are committed already, failing to announce them must not fail the write
+            try:
+                with engine.begin() as conn:
+                    conn.execute(statement(NOTIFY), [{"channel": NOTIFY_CHANNEL, "payload": payload} for payload in notify_payloads(readings)])
+            except Exception:
+                traceback.print_exc()
+            return
+        self._enqueue([tuple(reading) for reading in readings])
+
+    def _enqueue(self, readings: List[Reading]):
+        loop, inbox = self._loop, self._inbox
+        if loop is None or not self._subscribers:
+            return
+        try:
+            loop.call_soon_threadsafe(self._receive, inbox, readings)
+        except RuntimeError:
+            # the loop closed while shutting down
+            pass
+
+    def _receive(self, inbox: asyncio.Queue, readings: List[Reading]):
+        self._received += 1
+        inbox.put_nowait((self._received, readings))
+
+    def _notified(self, connection, pid: int, channel: str, payload: str):
+        if self._subscribers:
+            self._enqueue(parse_payload(payload))
+
+    async def _listen(self):
+        import asyncpg
+
+        while True:
+            try:
+                connection = await asyncpg.connect(POSTGRES_URL)
+            except (OSError, asyncpg.PostgresError):
+                print(f"LIVE LISTENER COULD NOT CONNECT, RETRYING IN {LISTEN_RETRY_SECONDS}S")
+                await asyncio.sleep(LISTEN_RETRY_SECONDS)
+                continue
+
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            try:
+                await connection.add_listener(NOTIFY_CHANNEL, self._notified)
+                await lost.wait()
+                print("LIVE LISTENER LOST ITS CONNECTION, RECONNECTING")
+            finally:
+                if not connection.is_closed():
+                    await connection.close()
+
+    async def _run(self):
+        while True:
+            batch, readings = await self._inbox.get()
+            try:
+                await self.dispatch(readings, batch)
+            except Exception:
+                traceback.print_exc()
+
+    """
+    Sends each reading, and an anomaly event when it is one, to the subscribers it matches.
+    Every message is serialized once however many subscribers receive it.
+
+    `batch` is the readings' number in the inbox, the last one received when not given.
+    """
+    async def dispatch(self, readings: List[Reading], batch: Optional[int] = None):
+        if not self._subscribers:
+            return
+        batch = self._received if batch is None else batch
+        registry = await dimensions({reading[1] for reading in readings}, {reading[2] for reading in readings})
+        matched = [self._matching(reading, registry) for reading in readings]
+        await self._seed({
+            (reading[1], reading[2]) for reading, subscribers in zip(readings, matched)
+            if subscribers and (reading[1], reading[2]) not in self._stats
+        }, readings, batch)
+
+        for reading, subscribers in zip(readings, matched):
+            stats = self._stats.get((reading[1], reading[2]))
+            z = None
+            if stats is not None:
+                value, previous = reading[4], reading[6]
+                if stats.counted(batch):
+                    # already in the seeded moments
+                    z = stats.z(value)
+                else:
+                    if previous is not None:
+                        stats.remove(previous)
+                    z = stats.z(value)
+                    stats.add(value)
+            if not subscribers:
+                continue
+
+            data = reading_data(reading, registry)
+            anomaly = sse_message("anomaly", {**data, "deviation": round(z, 2)}) if z is not None and abs(z) > ANOMALY_SIGMA else None
+            message = None
+            for subscriber in subscribers:
+                if not subscriber.filter.anomalies_only:
+                    message = message or sse_message("reading", data)
+                    if not subscriber.send(message):
+                        self.unsubscribe(subscriber)
+                        continue
+                    LIVE_EVENTS.inc("reading")
+                if anomaly is not None:
+                    if not subscriber.send(anomaly):
+                        self.unsubscribe(subscriber)
+                        continue
+                    LIVE_EVENTS.inc("anomaly")
+
+    def _matching(self, reading: Reading, registry: Dimensions) -> List[Subscriber]:
+        if reading[1] not in registry.locations or reading[2] not in registry.metrics:
+            return []
+        candidates = [*self._by_location.get(reading[1], ()), *self._everywhere]
+        return [subscriber for subscriber in candidates if subscriber.filter.matches(reading, registry)]
+
+    """
+    Loads the running moments of `series` from the monthly rollups.
+
+    The rollups hold every batch received so far, so the seeded series skip them when they
+    are dispatched. The readings being dispatched are taken back out instead, dispatch adds
+    them back one by one so each is scored against the readings before it.
+    """
+    async def _seed(self, series: Set[Tuple[int, int]], readings: List[Reading], batch: int):
+        if not series:
+            return
+        # NOTE: read before the query, batches received while it runs may not be in its snapshot
+        counted_through = self._received
+        location_ids, metric_ids = zip(*series)
+        # NOTE: from the primary, the rollups of a lagging replica may not hold these readings yet
+        with reading_from_primary():
+            rows = await fetch_all(statement(SERIES_STATS_QUERY), {"location_ids": list(location_ids), "metric_ids": list(metric_ids)})
+        for location_id, metric_id, n, total, squares in rows:
+            self._stats[(location_id, metric_id)] = SeriesStats(int(n), float(total), float(squares), batch, counted_through)
+        for key in series:
+            self._stats.setdefault(key, SeriesStats(seeded_by=batch, counted_through=counted_through))
+        for reading in readings:
+            if (reading[1], reading[2]) in series:
+                stats = self._stats[(reading[1], reading[2])]
+                stats.remove(reading[4])
+                if reading[6] is not None:
+                    stats.add(reading[6])
+
+# started and stopped by the app lifespan, every write path publishes through it
+broadcaster = Broadcaster()
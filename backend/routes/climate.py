@@ -1,11 +1,36 @@
-from typing import List, Optional
-from fastapi import APIRouter
+import base64
+import csv
+import datetime
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import func, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
-from ..dal.engine import engine
+from ..cache import bump_data_version
+from ..dal.engine import engine, fetch_all, fetch_one, read_engine
 from ..dal.models.climate_data import ClimateData
 from ..dal.models.metrics import Metrics
 from ..dal.models.locations import Locations
-from pydantic import BaseModel
+from ..dal.partitions import ensure_partitions
+from ..dal.bulk import insert_climate_rows
+from ..dal.quality import quality_name, quality_ordinal
+from ..dal.queries import ReadingFilters
+from ..dal.rollups import refresh_rollups
+from ..dimensions import Dimensions, dimensions, resolve_metrics
+from ..instrumentation import offload
+from ..ingest import FORMATS, ClimateRecord, IngestReport, format_from_content_type, ingest_stream
+from ..ingest_queue import INGEST_QUEUE_ENABLED, IngestQueue
+from ..live import broadcaster
+from .responses import FastJSONResponse
+from pydantic import BaseModel, ValidationError
 
 router = APIRouter(tags=["climate"])
 
@@ -20,7 +45,7 @@ class ClimateResponseData(BaseModel):
     location_name: str
     latitude: float
     longitude: float
-    date: str
+    date: datetime.date
     metric: str
     value: float
     unit: str
@@ -35,6 +60,7 @@ class PaginationMetaResponse(BaseModel):
     total_count: int
     page: int
     per_page: int
+    next_cursor: Optional[str] = None
 
 """
 Paginated Data Response - Meant to be a generic wrapper for reusability
@@ -45,33 +71,60 @@ class PaginatedDataResponse(BaseModel):
     data: List[ClimateResponseData]
     meta: PaginationMetaResponse
 
-QUALITY_CODES = ["poor", "questionable", "good", "excellent"]
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 1000
 
-@router.get("/api/v1/climate")
-def get_climate_data(
-    location_id: Optional[int] = None,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    metric: Optional[str] = None,
-    quality_threshold: Optional[str] = None
-    ) -> PaginatedDataResponse:
-    """
-    Retrieve climate data with optional filtering.
-    Query parameters: location_id, start_date, end_date, metric, quality_threshold
-    
-    Returns climate data in the format specified in the API docs.
-    """
-    # Implement this endpoint
-    # 1. Get query parameters from request.args
-    # 2. Validate quality_threshold if provided
-    # 3. Build and execute SQL query with proper JOINs and filtering
-    # 4. Apply quality threshold filtering
-    # 5. Format response according to API specification
+# Rows pulled per round trip from the server-side cursor when streaming exports
+EXPORT_CHUNK_SIZE = 5000
 
+# NOTE: COUNT(*) over a large filtered set is the most expensive part of a page
+# request, so totals are cached per filter combination for a short window.
+COUNT_CACHE_TTL_SECONDS = float(os.getenv("COUNT_CACHE_TTL_SECONDS", 30))
+COUNT_CACHE_MAX_ENTRIES = 1024
+_count_cache: Dict[ReadingFilters, Tuple[float, int]] = {}
+
+EXPORT_COLUMNS = [
+    "id",
+    "location_id",
+    "location_name",
+    "latitude",
+    "longitude",
+    "date",
+    "metric",
+    "value",
+    "unit",
+    "quality"
+]
+
+"""
+Builds the single table SELECT of a /climate page with the filters applied. Location and metric
+attributes are attached from the dimension registry by to_response_dicts.
+
+NOTE: ordered by (date, id) so OFFSET pages and keyset cursors agree on row order.
+"""
+def build_page_query(filters: ReadingFilters):
+    return select(
+        ClimateData.id,
+        ClimateData.location_id,
+        ClimateData.date,
+        ClimateData.metric_id,
+        ClimateData.value,
+        ClimateData.quality
+    ) \
+        .where(*filters.clauses()) \
+        .order_by(ClimateData.date, ClimateData.id)
+
+"""
+Builds the SELECT over CLIMATEDATA joined to its dimensions with the filters applied, for the
+streamed exports.
+
+NOTE: ordered by (date, id) like the pages.
+"""
+def build_climate_query(filters: ReadingFilters):
     query = select(
         ClimateData.id,
-        Locations.id,
-        Locations.name,
+        ClimateData.location_id,
+        Locations.name.label("location_name"),
         Locations.latitude,
         Locations.longitude,
         ClimateData.date,
@@ -81,62 +134,391 @@ def get_climate_data(
         ClimateData.quality
     ) \
         .join(Locations, ClimateData.location_id == Locations.id) \
-        .join(Metrics, ClimateData.metric_id == Metrics.id)
-    
+        .join(Metrics, ClimateData.metric_id == Metrics.id) \
+        .where(*filters.clauses())
 
-    if location_id:
-        query = query.where(ClimateData.location_id == location_id)
+    return query.order_by(ClimateData.date, ClimateData.id)
 
-    if start_date:
-        query = query.where(ClimateData.date >= start_date) 
-    
-    if end_date:
-        query = query.where(ClimateData.date <= end_date)
+"""
+Parses the shared filter query parameters of the read routes, raising a 400 when one is malformed.
+location_id and metric take one value or, on the routes that accept them repeated, a list.
+"""
+def parse_filters(
+    location_id: Union[int, List[int], None] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    metric: Union[str, List[str], None] = None,
+    quality_threshold: Optional[str] = None,
+    near: Optional[str] = None,
+    radius_km: Optional[float] = None
+) -> ReadingFilters:
+    return ReadingFilters(
+        location_id=location_id,
+        start_date=parse_date(start_date, "start_date"),
+        end_date=parse_date(end_date, "end_date"),
+        metric=metric,
+        min_quality=parse_quality_threshold(quality_threshold) if quality_threshold else None,
+        near=parse_near(near, radius_km)
+    )
 
-    if metric:
-        metric = metric.lower() # Convert to lower 
-        query = query.where(Metrics.name == metric)
+"""
+Returns the stored quality ordinal of the threshold, readings at or above it pass the filter.
 
-    if quality_threshold:
-        quality_threshold = quality_threshold.lower() # Convert to lower 
-        qualityIndex = QUALITY_CODES.index(quality_threshold)
-        query = query.where(ClimateData.quality.in_(QUALITY_CODES[qualityIndex:]))
+Raises a 400 for unknown thresholds instead of letting the ValueError surface as a 500.
+"""
+def parse_quality_threshold(quality_threshold: str) -> int:
+    try:
+        return quality_ordinal(quality_threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"quality_threshold: {e}")
 
-    with Session(engine) as session:
-        rows = session.exec(query).all()
-        data = []
-        for row in rows:
-            data.append(ClimateResponseData(
-                id=row.id,
-                location_id=row.id,
-                location_name=row.name,
-                latitude=row.latitude,
-                longitude=row.longitude,
-                date=row.date,
-                metric=row.metric_name,
-                value=row.value,
-                unit=row.unit,
-                quality=row.quality
-            ))
+"""
+Parses a `lat,lon` query parameter, raising a 400 when it is malformed or out of range.
+"""
+def parse_point(value: str, name: str) -> Tuple[float, float]:
+    try:
+        lat, lon = (float(part) for part in value.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be a lat,lon pair")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail=f"{name} must be within -90..90, -180..180")
+    return lat, lon
+
+"""
+Parses the near / radius_km pair of the read routes into a (lat, lon, radius_km) circle.
+"""
+def parse_near(near: Optional[str], radius_km: Optional[float]) -> Optional[Tuple[float, float, float]]:
+    if not near:
+        return None
+    if radius_km is None:
+        raise HTTPException(status_code=400, detail="near requires radius_km")
+    return (*parse_point(near, "near"), radius_km)
+
+"""
+Parses an optional YYYY-MM-DD query parameter, raising a 400 when it is malformed.
+"""
+def parse_date(value: Optional[str], name: str) -> Optional[datetime.date]:
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be a YYYY-MM-DD date")
+
+"""
+Counts the filtered rows, reusing a recent count for the same filters when available.
+"""
+async def count_climate_data(filters: ReadingFilters) -> int:
+    cached = _count_cache.get(filters)
+    if cached and time.monotonic() - cached[0] < COUNT_CACHE_TTL_SECONDS:
+        return cached[1]
+
+    total_count = (await fetch_one(select(func.count(ClimateData.id)).where(*filters.clauses())))[0]
+
+    if len(_count_cache) >= COUNT_CACHE_MAX_ENTRIES:
+        _count_cache.pop(next(iter(_count_cache)))
+    _count_cache[filters] = (time.monotonic(), total_count)
+    return total_count
+
+"""
+Keyset cursors are the (date, id) of the last row on a page, url-safe base64 encoded.
+"""
+def encode_cursor(date, id: int) -> str:
+    payload = json.dumps([str(date), id]).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime.date, int]:
+    try:
+        date, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.date.fromisoformat(date), int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+"""
+Fast path for the response rows: builds each row's dict straight from the build_page_query row
+and its location and metric in `dimensions`, instead of building a ClimateResponseData per row.
+"""
+def to_response_dicts(dimensions: Dimensions, rows) -> List[dict]:
+    locations, metrics = dimensions.locations, dimensions.metrics
+    data = []
+    for id, location_id, date, metric_id, value, quality in rows:
+        location, metric = locations[location_id], metrics[metric_id]
+        data.append({
+            "id": id,
+            "location_id": location_id,
+            "location_name": location.name,
+            "latitude": location.latitude,
+            "longitude": location.longitude,
+            "date": date,
+            "metric": metric.name,
+            "value": value,
+            "unit": metric.unit,
+            "quality": quality
+        })
+    return data
+
+def to_response_data(row) -> ClimateResponseData:
+    return ClimateResponseData(
+        id=row.id,
+        location_id=row.location_id,
+        location_name=row.location_name,
+        latitude=row.latitude,
+        longitude=row.longitude,
+        date=row.date,
+        metric=row.metric_name,
+        value=row.value,
+        unit=row.unit,
+        quality=row.quality
+    )
+
+"""
+Reads one page of the filtered readings, LIMITed in SQL, in the PaginatedDataResponse shape.
+Seeks past `cursor` when one is given, otherwise skips to `page` with OFFSET.
+
+NOTE: PaginatedDataResponse documents this shape, it's built as plain dicts so large
+pages skip per-row model construction and FastAPI's re-validation
+"""
+async def climate_page(filters: ReadingFilters, page: int, per_page: int, cursor: Optional[str] = None) -> dict:
+    query = build_page_query(filters)
+
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        query = query.where(tuple_(ClimateData.date, ClimateData.id) > tuple_(cursor_date, cursor_id))
+    else:
+        query = query.offset((page - 1) * per_page)
+
+    # fetch one extra row to find out whether another page exists
+    query = query.limit(per_page + 1)
+
+    rows = await fetch_all(query)
 
-        return PaginatedDataResponse(
-            data=data,
-            meta=PaginationMetaResponse(
-                total_count=len(data),
-                page=1,
-                per_page=50
-            )
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id)
+
+    return {
+        "data": to_response_dicts(await dimensions({row.location_id for row in rows}, {row.metric_id for row in rows}), rows),
+        "meta": {
+            "total_count": await count_climate_data(filters),
+            "page": page,
+            "per_page": per_page,
+            "next_cursor": next_cursor
+        }
+    }
+
+@router.get("/api/v1/climate", response_model=PaginatedDataResponse, response_class=FastJSONResponse)
+async def get_climate_data(
+    location_id: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    metric: Optional[str] = None,
+    quality_threshold: Optional[str] = None,
+    near: Optional[str] = None,
+    radius_km: Optional[float] = Query(None, gt=0),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(DEFAULT_PER_PAGE, ge=1, le=MAX_PER_PAGE),
+    cursor: Optional[str] = None
+    ):
+    """
+    Retrieve climate data with optional filtering.
+    Query parameters: location_id, start_date, end_date, metric, quality_threshold,
+    near, radius_km, page, per_page, cursor
+
+    `near=lat,lon&radius_km=` keeps the readings of the stations within radius_km of the point.
+
+    Pages are ordered by (date, id). Passing the `next_cursor` from a previous
+    response seeks straight to the next page instead of using OFFSET, which stays
+    fast no matter how deep the page is.
+
+    Returns climate data in the format specified in the API docs.
+    """
+    filters = await resolve_metrics(parse_filters(location_id, start_date, end_date, metric, quality_threshold, near, radius_km))
+    return FastJSONResponse(await climate_page(filters, page, per_page, cursor))
+
+"""
+Yields the filtered rows in chunks from a server-side cursor so memory stays flat.
+"""
+def stream_climate_rows(query) -> Iterator[list]:
+    with Session(read_engine()) as session:
+        result = session.exec(query.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_SIZE))
+        for rows in result.partitions():
+            yield rows
+
+def export_ndjson(query) -> Iterator[str]:
+    for rows in stream_climate_rows(query):
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str) + "\n"
+            for row in rows
         )
 
-@router.post("/api/v1/create_climate")
-def create_climate_data(climate: ClimateData) -> ClimateData:
+def export_csv(query) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in stream_climate_rows(query):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    # header only when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue()
+
+"""
+Columnar exports, dictionary encoded and chunked the same way as the text formats.
+
+NOTE: pyarrow is only imported when a columnar export is requested, see COLUMNAR_FORMATS.
+"""
+def export_arrow(query) -> Iterator[bytes]:
+    from ..columnar import arrow_stream
+    return arrow_stream(stream_climate_rows(query), EXPORT_COLUMNS)
+
+def export_parquet(query) -> Iterator[bytes]:
+    from ..columnar import parquet_file
+    return parquet_file(stream_climate_rows(query), EXPORT_COLUMNS)
+
+EXPORT_FORMATS = {
+    "ndjson": (export_ndjson, "application/x-ndjson"),
+    "csv": (export_csv, "text/csv"),
+    "arrow": (export_arrow, "application/vnd.apache.arrow.stream"),
+    "parquet": (export_parquet, "application/vnd.apache.parquet"),
+}
+COLUMNAR_FORMATS = ["arrow", "parquet"]
+
+@router.get("/api/v1/climate/export")
+def export_climate_data(
+    location_id: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    metric: Optional[str] = None,
+    quality_threshold: Optional[str] = None,
+    format: str = "ndjson"
+    ) -> StreamingResponse:
     """
-    Create Climate Data entry. Also used in seeding flow.
+    Stream every filtered climate reading as NDJSON, CSV, an Arrow IPC stream or a Parquet file.
+    Query parameters: location_id, start_date, end_date, metric, quality_threshold, format
 
-    Returns created climate data entry. 
+    Rows are read from a server-side cursor and written out chunk by chunk, so
+    bulk exports run in constant memory.
     """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(EXPORT_FORMATS)}")
+    if format in COLUMNAR_FORMATS and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=501, detail=f"{format} exports require pyarrow to be installed")
+
+    query = build_climate_query(parse_filters(location_id, start_date, end_date, metric, quality_threshold))
+    exporter, media_type = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        exporter(query),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=climate.{format}"}
+    )
+
+DUPLICATE_READING = "A reading for this location, metric and date already exists. Use /api/v1/climate/bulk to overwrite it."
+
+"""
+Writes one reading in its own transaction.
+"""
+def create_climate_data(climate: ClimateData) -> ClimateData:
     with Session(engine) as session:
-        session.add(climate)        
-        session.commit()
+        ensure_partitions(session.connection(), [climate.date])
+        session.add(climate)
+        try:
+            session.flush()
+            refresh_rollups(session.connection(), [(climate.location_id, climate.metric_id, climate.date)])
+            session.commit()
+        except IntegrityError:
+            raise HTTPException(status_code=409, detail=DUPLICATE_READING)
         session.refresh(climate)
+        _count_cache.clear()
+        bump_data_version()
+        broadcaster.publish([(climate.id, climate.location_id, climate.metric_id, climate.date, climate.value, quality_ordinal(climate.quality), None)])
         return climate
+
+"""
+Writes a batch of queued (location_id, metric_id, date, value, quality) rows in one transaction.
+Returns the created reading for every row, or a 409 for the ones whose key already had one.
+"""
+def write_climate_rows(rows: List[Tuple]) -> List[Union[ClimateData, HTTPException]]:
+    inserted = insert_climate_rows(engine, rows)
+    broadcaster.publish(list(inserted.values()))
+    results = []
+    for location_id, metric_id, date, value, quality in rows:
+        row = inserted.pop((location_id, metric_id, date), None)
+        if row is None:
+            results.append(HTTPException(status_code=409, detail=DUPLICATE_READING))
+        else:
+            results.append(ClimateData(
+                id=row.id, location_id=location_id, metric_id=metric_id, date=date, value=value, quality=quality_name(quality)
+            ))
+    return results
+
+def climate_rows_written(rows: List[Tuple]):
+    _count_cache.clear()
+    bump_data_version()
+
+# group commits POST /create_climate when INGEST_QUEUE_ENABLED, started and drained by the app lifespan
+climate_queue = IngestQueue("climate", write_climate_rows, on_written=climate_rows_written)
+
+@router.post("/api/v1/create_climate", responses={202: {"description": "Queued, with wait=false"}})
+async def post_climate_data(climate: ClimateData, wait: bool = True) -> ClimateData:
+    """
+    Create Climate Data entry.
+    Query parameters: wait
+
+    Returns created climate data entry.
+
+    With INGEST_QUEUE_ENABLED readings are written in batches by the ingestion queue. `wait=true`
+    answers once the reading's batch is committed, `wait=false` answers 202 as soon as it is queued.
+    """
+    try:
+        # NOTE: table models skip validation, the body's fields are validated here
+        record = ClimateRecord.model_validate({field: getattr(climate, field) for field in ClimateRecord.model_fields})
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e.errors(include_url=False)))
+    registry = await dimensions([record.location_id], [record.metric_id])
+    if not registry.covers([record.location_id], []):
+        raise HTTPException(status_code=400, detail=f"Unknown location_id {record.location_id}")
+    if not registry.covers([], [record.metric_id]):
+        raise HTTPException(status_code=400, detail=f"Unknown metric_id {record.metric_id}")
+
+    if not INGEST_QUEUE_ENABLED:
+        return await run_in_threadpool(create_climate_data, ClimateData(**record.model_dump()))
+
+    created = await climate_queue.submit(record.as_row(), wait)
+    if not wait:
+        return JSONResponse({"status": "queued"}, status_code=202)
+    return created
+
+# Uploads larger than this spill from memory to a temp file while they are received
+BULK_SPOOL_BYTES = 16 * 1024 * 1024
+
+@router.post("/api/v1/climate/bulk")
+async def bulk_create_climate_data(request: Request, format: Optional[str] = None) -> IngestReport:
+    """
+    Bulk load climate readings from a JSON, NDJSON or CSV request body.
+    Query parameters: format (defaults to the Content-Type header)
+
+    Readings are validated in batches and written with COPY. Writes are idempotent on
+    (location_id, metric_id, date), so a failed upload can simply be re-sent. Readings of an
+    unknown location or metric are rejected like invalid ones.
+
+    Returns counts of received, written and rejected rows along with rows/sec.
+    """
+    format = format or format_from_content_type(request.headers.get("content-type"))
+    if format not in FORMATS:
+        raise HTTPException(status_code=415, detail=f"format must be one of {FORMATS}")
+
+    with tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_BYTES) as body:
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+
+        try:
+            report = await offload(ingest_stream, body, format, phase=None)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Could not parse {format} body: {e}")
+
+    _count_cache.clear()
+    return report
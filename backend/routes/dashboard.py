@@ -0,0 +1,69 @@
+import asyncio
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Query, Request
+from pydantic import BaseModel
+from ..cache import cached_json
+from ..dal.models.locations import Locations
+from ..dal.models.metrics import Metrics
+from ..dimensions import dimensions, resolve_metrics
+from .climate import DEFAULT_PER_PAGE, MAX_PER_PAGE, PaginatedDataResponse, climate_page, parse_filters
+from .summary import MetricSummaryResponse, build_summary_query, summarize
+from .trends import MetricTrendResponse, build_moments_query, trends_from_moments
+
+router = APIRouter(tags=["dashboard"])
+
+"""
+Dashboard Response - everything the dashboard renders for one filter set
+
+NOTE: documents the response in the OpenAPI schema, responses are serialized straight from dicts
+"""
+class DashboardResponse(BaseModel):
+    climate: PaginatedDataResponse
+    summary: Dict[str, MetricSummaryResponse]
+    trends: Dict[str, MetricTrendResponse]
+    locations: List[Locations]
+    metrics: List[Metrics]
+
+@router.get("/api/v1/dashboard", response_model=DashboardResponse)
+async def get_dashboard(
+    request: Request,
+    location_id: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    metric: Optional[str] = None,
+    quality_threshold: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(DEFAULT_PER_PAGE, ge=1, le=MAX_PER_PAGE),
+    cursor: Optional[str] = None
+):
+    """
+    Retrieve everything the dashboard shows for one filter set in a single round trip.
+    Query parameters: location_id, start_date, end_date, metric, quality_threshold, page, per_page, cursor
+
+    Returns a page of climate data, the summary, the trends, and all locations and metrics, each
+    in the same shape as its own endpoint. Pages take the `next_cursor` of the previous one like
+    /climate.
+    """
+    filters = await resolve_metrics(parse_filters(location_id, start_date, end_date, metric, quality_threshold))
+    summary_query, summary_params = build_summary_query(filters)
+    moments_query, moments_params = build_moments_query(filters)
+    where, params = filters.where("c"), filters.params()
+
+    async def compute_dashboard():
+        # NOTE: each part is answered the way its own endpoint answers it, the page LIMITed in SQL
+        # and the summary and trends from the monthly rollups, so no part reads every filtered row
+        climate, summary, trends, registry = await asyncio.gather(
+            climate_page(filters, page, per_page, cursor),
+            summarize(summary_query, summary_params),
+            trends_from_moments(moments_query, moments_params, where, params),
+            dimensions()
+        )
+        return {
+            "climate": climate,
+            "summary": summary,
+            "trends": trends,
+            "locations": list(registry.locations.values()),
+            "metrics": list(registry.metrics.values())
+        }
+
+    return await cached_json(request, compute_dashboard)
@@ -0,0 +1,43 @@
+from typing import List, Optional
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from .climate import parse_filters
+from ..dimensions import resolve_metrics
+from ..live import LiveFilter, broadcaster
+
+router = APIRouter(tags=["climate"])
+
+@router.get("/api/v1/climate/live", response_class=StreamingResponse, responses={
+    200: {"content": {"text/event-stream": {}}, "description": "`reading` and `anomaly` events"},
+    503: {"description": "Too many open streams"}
+})
+async def stream_climate_data(
+    location_id: Optional[List[int]] = Query(None),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    metric: Optional[List[str]] = Query(None),
+    quality_threshold: Optional[str] = None,
+    near: Optional[str] = None,
+    radius_km: Optional[float] = Query(None, gt=0),
+    anomalies_only: bool = False
+    ) -> StreamingResponse:
+    """
+    Stream newly written climate readings as Server-Sent Events.
+    Query parameters: location_id, start_date, end_date, metric, quality_threshold, near,
+    radius_km, anomalies_only
+
+    Takes the filters of /climate, location_id and metric can be repeated. Each reading written
+    after subscribing that passes them is sent as a `reading` event in the /climate row shape,
+    followed by an `anomaly` event with its `deviation` when it is more than two standard
+    deviations from its series' mean. `anomalies_only=true` sends the anomaly events only.
+
+    A client that falls too far behind gets an `overflow` event and the stream ends.
+    """
+    filters = await resolve_metrics(parse_filters(location_id, start_date, end_date, metric, quality_threshold, near, radius_km))
+    subscriber = broadcaster.subscribe(LiveFilter(filters, anomalies_only))
+    return StreamingResponse(
+        broadcaster.stream(subscriber),
+        media_type="text/event-stream",
+        # NOTE: X-Accel-Buffering stops nginx from holding events back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
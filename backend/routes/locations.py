@@ -1,25 +1,138 @@
-from typing import List
-from fastapi import APIRouter
+from typing import Dict, List, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import BaseModel
 from sqlmodel import Session, select
 from ..dal.models.locations import Locations
-from ..dal.engine import engine
+from ..cache import bump_data_version, cached_json
+from ..dimensions import bump_dimensions_version
+from ..dal.engine import engine, fetch_all, fetch_scalars
+from ..dal.queries import statement
+from ..dal.spatial import MAX_RADIUS_KM, box_params, distance_km, in_box, split_box, within, within_params
+from .climate import parse_point
 
 router = APIRouter(tags=["locations"])
 
-@router.get("/api/v1/locations")
-def get_locations() -> List[Locations]:
+"""
+Location Response
+
+NOTE: distance_km is only set on queries with `near`
+"""
+class LocationResponse(BaseModel):
+    id: int
+    name: str
+    country: str
+    latitude: float
+    longitude: float
+    region: str
+    distance_km: Optional[float] = None
+
+# first radius a k-nearest query tries, it grows by KNN_GROWTH until k stations are inside
+KNN_START_RADIUS_KM = 25.0
+KNN_GROWTH = 4
+
+LOCATIONS_QUERY = """
+SELECT l.id, l.name, l.country, l.latitude, l.longitude, l.region{distance}
+FROM locations l
+WHERE {where}
+ORDER BY {order}
+{limit}
+"""
+
+"""
+Parses a `west,south,east,north` bounding box, west > east crossing the antimeridian.
+"""
+def parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    try:
+        west, south, east, north = (float(part) for part in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be west,south,east,north")
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise HTTPException(status_code=400, detail="bbox must be within -180..180, -90..90 with south <= north")
+    return west, south, east, north
+
+"""
+Builds the locations SQL and its parameters. Every spatial predicate starts with a box
+containment the GiST index on the positions answers, see dal/spatial.py.
+"""
+def build_locations_query(
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    near: Optional[Tuple[float, float]] = None,
+    radius_km: Optional[float] = None,
+    k: Optional[int] = None
+) -> Tuple[str, dict]:
+    where, params = [], {}
+    if bbox:
+        boxes = split_box(*bbox)
+        where.append("(" + " OR ".join(in_box("l", f"bbox_{index}_") for index in range(len(boxes))) + ")")
+        for index, box in enumerate(boxes):
+            params.update(box_params(*box, f"bbox_{index}_"))
+
+    distance, order, limit = "", "l.id", ""
+    if near:
+        where.append(within("l", "near_"))
+        params.update(within_params(*near, radius_km, "near_"))
+        distance, order = f", {distance_km('l', 'near_')} AS distance_km", "distance_km, l.id"
+    if k:
+        limit = "LIMIT :k"
+        params["k"] = k
+
+    return LOCATIONS_QUERY.format(distance=distance, where=" AND ".join(where) or "TRUE", order=order, limit=limit), params
+
+"""
+The k stations nearest to `near`, within `radius_km` when given.
+
+A radius holding at least k stations holds the k nearest, so the radius grows from
+KNN_START_RADIUS_KM until it does. Each attempt is one indexed query and the radius reaches
+the whole globe after a handful of them.
+"""
+async def nearest_locations(bbox, near: Tuple[float, float], k: int, radius_km: Optional[float]) -> List:
+    limit = radius_km or MAX_RADIUS_KM
+    radius = min(KNN_START_RADIUS_KM, limit)
+    while True:
+        query, params = build_locations_query(bbox, near, radius, k)
+        rows = await fetch_all(statement(query), params)
+        if len(rows) >= k or radius >= limit:
+            return rows
+        radius = min(radius * KNN_GROWTH, limit)
+
+@router.get("/api/v1/locations", response_model=List[LocationResponse])
+async def get_locations(
+    request: Request,
+    bbox: Optional[str] = None,
+    near: Optional[str] = None,
+    radius_km: Optional[float] = Query(None, gt=0),
+    k: Optional[int] = Query(None, ge=1, le=1000)
+):
     """
-    Retrieve all available locations.
-    
+    Retrieve the available locations, all of them unless filtered.
+    Query parameters: bbox, near, radius_km, k
+
+    `bbox=west,south,east,north` keeps the locations inside the box. `near=lat,lon` with `radius_km`
+    keeps the locations within that distance, with `k` the k nearest (within radius_km when given).
+    Results of `near` are ordered by distance and carry `distance_km`.
+
     Returns location data in the format specified in the API docs.
     """
-    # Implement this endpoint
-    # 1. Query the locations table
-    # 2. Format response according to API specification
+    if (radius_km or k) and not near:
+        raise HTTPException(status_code=400, detail="radius_km and k require near")
+    if near and not (radius_km or k):
+        raise HTTPException(status_code=400, detail="near requires radius_km or k")
 
-    with Session(engine) as session:
-        locations = session.exec(select(Locations)).all()
-        return locations
+    if not (bbox or near):
+        return await cached_json(request, lambda: fetch_scalars(select(Locations)))
+
+    box = parse_bbox(bbox) if bbox else None
+    point = parse_point(near, "near") if near else None
+
+    async def find_locations() -> List[Dict]:
+        if k:
+            rows = await nearest_locations(box, point, k, radius_km)
+        else:
+            query, params = build_locations_query(box, point, radius_km)
+            rows = await fetch_all(statement(query), params)
+        return [dict(row._mapping) for row in rows]
+
+    return await cached_json(request, find_locations)
 
 @router.post("/api/v1/create_location")
 def create_location(location: Locations) -> Locations:
@@ -32,4 +145,6 @@ def create_location(location: Locations) -> Locations:
         session.add(location)
         session.commit()
         session.refresh(location)
+        bump_data_version()
+        bump_dimensions_version()
         return location
\ No newline at end of file
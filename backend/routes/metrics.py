@@ -1,13 +1,15 @@
 from typing import List
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from sqlmodel import Session, select
-from ..dal.engine import engine
+from ..cache import bump_data_version, cached_json
+from ..dimensions import bump_dimensions_version
+from ..dal.engine import engine, fetch_scalars
 from ..dal.models.metrics import Metrics
 
 router = APIRouter(tags=["metrics"])
 
 @router.get("/api/v1/metrics")
-def get_metrics() -> List[Metrics]:
+async def get_metrics(request: Request) -> List[Metrics]:
     """
     Retrieve all available climate metrics.
     
@@ -17,8 +19,7 @@ def get_metrics() -> List[Metrics]:
     # 1. Query the metrics table
     # 2. Format response according to API specification
 
-    with Session(engine) as session:
-        return session.exec(select(Metrics)).all()
+    return await cached_json(request, lambda: fetch_scalars(select(Metrics)))
 
 @router.post("/api/v1/create_metric")
 
@@ -32,4 +33,6 @@ def create_metric(metric: Metrics) -> Metrics:
         session.add(metric)
         session.commit()
         session.refresh(metric)
+        bump_data_version()
+        bump_dimensions_version()
         return metric
\ No newline at end of file
@@ -0,0 +1,50 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .. import compute
+from .climate import climate_queue
+from ..dal.engine import pools, replica_health
+from ..live import broadcaster
+from ..instrumentation import render_metrics
+from ..startup import ready, task_states
+
+router = APIRouter(tags=["monitoring"])
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+"""
+Current connection pool usage per engine, as gauge samples.
+"""
+def pool_samples():
+    samples = []
+    for name, pool in pools().items():
+        samples.extend([
+            ({"engine": name, "state": "checked_out"}, pool.checkedout()),
+            ({"engine": name, "state": "idle"}, pool.checkedin()),
+            ({"engine": name, "state": "overflow"}, max(pool.overflow(), 0)),
+        ])
+    return samples
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    """
+    Request latency, per phase time, rows fetched and pool usage in the Prometheus text format.
+    """
+    gauges = {
+        "ecovision_db_pool_connections": ("Pooled connections by state", pool_samples()),
+        "ecovision_compute_pending_requests": ("Requests with work in the compute process pool", [({}, compute.pending())]),
+        "ecovision_ingest_queue_pending": ("Readings waiting in the ingestion queue", [({"queue": "climate"}, climate_queue.pending())]),
+        "ecovision_live_subscribers": ("Open live streams", [({}, broadcaster.subscribers())]),
+        "ecovision_db_replica_up": (
+            "Whether a read replica is in the read rotation",
+            [({"replica": name}, int(up)) for name, up in replica_health().items()]
+        ),
+    }
+    return PlainTextResponse(render_metrics(gauges), media_type=CONTENT_TYPE)
+
+@router.get("/ready")
+def get_ready():
+    """
+    Readiness probe: 200 once the background startup tasks (dev seeding, compute workers) are done, 503 until then.
+    """
+    return JSONResponse({"ready": ready(), "tasks": task_states()}, status_code=200 if ready() else 503)
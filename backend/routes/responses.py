@@ -0,0 +1,34 @@
+from decimal import Decimal
+from typing import Any
+from fastapi import Response
+from pydantic import BaseModel
+import orjson
+from ..instrumentation import timed
+
+"""
+Fast JSON serialization for the read endpoints.
+
+Route handlers keep their pydantic response models on the decorator so the OpenAPI schema is
+unchanged, but return plain dicts built straight from the row tuples through FastJSONResponse.
+That skips building a model per row, FastAPI's re-validation of the return value and the
+jsonable_encoder pass, and lets orjson write dates, floats and numpy scalars natively.
+"""
+
+OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(content: Any) -> bytes:
+    with timed("serialize"):
+        return orjson.dumps(content, default=_default, option=OPTIONS)
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
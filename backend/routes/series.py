@@ -0,0 +1,257 @@
+import datetime
+import math
+from typing import List, Optional, Union
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import BaseModel
+import numpy as np
+from ..analytics.downsample import lttb_indices
+from ..cache import cached_json
+from ..dal.engine import fetch_all, fetch_one
+from ..dal.queries import statement
+from ..dimensions import dimensions, resolve_metrics
+from ..instrumentation import offload
+from .climate import parse_filters
+
+router = APIRouter(tags=["series"])
+
+"""
+Series Response Models
+
+NOTE: documents the response in the OpenAPI schema, responses are serialized straight from dicts
+"""
+class SeriesBucketResponse(BaseModel):
+    date: datetime.date
+    count: int
+    min: float
+    max: float
+    avg: float
+    weighted_avg: float
+
+class SeriesPointResponse(BaseModel):
+    date: datetime.date
+    value: float
+
+class SeriesResponse(BaseModel):
+    location_id: int
+    location_name: str
+    metric: str
+    unit: str
+    points: Union[List[SeriesBucketResponse], List[SeriesPointResponse]]
+
+class SeriesDataResponse(BaseModel):
+    resolution: str
+    bucket_days: Optional[int] = None
+    downsample: str
+    series: List[SeriesResponse]
+
+# readings are daily, so day is the finest resolution
+RESOLUTIONS = ["auto", "day", "week", "month", "quarter", "year"]
+DOWNSAMPLE_MODES = ["buckets", "lttb"]
+
+DEFAULT_SERIES_POINTS = 500
+MAX_SERIES_POINTS = 5000
+
+"""
+Every series is cut into buckets and each bucket is aggregated in Postgres, so only
+`points` rows per series leave the database however long the range is. Named resolutions
+bucket on calendar boundaries with date_trunc, "auto" uses equal width buckets sized so the
+filtered range fits in `points` buckets.
+"""
+EXTENT_QUERY = """
+SELECT MIN(c.date) AS first, MAX(c.date) AS last
+FROM climatedata c
+WHERE {where}
+"""
+
+BUCKETS_QUERY = """
+SELECT
+    c.location_id,
+    c.metric_id,
+    {bucket} AS bucket,
+    COUNT(*) AS count,
+    MIN(c.value) AS min,
+    MAX(c.value) AS max,
+    AVG(c.value) AS avg,
+    SUM(c.value * q.weight) / SUM(q.weight) AS weighted_avg
+FROM climatedata c
+JOIN quality_levels q ON q.ordinal = c.quality
+WHERE {where}
+GROUP BY c.location_id, c.metric_id, bucket
+ORDER BY c.location_id, c.metric_id, bucket
+"""
+
+# NOTE: date - date is a day count and integer division floors it onto the bucket grid
+WIDTH_BUCKET = "CAST(:origin AS DATE) + ((c.date - CAST(:origin AS DATE)) / :bucket_days) * :bucket_days"
+CALENDAR_BUCKET = "date_trunc('{resolution}', c.date)::date"
+
+# LTTB picks from the raw readings, ordered so every series is one contiguous run
+READINGS_QUERY = """
+SELECT c.location_id, c.metric_id, c.date, c.value
+FROM climatedata c
+WHERE {where}
+ORDER BY c.location_id, c.metric_id, c.date
+"""
+
+"""
+Ranges with more than LTTB_CANDIDATES_PER_POINT * `points` days are first cut into that many
+equal width buckets in Postgres, and only the first, last, lowest and highest reading of each
+bucket are sent to LTTB. The extremes of every bucket survive, so the peaks and troughs a chart
+needs are still there, and the rows leaving the database are bounded by `points` instead of
+growing with the range.
+"""
+LTTB_CANDIDATES_PER_POINT = 4
+
+CANDIDATES_QUERY = f"""
+SELECT r.location_id, r.metric_id, r.date, r.value
+FROM (
+    SELECT
+        c.location_id,
+        c.metric_id,
+        c.date,
+        c.value,
+        row_number() OVER (PARTITION BY c.location_id, c.metric_id, b.bucket ORDER BY c.date) AS date_rank,
+        row_number() OVER (PARTITION BY c.location_id, c.metric_id, b.bucket ORDER BY c.value, c.date) AS value_rank,
+        COUNT(*) OVER (PARTITION BY c.location_id, c.metric_id, b.bucket) AS n
+    FROM climatedata c
+    CROSS JOIN LATERAL (SELECT {WIDTH_BUCKET} AS bucket) b
+    WHERE {{where}}
+) r
+WHERE r.date_rank IN (1, r.n) OR r.value_rank IN (1, r.n)
+ORDER BY r.location_id, r.metric_id, r.date
+"""
+
+"""
+Returns how many buckets of a calendar resolution the range first..last spans.
+"""
+def bucket_count(first: datetime.date, last: datetime.date, resolution: str) -> int:
+    if resolution == "day":
+        return (last - first).days + 1
+    if resolution == "week":
+        return (last - (first - datetime.timedelta(days=first.weekday()))).days // 7 + 1
+    months = (last.year - first.year) * 12 + last.month - first.month
+    if resolution == "month":
+        return months + 1
+    if resolution == "quarter":
+        return (last.year - first.year) * 4 + (last.month - 1) // 3 - (first.month - 1) // 3 + 1
+    return last.year - first.year + 1
+
+"""
+Groups flat per-series rows into the response series, in row order.
+"""
+def group_series(rows: List, locations: dict, metrics: dict, to_point) -> List[dict]:
+    series = []
+    key = None
+    for row in rows:
+        if (row.location_id, row.metric_id) != key:
+            key = (row.location_id, row.metric_id)
+            location, metric = locations[row.location_id], metrics[row.metric_id]
+            points = []
+            series.append({
+                "location_id": location.id,
+                "location_name": location.name,
+                "metric": metric.name,
+                "unit": metric.unit,
+                "points": points
+            })
+        points.append(to_point(row))
+    return series
+
+def to_bucket(row) -> dict:
+    return {
+        "date": row.bucket,
+        "count": row.count,
+        "min": row.min,
+        "max": row.max,
+        "avg": row.avg,
+        "weighted_avg": row.weighted_avg
+    }
+
+def to_point(row) -> dict:
+    return {"date": row.date, "value": row.value}
+
+"""
+Runs LTTB over every series at once and returns the kept rows, still in series order.
+"""
+def downsample_rows(rows: List, points: int) -> List:
+    if not rows:
+        return []
+    location_ids, metric_ids, dates, values = zip(*rows)
+    location_ids, metric_ids = np.array(location_ids), np.array(metric_ids)
+    days = np.array(dates, dtype="datetime64[D]").astype(np.int64)
+
+    changes = (location_ids[1:] != location_ids[:-1]) | (metric_ids[1:] != metric_ids[:-1])
+    starts = np.concatenate(([0], np.flatnonzero(changes) + 1))
+    lengths = np.diff(np.append(starts, len(rows)))
+
+    return [rows[index] for index in lttb_indices(days, np.array(values, dtype=np.float64), starts, lengths, points).tolist()]
+
+@router.get("/api/v1/series", response_model=SeriesDataResponse)
+async def get_series(
+    request: Request,
+    location_id: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    metric: Optional[str] = None,
+    quality_threshold: Optional[str] = None,
+    resolution: str = "auto",
+    points: int = Query(DEFAULT_SERIES_POINTS, ge=3, le=MAX_SERIES_POINTS),
+    downsample: str = "buckets"
+):
+    """
+    Retrieve chart ready series, one per location and metric, with at most `points` points each.
+    Query parameters: location_id, start_date, end_date, metric, quality_threshold, resolution, points, downsample
+
+    `downsample=buckets` aggregates each bucket of `resolution` into min, max, avg and the quality-weighted
+    avg. `downsample=lttb` keeps the `points` raw readings that best preserve the shape of each series,
+    picked from the first, last, lowest and highest reading of 4 * `points` buckets on long ranges.
+    """
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {RESOLUTIONS}")
+    if downsample not in DOWNSAMPLE_MODES:
+        raise HTTPException(status_code=400, detail=f"downsample must be one of {DOWNSAMPLE_MODES}")
+
+    filters = await resolve_metrics(parse_filters(location_id, start_date, end_date, metric, quality_threshold))
+    where, params = filters.where("c"), filters.params()
+
+    async def compute_series():
+        result = {"resolution": resolution, "bucket_days": None, "downsample": downsample, "series": []}
+
+        extent = await fetch_one(statement(EXTENT_QUERY.format(where=where)), params)
+        if extent.first is None:
+            return result
+
+        if downsample == "lttb":
+            candidates = points * LTTB_CANDIDATES_PER_POINT
+            bucket_days = math.ceil(((extent.last - extent.first).days + 1) / candidates)
+            if bucket_days > 1:
+                query = CANDIDATES_QUERY.format(where=where)
+                query_params = {**params, "origin": extent.first, "bucket_days": bucket_days}
+            else:
+                # readings are daily, a range this short has no more rows per series than candidates
+                query, query_params = READINGS_QUERY.format(where=where), params
+            rows = await fetch_all(statement(query), query_params)
+            rows = await offload(downsample_rows, rows, points)
+            registry = await dimensions({row.location_id for row in rows}, {row.metric_id for row in rows})
+            result["series"] = group_series(rows, registry.locations, registry.metrics, to_point)
+            return result
+
+        if resolution == "auto":
+            bucket_days = max(1, math.ceil(((extent.last - extent.first).days + 1) / points))
+            bucket = WIDTH_BUCKET
+            query_params = {**params, "origin": extent.first, "bucket_days": bucket_days}
+            result["bucket_days"] = bucket_days
+        else:
+            if bucket_count(extent.first, extent.last, resolution) > points:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"{resolution} buckets over this range exceed {points} points, use a coarser resolution or raise points"
+                )
+            bucket = CALENDAR_BUCKET.format(resolution=resolution)
+            query_params = params
+
+        rows = await fetch_all(statement(BUCKETS_QUERY.format(bucket=bucket, where=where)), query_params)
+        registry = await dimensions({row.location_id for row in rows}, {row.metric_id for row in rows})
+        result["series"] = group_series(rows, registry.locations, registry.metrics, to_bucket)
+        return result
+
+    return await cached_json(request, compute_series)
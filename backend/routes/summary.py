@@ -1,14 +1,14 @@
-import json
-from typing import List, Optional
-from fastapi import APIRouter
+import datetime
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple, Union
+from fastapi import APIRouter, HTTPException, Query, Request
 from pydantic import BaseModel
-from sqlalchemy import text
-from sqlmodel import Session, select
-from ..dal.engine import engine
-from ..dal.models.climate_data import ClimateData
-from ..dal.models.locations import Locations
-from ..dal.models.metrics import Metrics
-from .climate import QUALITY_CODES
+from ..cache import cached_json
+from ..dal.engine import fetch_all
+from ..dal.quality import QUALITY_WEIGHTS
+from ..dal.queries import ReadingFilters, statement
+from ..dimensions import Dimensions, dimensions, resolve_metrics
+from .climate import parse_filters
 
 router = APIRouter(tags=["summary"])
 
@@ -23,7 +23,7 @@ class ClimateResponseData(BaseModel):
     location_name: str
     latitude: float
     longitude: float
-    date: str
+    date: datetime.date
     metric: str
     value: float
     unit: str
@@ -48,126 +48,278 @@ class PaginatedDataResponse(BaseModel):
     data: List[ClimateResponseData] #eventually make this a union 
     meta: PaginationMetaResponse
 
-@router.get("/api/v1/summary")
-def get_summary(
-    location_id: Optional[int] = None,
+"""
+Summary Statistics For One Metric
+
+NOTE: documents the response in the OpenAPI schema, responses are serialized straight from dicts
+"""
+class MetricSummaryResponse(BaseModel):
+    min: float
+    max: float
+    avg: float
+    weighted_avg: Optional[float] = None
+    unit: str
+    quality_distribution: Dict[str, float]
+
+"""
+Summaries are answered from CLIMATE_ROLLUP_MONTHLY for every whole month in the requested
+range. Only the partial months at the edges of the range are aggregated from CLIMATEDATA,
+so the cost of a summary no longer grows with the length of the range.
+"""
+ROLLUP_PART = """
+SELECT {location}r.metric_id, r.quality, r.reading_count, r.value_sum, r.value_min, r.value_max, r.weighted_sum
+FROM climate_rollup_monthly r
+WHERE {where}
+"""
+
+RAW_PART = """
+SELECT
+    {location}c.metric_id,
+    c.quality,
+    COUNT(*) AS reading_count,
+    SUM(c.value) AS value_sum,
+    MIN(c.value) AS value_min,
+    MAX(c.value) AS value_max,
+    SUM(c.value * q.weight) AS weighted_sum
+FROM climatedata c
+JOIN quality_levels q ON q.ordinal = c.quality
+WHERE {where}
+GROUP BY {location}c.metric_id, c.quality
+"""
+
+# one row of SUMMARY_QUERY's result with its metric attached, location_id is only set when grouped
+SummaryPart = namedtuple("SummaryPart", [
+    "metric_name", "metric_unit", "quality", "quality_weight",
+    "reading_count", "value_sum", "value_min", "value_max", "weighted_sum", "location_id"
+], defaults=[None])
+
+# NOTE: metric names and units are attached from the dimension registry, see summary_parts
+
+SUMMARY_QUERY = """
+WITH Parts AS (
+{parts}
+)
+SELECT
+    {location}p.metric_id,
+    q.name AS quality,
+    q.weight AS quality_weight,
+    SUM(p.reading_count)::bigint AS reading_count,
+    SUM(p.value_sum) AS value_sum,
+    MIN(p.value_min) AS value_min,
+    MAX(p.value_max) AS value_max,
+    SUM(p.weighted_sum) AS weighted_sum
+FROM Parts p
+JOIN quality_levels q ON q.ordinal = p.quality
+GROUP BY {location}p.metric_id, q.name, q.weight
+"""
+
+"""
+Grouped requests (group_by) add the location to every part and to the outer GROUP BY, so
+one pass returns the aggregates of every location. The rows are then folded per group in
+the app, the aggregates are all sums, minimums and maximums so they combine exactly.
+"""
+GROUP_BY_OPTIONS = ["location", "region", "country"]
+
+def location_column(alias: str, by_location: bool) -> str:
+    return f"{alias}.location_id, " if by_location else ""
+
+def parse_group_by(group_by: Optional[str]) -> Optional[str]:
+    if group_by and group_by not in GROUP_BY_OPTIONS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {GROUP_BY_OPTIONS}")
+    return group_by or None
+
+def first_of_next_month(day: datetime.date) -> datetime.date:
+    return (day.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+"""
+Splits [start, end] into the whole months the rollups can answer, [rollup_start, rollup_end),
+and the partial month ranges at either edge that have to be read from raw rows.
+
+Returns (rollup_range, raw_ranges). rollup_range is None when no whole month is covered.
+"""
+def split_date_range(
+    start: Optional[datetime.date],
+    end: Optional[datetime.date]
+) -> Tuple[Optional[Tuple], List[Tuple]]:
+    rollup_start = start
+    if start is not None and start.day != 1:
+        rollup_start = first_of_next_month(start)
+
+    rollup_end = None
+    if end is not None:
+        rollup_end = first_of_next_month(end)
+        if rollup_end - datetime.timedelta(days=1) != end:
+            rollup_end = end.replace(day=1)
+
+    if rollup_start and rollup_end and rollup_start >= rollup_end:
+        return None, [(start, end)]
+
+    raw_ranges = []
+    if start is not None and start < rollup_start:
+        raw_ranges.append((start, rollup_start - datetime.timedelta(days=1)))
+    if end is not None and rollup_end <= end:
+        raw_ranges.append((rollup_end, end))
+    return (rollup_start, rollup_end), raw_ranges
+
+"""
+Splits the date bounds of `filters` with split_date_range and returns one SQL part per source:
+`rollup_part` over the whole months, filtered on alias r, and `raw_part` per partial month,
+filtered on alias c. Parameters of the date bounds are added to `params`.
+
+The parts' `{location}` is filled with the location column when `by_location` is set.
+"""
+def rollup_parts(filters: ReadingFilters, params: dict, rollup_part: str, raw_part: str, by_location: bool = False) -> List[str]:
+    rollup_range, raw_ranges = split_date_range(filters.start_date, filters.end_date)
+    shared = filters.without_dates()
+
+    parts = []
+    if rollup_range:
+        rollup_start, rollup_end = rollup_range
+        where = shared.predicates("r")
+        if rollup_start:
+            params["rollup_start"] = rollup_start
+            where.append("r.period >= :rollup_start")
+        if rollup_end:
+            params["rollup_end"] = rollup_end
+            where.append("r.period < :rollup_end")
+        parts.append(rollup_part.format(where=" AND ".join(where) or "TRUE", location=location_column("r", by_location)))
+
+    for index, (raw_start, raw_end) in enumerate(raw_ranges):
+        where = shared.predicates("c")
+        if raw_start:
+            params[f"raw_start_{index}"] = raw_start
+            where.append(f"c.date >= :raw_start_{index}")
+        if raw_end:
+            params[f"raw_end_{index}"] = raw_end
+            where.append(f"c.date <= :raw_end_{index}")
+        parts.append(raw_part.format(where=" AND ".join(where) or "TRUE", location=location_column("c", by_location)))
+    return parts
+
+"""
+Builds the summary SQL and its parameters, emitting only the predicates that apply.
+"""
+def build_summary_query(filters: ReadingFilters, by_location: bool = False) -> Tuple[str, dict]:
+    # the date bounds are split between rollups and raw rows
+    params = filters.without_dates().params()
+    parts = rollup_parts(filters, params, ROLLUP_PART, RAW_PART, by_location)
+    return SUMMARY_QUERY.format(parts="UNION ALL".join(parts), location=location_column("p", by_location)), params
+
+"""
+Folds per (metric, quality) aggregate rows into the response shape.
+"""
+def fold_summary(rows) -> dict:
+    # rows are per (metric, quality), fold them into one entry per metric
+    totals = {}
+    for row in rows:
+        stats = totals.setdefault(row.metric_name, {
+            "unit": row.metric_unit,
+            "min": row.value_min,
+            "max": row.value_max,
+            "count": 0,
+            "sum": 0.0,
+            "weighted_sum": 0.0,
+            "weight": 0.0,
+            "quality_counts": dict.fromkeys(QUALITY_WEIGHTS, 0)
+        })
+        stats["min"] = min(stats["min"], row.value_min)
+        stats["max"] = max(stats["max"], row.value_max)
+        stats["count"] += row.reading_count
+        stats["sum"] += row.value_sum
+        stats["weighted_sum"] += row.weighted_sum
+        stats["weight"] += row.reading_count * row.quality_weight
+        stats["quality_counts"][row.quality] += row.reading_count
+
+    data = {}
+    for metric_name, stats in totals.items():
+        data[metric_name] = {
+            "min": stats["min"],
+            "max": stats["max"],
+            "avg": stats["sum"] / stats["count"],
+            "weighted_avg": stats["weighted_sum"] / stats["weight"] if stats["weight"] else None,
+            "unit": stats["unit"],
+            "quality_distribution": {
+                quality: count / stats["count"]
+                for quality, count in stats["quality_counts"].items()
+            }
+        }
+
+    return data
+
+"""
+Folds per (location, metric, quality) aggregate rows into one summary per group.
+`groups` maps location ids to their group key.
+"""
+def fold_groups(rows, groups: Dict[int, str]) -> Dict[str, dict]:
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(groups[row.location_id], []).append(row)
+    return {key: fold_summary(grouped[key]) for key in sorted(grouped)}
+
+"""
+Attaches the metric name and unit to SUMMARY_QUERY rows.
+"""
+def summary_parts(dimensions: Dimensions, rows) -> List[SummaryPart]:
+    parts = []
+    for row in rows:
+        metric = dimensions.metrics[row.metric_id]
+        parts.append(SummaryPart(
+            metric_name=metric.name,
+            metric_unit=metric.unit,
+            quality=row.quality,
+            quality_weight=row.quality_weight,
+            reading_count=row.reading_count,
+            value_sum=row.value_sum,
+            value_min=row.value_min,
+            value_max=row.value_max,
+            weighted_sum=row.weighted_sum,
+            location_id=getattr(row, "location_id", None)
+        ))
+    return parts
+
+def fold_summary_rows(dimensions: Dimensions, rows, group_by: Optional[str]) -> dict:
+    parts = summary_parts(dimensions, rows)
+    if not group_by:
+        return fold_summary(parts)
+    return fold_groups(parts, dimensions.location_groups(group_by))
+
+"""
+Runs the summary query and folds its rows into the response shape, one summary per group
+when grouped.
+"""
+async def summarize(query: str, params: dict, group_by: Optional[str] = None) -> dict:
+    rows = await fetch_all(statement(query), params)
+    registry = await dimensions(
+        {row.location_id for row in rows} if group_by else (),
+        {row.metric_id for row in rows}
+    )
+    return fold_summary_rows(registry, rows, group_by)
+
+@router.get(
+    "/api/v1/summary",
+    response_model=Union[Dict[str, MetricSummaryResponse], Dict[str, Dict[str, MetricSummaryResponse]]]
+)
+async def get_summary(
+    request: Request,
+    location_id: Optional[List[int]] = Query(None),
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    metric: Optional[str] = None,
-    quality_threshold: Optional[str] = None
+    metric: Optional[List[str]] = Query(None),
+    quality_threshold: Optional[str] = None,
+    near: Optional[str] = None,
+    radius_km: Optional[float] = Query(None, gt=0),
+    group_by: Optional[str] = None
 ):
     """
     Retrieve quality-weighted summary statistics for climate data.
-    Query parameters: location_id, start_date, end_date, metric, quality_threshold
-    
+    Query parameters: location_id, start_date, end_date, metric, quality_threshold, near, radius_km, group_by
+
+    location_id and metric can be repeated to select several. With `group_by=location|region|country`
+    the summaries are returned per group, `{group: {metric: summary}}`, all computed in one query.
+
     Returns weighted min, max, and avg values for each metric in the format specified in the API docs.
     """
-    # Implement this endpoint
-    # 1. Get query parameters from request.args
-    # 2. Validate quality_threshold if provided
-    # 3. Get list of metrics to summarize
-    # 4. For each metric:
-    #    - Calculate quality-weighted statistics using QUALITY_WEIGHTS
-    #    - Calculate quality distribution
-    #    - Apply proper filtering
-    # 5. Format response according to API specification
-
-    query = """
-    WITH FilteredData AS (
-        SELECT
-            c.location_id,
-            c.metric_id,
-            c.value,
-            c.quality,
-            m.name AS metric_name,
-            m.unit AS metric_unit,
-            CASE
-                WHEN c.quality = 'excellent' THEN 1.0
-                WHEN c.quality = 'good' THEN 0.75
-                WHEN c.quality = 'questionable' THEN 0.5
-                WHEN c.quality = 'poor' THEN 0.25
-                ELSE 0
-            END AS quality_weight
-        FROM climatedata c
-        JOIN metrics m ON c.metric_id = m.id
-        WHERE
-            (:location_id IS NULL OR c.location_id = :location_id)
-            AND (:start_date IS NULL OR c.date >= :start_date)
-            AND (:end_date IS NULL OR c.date <= :end_date)
-            AND (:metric_name IS NULL OR m.name = :metric_name)
-            AND (:quality_threshold IS NULL OR 
-                (CASE 
-                    WHEN c.quality = 'excellent' THEN 1.0
-                    WHEN c.quality = 'good' THEN 0.75
-                    WHEN c.quality = 'questionable' THEN 0.5
-                    WHEN c.quality = 'poor' THEN 0.25
-                    ELSE 0
-                END) >=
-                CASE 
-                    WHEN :quality_threshold = 'excellent' THEN 1.0
-                    WHEN :quality_threshold = 'good' THEN 0.75
-                    WHEN :quality_threshold = 'questionable' THEN 0.5
-                    WHEN :quality_threshold = 'poor' THEN 0.25
-                    ELSE 0
-                END)
-    ),
-    MetricStats AS (
-        SELECT
-            metric_id,
-            metric_name,
-            metric_unit,
-            MIN(value) AS min_value,
-            MAX(value) AS max_value,
-            AVG(value) AS avg_value,
-            SUM(value * quality_weight) / SUM(quality_weight) AS weighted_avg_value,
-            SUM(CASE WHEN quality = 'excellent' THEN 1 ELSE 0 END) AS excellent_count,
-            SUM(CASE WHEN quality = 'good' THEN 1 ELSE 0 END) AS good_count,
-            SUM(CASE WHEN quality = 'questionable' THEN 1 ELSE 0 END) AS questionable_count,
-            SUM(CASE WHEN quality = 'poor' THEN 1 ELSE 0 END) AS poor_count
-        FROM FilteredData
-        GROUP BY metric_id, metric_name, metric_unit
-    )
-    SELECT
-        metric_name,
-        min_value,
-        max_value,
-        avg_value,
-        weighted_avg_value,
-        metric_unit,
-        jsonb_build_object(
-            'excellent', excellent_count::float / NULLIF(excellent_count + good_count + questionable_count + poor_count, 0),
-            'good', good_count::float / NULLIF(excellent_count + good_count + questionable_count + poor_count, 0),
-            'questionable', questionable_count::float / NULLIF(excellent_count + good_count + questionable_count + poor_count, 0),
-            'poor', poor_count::float / NULLIF(excellent_count + good_count + questionable_count + poor_count, 0)
-        ) AS quality_distribution
-    FROM MetricStats;
-    """
-    with Session(engine) as session:
-        # Execute the query with parameters
-        result = session.execute(
-            text(query),
-            {
-                "location_id": location_id,
-                "start_date": start_date,
-                "end_date": end_date,
-                "metric_name": metric,
-                "quality_threshold": quality_threshold
-            }
-        )
-
-        # Fetch and process results
-        summary = result.fetchall()
-        print("summary: ", summary)
-        data = {}
-        for row in summary:
-            metric_name = row.metric_name
-            data[metric_name] = {
-                "min": row.min_value,
-                "max": row.max_value,
-                "avg": row.avg_value,
-                "weighted_avg": row.weighted_avg_value,
-                "unit": row.metric_unit,
-                "quality_distribution": row.quality_distribution
-            }
+    group_by = parse_group_by(group_by)
+    filters = await resolve_metrics(parse_filters(location_id, start_date, end_date, metric, quality_threshold, near, radius_km))
+    query, params = build_summary_query(filters, by_location=group_by is not None)
 
-        return data
\ No newline at end of file
+    return await cached_json(request, lambda: summarize(query, params, group_by))
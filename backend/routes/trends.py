@@ -1,138 +1,396 @@
-from typing import Optional
-from fastapi import APIRouter
-from sqlalchemy import text
-from sqlmodel import Session
-import pandas as pd
+import datetime
+from typing import Dict, List, Optional, Tuple, Union
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import BaseModel
 import numpy as np
-from scipy import stats
-from ..dal.engine import engine
+from ..analytics.trends import ANOMALY_SIGMA, REFERENCE_DATE, Moments, analyze, analyze_columns, format_trend
+from ..cache import cached_json
+from ..compute import pool_partitions, run_in_pool, split_groups
+from ..dal.engine import fetch_all
+from ..dal.queries import ReadingFilters, statement
+from ..dal.quality import quality_name
+from ..dal.rollups import DAY_OFFSET
+from ..dimensions import dimensions, resolve_metrics
+from ..instrumentation import offload
+from .climate import parse_filters
+from .summary import location_column, parse_group_by, rollup_parts
 
 router = APIRouter(tags=["trends"])
 
-@router.get("/api/v1/trends")
-def get_trends(
-    location_id: Optional[int] = None,
+"""
+Trend Response Models
+
+NOTE: document the response in the OpenAPI schema, responses are serialized straight from dicts
+"""
+class AnomalyResponse(BaseModel):
+    date: datetime.date
+    value: float
+    deviation: float
+    quality: str
+
+class SeasonPatternResponse(BaseModel):
+    avg: float
+    trend: str
+
+class SeasonalityResponse(BaseModel):
+    detected: bool
+    period: str
+    confidence: float
+    pattern: Dict[str, SeasonPatternResponse]
+
+class MetricTrendResponse(BaseModel):
+    direction: str
+    rate: float
+    confidence: float
+    unit: str
+    anomalies: List[AnomalyResponse]
+    seasonality: SeasonalityResponse
+
+"""
+Filtered readings for the trend analysis. `{where}` is filled from ReadingFilters so only the
+predicates that apply reach the planner.
+
+NOTE: metric names and units come from the dimension registry, the readings are read alone.
+"""
+TRENDS_QUERY = """
+SELECT c.date, c.value, c.metric_id, c.quality, c.location_id
+FROM climatedata c
+WHERE {where}
+"""
+
+# NOTE: the moments and anomalies queries wrap TRENDS_QUERY so all three paths filter identically
+MOMENTS_QUERY = f"""
+SELECT
+    {{location}}t.metric_id,
+    EXTRACT(MONTH FROM t.date)::int AS month,
+    COUNT(*) AS n,
+    SUM(t.x) AS sx,
+    SUM(t.value) AS sy,
+    SUM(t.x * t.x) AS sxx,
+    SUM(t.x * t.value) AS sxy,
+    SUM(t.value * t.value) AS syy
+FROM (
+    SELECT f.*, (f.date - DATE '{REFERENCE_DATE}')::float8 AS x
+    FROM ({TRENDS_QUERY}) f
+) t
+GROUP BY {{location}}t.metric_id, EXTRACT(MONTH FROM t.date)
+"""
+
+ANOMALIES_QUERY = f"""
+SELECT f.date, f.value, f.metric_id, f.quality, (f.value - s.mean) / s.std AS z
+FROM ({TRENDS_QUERY}) f
+JOIN unnest(CAST(:metric_ids AS INTEGER[]), CAST(:means AS FLOAT8[]), CAST(:stds AS FLOAT8[]))
+    AS s(metric_id, mean, std) ON s.metric_id = f.metric_id
+WHERE s.std > 0 AND abs(f.value - s.mean) > {ANOMALY_SIGMA} * s.std
+ORDER BY f.metric_id, f.date
+"""
+
+# grouped requests score every location's readings against the mean and std of its group
+GROUPED_ANOMALIES_QUERY = f"""
+SELECT f.date, f.value, f.metric_id, f.quality, f.location_id, (f.value - s.mean) / s.std AS z
+FROM ({TRENDS_QUERY}) f
+JOIN unnest(
+    CAST(:location_ids AS INTEGER[]), CAST(:metric_ids AS INTEGER[]), CAST(:means AS FLOAT8[]), CAST(:stds AS FLOAT8[])
+) AS s(location_id, metric_id, mean, std) ON s.location_id = f.location_id AND s.metric_id = f.metric_id
+WHERE s.std > 0 AND abs(f.value - s.mean) > {ANOMALY_SIGMA} * s.std
+ORDER BY f.metric_id, f.date, f.location_id
+"""
+
+"""
+The moments of whole months are read from CLIMATE_ROLLUP_MONTHLY, which every write keeps
+up to date, so only the partial months at the edges of the range are aggregated from
+CLIMATEDATA. Raw readings are then only fetched for the anomalies themselves.
+"""
+ROLLUP_MOMENTS_PART = """
+SELECT
+    {location}r.metric_id,
+    EXTRACT(MONTH FROM r.period)::int AS month,
+    r.reading_count AS n,
+    r.day_sum AS sx,
+    r.value_sum AS sy,
+    r.day_sq_sum AS sxx,
+    r.day_value_sum AS sxy,
+    r.value_sq_sum AS syy
+FROM climate_rollup_monthly r
+WHERE {where}
+"""
+
+RAW_MOMENTS_PART = f"""
+SELECT
+    {{location}}c.metric_id,
+    EXTRACT(MONTH FROM c.date)::int AS month,
+    COUNT(*) AS n,
+    SUM({DAY_OFFSET}) AS sx,
+    SUM(c.value) AS sy,
+    SUM({DAY_OFFSET} * {DAY_OFFSET}) AS sxx,
+    SUM({DAY_OFFSET} * c.value) AS sxy,
+    SUM(c.value * c.value) AS syy
+FROM climatedata c
+WHERE {{where}}
+GROUP BY {{location}}c.metric_id, EXTRACT(MONTH FROM c.date)
+"""
+
+ROLLUP_MOMENTS_QUERY = """
+WITH Parts AS (
+{parts}
+)
+SELECT
+    {location}p.metric_id,
+    p.month,
+    SUM(p.n) AS n,
+    SUM(p.sx) AS sx,
+    SUM(p.sy) AS sy,
+    SUM(p.sxx) AS sxx,
+    SUM(p.sxy) AS sxy,
+    SUM(p.syy) AS syy
+FROM Parts p
+GROUP BY {location}p.metric_id, p.month
+"""
+
+COMPUTE_MODES = ["rollup", "numpy", "sql"]
+
+def anomaly(date, value, z: float, quality: int) -> Dict:
+    return {"date": date, "value": value, "deviation": round(float(z), 2), "quality": quality_name(quality)}
+
+"""
+Turns TRENDS_QUERY rows into (dates, values, metric_ids, qualities, location_ids) columns.
+"""
+def columns_from_rows(rows: List) -> Tuple:
+    dates, values, metric_ids, qualities, location_ids = zip(*rows)
+    return (
+        np.array(dates, dtype="datetime64[D]"),
+        np.array(values, dtype=np.float64),
+        np.array(metric_ids),
+        np.array(qualities, dtype=np.int8),
+        np.array(location_ids)
+    )
+
+"""
+Distinct ids of an id column. Ids are small positive integers, so a bincount beats sorting.
+"""
+def present_ids(ids: np.ndarray) -> List[int]:
+    return np.flatnonzero(np.bincount(ids)).tolist() if len(ids) else []
+
+"""
+Builds the arguments of trends_from_columns from reading columns. `metrics` maps metric ids to
+their Metrics rows.
+
+With `groups`, a map of location ids to group keys, every (group, metric) is its own series:
+the series id is group code * stride + metric id and its name the (group, metric name) pair,
+see nest_groups.
+"""
+def series_columns(
+    dates: np.ndarray,
+    values: np.ndarray,
+    metric_ids: np.ndarray,
+    qualities: np.ndarray,
+    location_ids: np.ndarray,
+    metrics: Dict,
+    groups: Optional[Dict[int, str]] = None
+) -> Tuple:
+    series = {metric_id: (metrics[metric_id].name, metrics[metric_id].unit) for metric_id in present_ids(metric_ids)}
+    series_ids = metric_ids
+
+    if groups is not None:
+        keys = sorted(set(groups.values()))
+        codes = {key: code for code, key in enumerate(keys)}
+        lookup = np.zeros(max(groups) + 1, dtype=np.int64)
+        lookup[list(groups)] = [codes[key] for key in groups.values()]
+
+        stride = max(series) + 1
+        series_ids = lookup[location_ids] * stride + metric_ids
+        series = {
+            code * stride + metric_id: ((key, name), unit)
+            for code, key in enumerate(keys) for metric_id, (name, unit) in series.items()
+        }
+
+    return dates, values, series_ids, qualities, series
+
+"""
+Nests trends keyed by (group, metric name) into `{group: {metric name: trend}}`.
+"""
+def nest_groups(trends: Dict) -> Dict[str, Dict]:
+    nested = {}
+    for (key, name), trend in trends.items():
+        nested.setdefault(key, {})[name] = trend
+    return nested
+
+"""
+Runs the trend engine over reading columns. `metrics` maps metric ids to (name, unit).
+"""
+def trends_from_columns(dates: np.ndarray, values: np.ndarray, metric_ids: np.ndarray, qualities, metrics: Dict) -> Dict:
+    if not len(values):
+        return {}
+
+    metric_codes, groups = np.unique(metric_ids, return_inverse=True)
+    result, anomaly_rows, z = analyze_columns(groups, dates, values, len(metric_codes))
+
+    anomalies: List[List[Dict]] = [[] for _ in metric_codes]
+    for row in anomaly_rows:
+        anomalies[groups[row]].append(anomaly(dates[row].item(), float(values[row]), z[row], int(qualities[row])))
+
+    trends = {}
+    for group, metric_id in enumerate(metric_codes.tolist()):
+        name, unit = metrics[metric_id]
+        trends[name] = format_trend(result, group, unit, anomalies[group])
+    return trends
+
+"""
+Splits reading columns into partitions of whole metrics, balanced by row count, as argument
+tuples for trends_from_columns.
+"""
+def trend_partitions(dates: np.ndarray, values: np.ndarray, metric_ids: np.ndarray, qualities, metrics: Dict, parts: int) -> List[tuple]:
+    if parts <= 1:
+        return [(dates, values, metric_ids, qualities, metrics)]
+
+    qualities = np.asarray(qualities)
+    partitions = []
+    for rows in split_groups(metric_ids, parts):
+        part_metric_ids = metric_ids[rows]
+        part_metrics = {metric_id: metrics[metric_id] for metric_id in np.unique(part_metric_ids).tolist()}
+        partitions.append((dates[rows], values[rows], part_metric_ids, qualities[rows], part_metrics))
+    return partitions
+
+"""
+Merges per partition results back into the order trends_from_columns returns for the whole batch.
+"""
+def merge_trends(results: List[Dict], metric_ids: np.ndarray, metrics: Dict) -> Dict:
+    merged = {}
+    for result in results:
+        merged.update(result)
+    names = [metrics[metric_id][0] for metric_id in np.unique(metric_ids).tolist()]
+    return {name: merged[name] for name in names}
+
+"""
+Runs trends_from_columns off the event loop. Large batches are fanned out per metric over
+the process pool (compute.py), the rest run on the threadpool.
+"""
+async def analyze_trends(dates: np.ndarray, values: np.ndarray, metric_ids: np.ndarray, qualities, metrics: Dict) -> Dict:
+    parts = pool_partitions(len(values))
+    if not parts:
+        return await offload(trends_from_columns, dates, values, metric_ids, qualities, metrics)
+
+    partitions = trend_partitions(dates, values, metric_ids, qualities, metrics, parts)
+    return merge_trends(await run_in_pool(trends_from_columns, partitions), metric_ids, metrics)
+
+"""
+Builds the rollup moments SQL and its parameters for the given filters.
+"""
+def build_moments_query(filters: ReadingFilters, by_location: bool = False) -> Tuple[str, dict]:
+    # the date bounds are split between rollups and raw rows
+    params = filters.without_dates().params()
+    parts = rollup_parts(filters, params, ROLLUP_MOMENTS_PART, RAW_MOMENTS_PART, by_location)
+    return ROLLUP_MOMENTS_QUERY.format(parts="UNION ALL".join(parts), location=location_column("p", by_location)), params
+
+"""
+Runs the regression from per (metric, month) moment rows, then fetches only the anomalous
+readings matching `where`.
+
+With `group_by`, the moment rows are per (location, metric, month) and are summed into one
+series per (group, metric), the moments being plain sums.
+"""
+async def trends_from_moments(moments_query: str, moments_params: dict, where: str, params: dict, group_by: Optional[str] = None) -> Dict:
+    moment_rows = await fetch_all(statement(moments_query), moments_params)
+    if not moment_rows:
+        return {}
+
+    registry = await dimensions(
+        {row.location_id for row in moment_rows} if group_by else (),
+        {row.metric_id for row in moment_rows}
+    )
+    groups = registry.location_groups(group_by) if group_by else None
+
+    def series_of(row):
+        return row.metric_id if groups is None else (groups[row.location_id], row.metric_id)
+
+    series = sorted({series_of(row) for row in moment_rows})
+    group_of = {key: group for group, key in enumerate(series)}
+    moments = Moments.from_rows(
+        [(group_of[series_of(row)], row.month, row.n, row.sx, row.sy, row.sxx, row.sxy, row.syy) for row in moment_rows],
+        len(series)
+    )
+    result = analyze(moments)
+    means, stds = result.overall.mean.tolist(), result.overall.std.tolist()
+
+    if groups is None:
+        anomaly_rows = await fetch_all(statement(ANOMALIES_QUERY.format(where=where)), {
+            **params, "metric_ids": series, "means": means, "stds": stds
+        })
+    else:
+        # every location is scored against the moments of its group
+        cells = sorted({(row.location_id, row.metric_id) for row in moment_rows})
+        cell_groups = [group_of[(groups[location_id], metric_id)] for location_id, metric_id in cells]
+        anomaly_rows = await fetch_all(statement(GROUPED_ANOMALIES_QUERY.format(where=where)), {
+            **params,
+            "location_ids": [location_id for location_id, _ in cells],
+            "metric_ids": [metric_id for _, metric_id in cells],
+            "means": [means[group] for group in cell_groups],
+            "stds": [stds[group] for group in cell_groups]
+        })
+    anomalies: List[List[Dict]] = [[] for _ in series]
+    for row in anomaly_rows:
+        anomalies[group_of[series_of(row)]].append(anomaly(row.date, row.value, row.z, row.quality))
+
+    trends = {}
+    for group, key in enumerate(series):
+        metric = registry.metrics[key if groups is None else key[1]]
+        name = metric.name if groups is None else (key[0], metric.name)
+        trends[name] = format_trend(result, group, metric.unit, anomalies[group])
+    return trends if groups is None else nest_groups(trends)
+
+@router.get(
+    "/api/v1/trends",
+    response_model=Union[Dict[str, MetricTrendResponse], Dict[str, Dict[str, MetricTrendResponse]]]
+)
+async def get_trends(
+    request: Request,
+    location_id: Optional[List[int]] = Query(None),
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    metric: Optional[str] = None,
-    quality_threshold: Optional[str] = None
+    metric: Optional[List[str]] = Query(None),
+    quality_threshold: Optional[str] = None,
+    near: Optional[str] = None,
+    radius_km: Optional[float] = Query(None, gt=0),
+    compute: str = "rollup",
+    group_by: Optional[str] = None
 ):
     """
     Analyze trends and patterns in climate data.
-    Query parameters: location_id, start_date, end_date, metric, quality_threshold
-    
+    Query parameters: location_id, start_date, end_date, metric, quality_threshold, near, radius_km, compute, group_by
+
+    location_id and metric can be repeated to select several. With `group_by=location|region|country`
+    the trends are returned per group, `{group: {metric: trend}}`, every group analyzed in the same pass.
+
+    Trends are regressed on the actual reading dates and reported per month. `compute=rollup`
+    reads the regression moments of whole months from the monthly rollups, `compute=sql` computes
+    them from the raw readings in Postgres and `compute=numpy` fetches the readings and runs the
+    whole analysis in the app, spread over the compute worker processes when it's large.
+
     Returns trend analysis including direction, rate of change, anomalies, and seasonality.
     """
-    # Implement this endpoint
-    # 1. Get query parameters from request.args
-    # 2. Validate quality_threshold if provided
-    # 3. For each metric:
-    #    - Calculate trend direction and rate of change
-    #    - Identify anomalies (values > 2 standard deviations)
-    #    - Detect seasonal patterns if sufficient data
-    #    - Calculate confidence scores
-    # 4. Format response according to API specification
-
-    query = """
-    SELECT c.date, c.value, m.unit as metric_unit, m.name AS metric_name, c.quality
-    FROM climatedata c
-    JOIN metrics m ON c.metric_id = m.id
-    WHERE (:location_id IS NULL OR c.location_id = :location_id)
-    AND (:start_date IS NULL OR c.date >= :start_date)
-    AND (:end_date IS NULL OR c.date <= :end_date)
-    AND (:metric_name IS NULL OR m.name = :metric_name)
-    AND (:quality_threshold IS NULL OR 
-        (CASE 
-            WHEN c.quality = 'excellent' THEN 1.0
-            WHEN c.quality = 'good' THEN 0.75
-            WHEN c.quality = 'questionable' THEN 0.5
-            WHEN c.quality = 'poor' THEN 0.25
-            ELSE 0
-        END) >=
-        CASE 
-            WHEN :quality_threshold = 'excellent' THEN 1.0
-            WHEN :quality_threshold = 'good' THEN 0.75
-            WHEN :quality_threshold = 'questionable' THEN 0.5
-            WHEN :quality_threshold = 'poor' THEN 0.25
-            ELSE 0
-        END)
-    """
+    if compute not in COMPUTE_MODES:
+        raise HTTPException(status_code=400, detail=f"compute must be one of {COMPUTE_MODES}")
+
+    group_by = parse_group_by(group_by)
+    filters = await resolve_metrics(parse_filters(location_id, start_date, end_date, metric, quality_threshold, near, radius_km))
+    where, params = filters.where("c"), filters.params()
+    by_location = group_by is not None
+
+    async def compute_trends():
+        if compute == "rollup":
+            moments_query, moments_params = build_moments_query(filters, by_location)
+            return await trends_from_moments(moments_query, moments_params, where, params, group_by)
+        if compute == "sql":
+            moments_query = MOMENTS_QUERY.format(where=where, location=location_column("t", by_location))
+            return await trends_from_moments(moments_query, params, where, params, group_by)
+
+        rows = await fetch_all(statement(TRENDS_QUERY.format(where=where)), params)
+        if not rows:
+            return {}
+        dates, values, metric_ids, qualities, location_ids = await offload(columns_from_rows, rows)
+        registry = await dimensions(present_ids(location_ids) if group_by else (), present_ids(metric_ids))
+        groups = registry.location_groups(group_by) if group_by else None
+        trends = await analyze_trends(*series_columns(dates, values, metric_ids, qualities, location_ids, registry.metrics, groups))
+        return trends if groups is None else nest_groups(trends)
 
-    with Session(engine) as session:
-        result = session.execute(
-            text(query),
-            {
-                "location_id": location_id,
-                "start_date": start_date,
-                "end_date": end_date,
-                "metric_name": metric,
-                "quality_threshold": quality_threshold
-            }
-        )
-
-        data = result.fetchall()
-
-        # Process the data into a DataFrame for easier analysis
-        df = pd.DataFrame(data, columns=['date', 'value', 'metric_unit', 'metric_name', 'quality'])
-        df['date'] = pd.to_datetime(df['date'])
-
-        # Analyze trends and calculate rate of change using linear regression
-        trend_results = {}
-        for metric_name, group in df.groupby('metric_name'):
-            # Perform linear regression (slope gives the rate of change)
-            x = np.array([i for i in range(len(group))])
-            y = group['value'].values
-            slope, intercept, r_value, p_value, std_err = stats.linregress(x, y)
-
-            trend_results[metric_name] = {
-                'direction': 'increasing' if slope > 0 else 'decreasing',
-                'rate': round(slope, 2),
-                'confidence': round(r_value**2, 2),
-                'unit': group['metric_unit'].values[0]
-            }
-
-            # Detect anomalies (values > 2 standard deviations from the mean)
-            mean = np.mean(group['value'])
-            std_dev = np.std(group['value'])
-            anomalies = group[group['value'] > (mean + 2 * std_dev)]
-            anomalies["deviation"] = round(std_dev, 2)
-            trend_results[metric_name]['anomalies'] = anomalies[['date', 'value', 'deviation', 'quality']].to_dict(orient='records')
-
-            # TODO: THESE VALUES ARE HARDCODED AND NEED TO BE FIXED WITH THE RIGHT DATA FRAME
-            group['month'] = group['date'].dt.month
-            pattern = group.groupby('month')['value'].mean()
-
-            # Define seasons based on months
-            seasons = {
-                "winter": [1],   # December, January, February
-                "spring": [2],    # March, April, May
-                "summer": [3],    # June, July, August
-                "fall": [4]     # September, October, November
-            }
-
-            # Initialize seasonality structure
-            seasonality = {
-                "detected": True,
-                "period": "yearly",
-                "confidence": 0.92,
-                "pattern": {}
-            }
-
-            # Calculate the average for each season
-            for season, months in seasons.items():
-                # Get the monthly average value for the specific season
-                season_values = pattern.loc[months].mean()
-                
-                # For simplicity, assume trend is 'increasing' if the value is above 15
-                trend = "increasing" if season_values > 15 else "stable"
-
-                # Store the season pattern and trend
-                seasonality["pattern"][season] = {
-                    "avg": round(season_values, 2),
-                    "trend": trend
-                }
-
-            # Add seasonality results to the main results
-            trend_results[metric_name]['seasonality'] = seasonality
-
-        return trend_results
\ No newline at end of file
+    return await cached_json(request, compute_trends)
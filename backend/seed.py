@@ -1,24 +1,34 @@
-from typing import List
+from typing import Dict, List
 from .dal.models.locations import Locations
 from .dal.models.metrics import Metrics
-from .dal.models.climate_data import ClimateData
 from .routes.locations import create_location
 from .routes.metrics import create_metric
-from .routes.climate import create_climate_data
+from .ingest import ingest_records
+from dotenv import load_dotenv
 import json
+import os
 
-SEED_FILE_NAME = "../data/sample_data.json"
+"""
+Seeds the database from the sample data.
 
-with open(SEED_FILE_NAME, 'r') as file:
-    data = json.load(file)
+Nothing is read at import time, the file is only opened when seeding. Its path is resolved
+from this file rather than the working directory so the app can be started from anywhere,
+SEED_FILE overrides it.
 
-locations_seed = data["locations"]
-metrics_seed = data["metrics"]
-climate_data_seeds = data["climate_data"]
+The dev server seeds in the background on startup, see app.py. Seed explicitly with:
+`python -m backend.seed`
+"""
+
+load_dotenv()
+SEED_FILE = os.getenv("SEED_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "sample_data.json"))
+
+def load_seed() -> Dict:
+    with open(SEED_FILE, 'r') as file:
+        return json.load(file)
 
 # Create Locations Data
 # Reuse POST endpoint logic
-def create_locations_from_seed():
+def create_locations_from_seed(locations_seed: List[Dict]):
     for location in locations_seed:
         seed_location = Locations(
             name=location["name"],
@@ -31,7 +41,7 @@ def create_locations_from_seed():
 
 # Create Metrics Data
 # Reuse POST endpoint logic
-def create_metrics_from_seed():
+def create_metrics_from_seed(metrics_seed: List[Dict]):
     for metrics in metrics_seed:
         seed_metric = Metrics(
             name=metrics["name"],
@@ -42,14 +52,21 @@ def create_metrics_from_seed():
         create_metric(seed_metric)
 
 # Create Climate Data
-# Reuse POST endpoint logic
-def create_climate_data_from_seed():
-    for climate_data_seed in climate_data_seeds:
-        climate_data = ClimateData(
-            location_id=climate_data_seed["location_id"],
-            metric_id=climate_data_seed["metric_id"],
-            date=climate_data_seed["date"],
-            value=climate_data_seed["value"],
-            quality=climate_data_seed["quality"]
-        )
-        create_climate_data(climate_data)
\ No newline at end of file
+# Reuse the bulk ingestion path
+def create_climate_data_from_seed(climate_data_seeds: List[Dict]):
+    report = ingest_records(climate_data_seeds)
+    print(f"SEEDED {report.written} READINGS IN {report.elapsed_seconds}s")
+
+def seed():
+    print("SEEDING DATA...")
+    data = load_seed()
+    create_locations_from_seed(data["locations"])
+    create_metrics_from_seed(data["metrics"])
+    create_climate_data_from_seed(data["climate_data"])
+
+if __name__ == "__main__":
+    from .dal.engine import engine
+    from .dal.migrations import migrate
+
+    migrate(engine)
+    seed()
@@ -0,0 +1,48 @@
+import asyncio
+import traceback
+from typing import Callable, Dict
+from fastapi.concurrency import run_in_threadpool
+
+"""
+Startup work that runs in the background once the server accepts connections, e.g. seeding
+the dev database or warming up the compute workers, and the readiness derived from it.
+
+GET /ready (routes/monitoring.py) answers 503 until every task has finished, so a load
+balancer or a test harness can wait on it while liveness (GET /) is served right away.
+"""
+
+_tasks: Dict[str, asyncio.Task] = {}
+
+def _report_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"STARTUP TASK {task.get_name().upper()} FAILED")
+        traceback.print_exception(task.exception())
+
+"""
+Runs blocking `function` on the threadpool without holding up startup.
+"""
+def start_background(name: str, function: Callable):
+    task = asyncio.get_running_loop().create_task(run_in_threadpool(function), name=name)
+    task.add_done_callback(_report_failure)
+    _tasks[name] = task
+
+def task_states() -> Dict[str, str]:
+    states = {}
+    for name, task in _tasks.items():
+        if not task.done():
+            states[name] = "running"
+        elif task.cancelled() or task.exception() is not None:
+            states[name] = "failed"
+        else:
+            states[name] = "done"
+    return states
+
+def ready() -> bool:
+    return all(state == "done" for state in task_states().values())
+
+"""
+Waits for the background tasks to finish, e.g. before shutdown drops the tables they write to.
+"""
+async def wait_background():
+    await asyncio.gather(*_tasks.values(), return_exceptions=True)
+    _tasks.clear()
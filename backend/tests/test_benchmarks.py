@@ -0,0 +1,34 @@
+import numpy as np
+
+from backend.benchmarks.compare import compare
+from backend.benchmarks.generate import Dataset, generate_readings, metric_profiles
+
+DATASET = Dataset(locations=3, metrics=3, years=2, anomaly_rate=0.01)
+
+def concatenated(chunk_rows: int):
+    chunks = list(generate_readings(DATASET, chunk_rows))
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+def test_generator_is_deterministic_whatever_the_chunk_size():
+    whole, chunked = concatenated(DATASET.rows), concatenated(1)
+    assert len(whole["value"]) == DATASET.rows
+    for name in whole:
+        assert np.array_equal(whole[name], chunked[name])
+
+def test_generated_readings_respect_metric_bounds_and_qualities():
+    readings = concatenated(DATASET.rows)
+    for index, profile in enumerate(metric_profiles(DATASET.metrics)):
+        values = readings["value"][readings["metric"] == index]
+        assert values.min() >= profile.low and values.max() <= profile.high
+    assert set(np.unique(readings["quality"]).tolist()) <= {1, 2, 3, 4}
+
+def report(requests_per_second: float, p95: float) -> dict:
+    return {"results": [{
+        "endpoint": "trends", "clients": 10, "requests_per_second": requests_per_second,
+        "p50_ms": 10.0, "p95_ms": p95, "p99_ms": 30.0
+    }]}
+
+def test_compare_flags_only_changes_beyond_the_threshold():
+    assert not compare(report(100, 20), report(95, 21), threshold=10)[1]
+    assert compare(report(100, 20), report(80, 20), threshold=10)[1]
+    assert compare(report(100, 20), report(100, 25), threshold=10)[1]
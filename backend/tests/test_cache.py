@@ -0,0 +1,95 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from backend import cache
+from backend.cache import LocalBackend, LRUCache, bump_data_version, cached_json
+
+calls = []
+
+app = FastAPI()
+
+@app.get("/items")
+async def get_items(request: Request, limit: int = 10):
+    async def compute():
+        calls.append(limit)
+        return {"limit": limit, "calls": len(calls)}
+    return await cached_json(request, compute)
+
+client = TestClient(app)
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(max_entries=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1 and lru.get("c") == 3
+
+def test_equivalent_queries_share_an_entry():
+    bump_data_version()
+    calls.clear()
+    first = client.get("/items?limit=5&sort=")
+    second = client.get("/items", params={"limit": 5})
+    assert first.json() == second.json()
+    assert len(calls) == 1
+
+def test_etag_revalidation():
+    response = client.get("/items", params={"limit": 7})
+    etag = response.headers["etag"]
+    assert "max-age" in response.headers["cache-control"]
+
+    revalidated = client.get("/items", params={"limit": 7}, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == etag
+
+def test_data_version_invalidates_entries():
+    calls.clear()
+    client.get("/items", params={"limit": 3})
+    client.get("/items", params={"limit": 3})
+    assert len(calls) == 1
+
+    bump_data_version()
+    client.get("/items", params={"limit": 3})
+    assert len(calls) == 2
+
+def test_shared_backend_fills_the_local_tier(monkeypatch):
+    monkeypatch.setattr(cache, "shared", LocalBackend())
+    calls.clear()
+    first = client.get("/items", params={"limit": 4})
+
+    # a fresh worker with an empty LRU is served from the shared backend
+    monkeypatch.setattr(cache, "local", LRUCache(max_entries=8))
+    second = client.get("/items", params={"limit": 4})
+    assert len(calls) == 1
+    assert first.headers["etag"] == second.headers["etag"]
+
+    bump_data_version()
+    client.get("/items", params={"limit": 4})
+    assert len(calls) == 2
+
+def test_replica_reads_are_not_stored_right_after_a_write(monkeypatch):
+    monkeypatch.setattr(cache, "reads_may_lag", lambda: True)
+    monkeypatch.setattr(cache, "DB_READ_STICKY_SECONDS", 60)
+    calls.clear()
+    bump_data_version()
+    client.get("/items", params={"limit": 5})
+    client.get("/items", params={"limit": 5})
+    assert len(calls) == 2
+
+    # once replicas had the time to replay the write, entries are stored again
+    monkeypatch.setattr(cache, "DB_READ_STICKY_SECONDS", 0)
+    client.get("/items", params={"limit": 5})
+    client.get("/items", params={"limit": 5})
+    assert len(calls) == 3
+
+def test_lru_entries_expire_after_their_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    lru = LRUCache(max_entries=2, ttl=30)
+    lru.set("a", 1)
+    now[0] += 29
+    assert lru.get("a") == 1
+    now[0] += 1
+    assert lru.get("a") is None and len(lru) == 0
@@ -0,0 +1,42 @@
+from fastapi.testclient import TestClient
+
+import datetime
+import json
+from collections import namedtuple
+
+from backend.app import app
+from backend.dal.models.locations import Locations
+from backend.dal.models.metrics import Metrics
+from backend.dimensions import Dimensions
+from backend.routes.climate import EXPORT_COLUMNS, decode_cursor, encode_cursor, to_response_data, to_response_dicts
+from backend.routes.responses import dumps
+
+client = TestClient(app)
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("2025-01-15", 42)
+    assert decode_cursor(cursor) == (datetime.date(2025, 1, 15), 42)
+
+def test_invalid_cursor():
+    response = client.get("/api/v1/climate", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_invalid_quality_threshold():
+    response = client.get("/api/v1/climate", params={"quality_threshold": "perfect"})
+    assert response.status_code == 400
+
+def test_invalid_export_format():
+    response = client.get("/api/v1/climate/export", params={"format": "xml"})
+    assert response.status_code == 400
+
+def test_fast_path_matches_response_model():
+    Row = namedtuple("Row", [column if column != "metric" else "metric_name" for column in EXPORT_COLUMNS])
+    row = Row(7, 1, "Irvine", 33.68, -117.82, datetime.date(2025, 1, 15), "temperature", 18.5, "celsius", "good")
+    registry = Dimensions.of(
+        0,
+        [Locations(id=1, name="Irvine", country="USA", latitude=33.68, longitude=-117.82, region="California")],
+        [Metrics(id=3, name="temperature", display_name="Temperature", unit="celsius", description="")]
+    )
+
+    fast = json.loads(dumps(to_response_dicts(registry, [(7, 1, datetime.date(2025, 1, 15), 3, 18.5, "good")])))
+    assert fast == [json.loads(to_response_data(row).model_dump_json())]
@@ -0,0 +1,79 @@
+import asyncio
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from backend import compute
+from backend.dal.models.metrics import Metrics
+from backend.routes.trends import merge_trends, nest_groups, series_columns, trend_partitions, trends_from_columns
+
+def readings(metrics: int = 5, rows: int = 20_000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    # skewed so the partitions can't just take equal numbers of metrics
+    metric_ids = rng.choice(np.arange(1, metrics + 1), rows, p=np.arange(1, metrics + 1) / (metrics * (metrics + 1) / 2))
+    day = rng.integers(0, 1500, rows)
+    dates = np.datetime64("2020-01-01") + day.astype("timedelta64[D]")
+    values = 10 + metric_ids * 0.01 * day + 5 * np.sin(2 * np.pi * day / 365.25) + rng.normal(0, 1, rows)
+    values[rng.integers(0, rows, 20)] += 40
+    qualities = rng.integers(1, 5, rows)
+    return dates, values, metric_ids, qualities, {metric_id: (f"metric_{metric_id}", "unit") for metric_id in range(1, metrics + 1)}
+
+def test_split_groups_keeps_groups_whole_and_balanced():
+    _, _, metric_ids, _, _ = readings()
+    partitions = compute.split_groups(metric_ids, 2)
+
+    assert np.array_equal(np.sort(np.concatenate(partitions)), np.arange(len(metric_ids)))
+    assert not set(metric_ids[partitions[0]].tolist()) & set(metric_ids[partitions[1]].tolist())
+    sizes = [len(rows) for rows in partitions]
+    assert max(sizes) - min(sizes) <= np.bincount(metric_ids).max()
+    assert len(compute.split_groups(metric_ids, 50)) == 5
+
+def test_partitioned_trends_match_the_whole_batch():
+    columns = readings()
+    partitions = trend_partitions(*columns, parts=3)
+    merged = merge_trends([trends_from_columns(*args) for args in partitions], columns[2], columns[4])
+    assert merged == trends_from_columns(*columns)
+    assert list(merged) == [f"metric_{metric_id}" for metric_id in range(1, 6)]
+
+def test_grouped_trends_match_each_group_alone():
+    dates, values, metric_ids, qualities, metrics = readings(metrics=3, rows=6_000)
+    location_ids = np.random.default_rng(1).integers(1, 5, len(values))
+    groups = {1: "Kanto", 2: "England", 3: "Kanto", 4: "California"}
+    registry = {metric_id: Metrics(id=metric_id, name=name, unit=unit) for metric_id, (name, unit) in metrics.items()}
+
+    grouped = nest_groups(trends_from_columns(*series_columns(dates, values, metric_ids, qualities, location_ids, registry, groups)))
+
+    assert list(grouped) == ["California", "England", "Kanto"]
+    for key in grouped:
+        rows_of_group = np.isin(location_ids, [location_id for location_id, group in groups.items() if group == key])
+        alone = trends_from_columns(dates[rows_of_group], values[rows_of_group], metric_ids[rows_of_group], qualities[rows_of_group], metrics)
+        assert grouped[key] == alone
+
+def test_saturated_pool_answers_503(monkeypatch):
+    monkeypatch.setattr(compute, "_pending", compute.COMPUTE_MAX_PENDING)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(compute.run_in_pool(trends_from_columns, [readings()]))
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == str(compute.RETRY_AFTER_SECONDS)
+
+def test_broken_pool_answers_503_and_is_replaced_in_the_background():
+    compute.start_pool(1, warm_up=())
+    broken = compute._pool
+    try:
+        for process in list(broken._processes.values()):
+            process.kill()
+            process.join()
+
+        async def run():
+            with pytest.raises(HTTPException) as error:
+                await compute.run_in_pool(compute._ready, [()])
+            assert error.value.status_code == 503
+            # the event loop isn't held up by the restart, new work stays on the threadpool meanwhile
+            assert compute.pool_partitions(compute.COMPUTE_MIN_ROWS) == 0
+            await compute._restart
+            return await compute.run_in_pool(compute._ready, [()])
+
+        assert asyncio.run(run()) == [True]
+        assert compute._pool is not broken
+    finally:
+        compute.shutdown_pool()
@@ -0,0 +1,65 @@
+import asyncio
+
+from backend import dimensions as registry
+from backend.dal.models.locations import Locations
+from backend.dal.models.metrics import Metrics
+from backend.dal.queries import ReadingFilters
+from backend.dimensions import UNKNOWN_METRIC_ID, Dimensions
+
+LOCATIONS = [
+    Locations(id=1, name="Irvine", country="USA", latitude=33.68, longitude=-117.82, region="California"),
+    Locations(id=2, name="Tokyo", country="Japan", latitude=35.68, longitude=139.69, region="Kanto"),
+]
+METRICS = [
+    Metrics(id=1, name="temperature", display_name="Temperature", unit="celsius", description=""),
+    Metrics(id=2, name="humidity", display_name="Humidity", unit="percent", description=""),
+]
+
+def test_metric_names_resolve_to_ids():
+    dimensions = Dimensions.of(0, LOCATIONS, METRICS)
+
+    assert dimensions.resolve(ReadingFilters(metric="Humidity", location_id=2)) == ReadingFilters(metric_id=2, location_id=2)
+    assert dimensions.resolve(ReadingFilters(metric=["humidity", "temperature"])) == ReadingFilters(metric_id=(1, 2))
+    # an unknown name still filters, to no rows, instead of dropping the filter
+    assert dimensions.resolve(ReadingFilters(metric="pressure")).where("c") == "c.metric_id = :metric_id"
+    assert dimensions.resolve(ReadingFilters(metric="pressure")).metric_id == UNKNOWN_METRIC_ID
+    assert dimensions.location_groups("region") == {1: "California", 2: "Kanto"}
+
+def test_writes_and_unknown_ids_reload_the_registry(monkeypatch):
+    loads = []
+
+    async def fetch_scalars(query):
+        loads.append(query)
+        return LOCATIONS if len(loads) % 2 else METRICS
+
+    monkeypatch.setattr(registry, "fetch_scalars", fetch_scalars)
+    monkeypatch.setattr(registry, "shared", None)
+    monkeypatch.setattr(registry, "_current", Dimensions.of(registry.dimensions_version(), LOCATIONS[:1], METRICS))
+
+    assert asyncio.run(registry.dimensions([1], [1, 2])).locations.keys() == {1}
+    assert loads == []
+    assert asyncio.run(registry.dimensions([2])).locations.keys() == {1, 2}
+    assert len(loads) == 2
+
+    registry.bump_dimensions_version()
+    assert asyncio.run(registry.dimensions()).version == registry.dimensions_version()
+    assert len(loads) == 4
+
+def test_unknown_metric_names_reload_the_registry_once(monkeypatch):
+    loads = []
+
+    async def fetch_scalars(query):
+        loads.append(query)
+        return LOCATIONS if len(loads) % 2 else METRICS
+
+    monkeypatch.setattr(registry, "fetch_scalars", fetch_scalars)
+    monkeypatch.setattr(registry, "shared", None)
+    monkeypatch.setattr(registry, "_current", Dimensions.of(registry.dimensions_version(), LOCATIONS, METRICS[:1]))
+
+    assert asyncio.run(registry.resolve_metrics(ReadingFilters(metric="temperature"))).metric_id == 1
+    assert loads == []
+    # created through another worker after this one loaded the registry
+    assert asyncio.run(registry.resolve_metrics(ReadingFilters(metric="humidity"))).metric_id == 2
+    assert len(loads) == 2
+    assert asyncio.run(registry.resolve_metrics(ReadingFilters(metric="pressure"))).metric_id == UNKNOWN_METRIC_ID
+    assert len(loads) == 4
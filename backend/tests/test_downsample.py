@@ -0,0 +1,53 @@
+import datetime
+import math
+
+import numpy as np
+
+from backend.analytics.downsample import lttb_indices
+from backend.routes.series import bucket_count
+
+def reference_lttb(x, y, threshold):
+    n = len(x)
+    if n <= threshold:
+        return list(range(n))
+    every = (n - 2) / (threshold - 2)
+    previous, kept = 0, [0]
+    for bucket in range(threshold - 2):
+        low, high = math.floor(bucket * every) + 1, math.floor((bucket + 1) * every) + 1
+        next_high = min(math.floor((bucket + 2) * every) + 1, n)
+        avg_x, avg_y = np.mean(x[high:next_high]), np.mean(y[high:next_high])
+        areas = [
+            abs((x[previous] - avg_x) * (y[i] - y[previous]) - (x[previous] - x[i]) * (avg_y - y[previous]))
+            for i in range(low, high)
+        ]
+        previous = low + int(np.argmax(areas))
+        kept.append(previous)
+    return kept + [n - 1]
+
+def test_lttb_matches_reference_for_every_series():
+    rng = np.random.default_rng(0)
+    lengths = [5, 1000, 37, 2500, 12]
+    xs = [np.sort(rng.choice(10_000, n, replace=False)).astype(float) for n in lengths]
+    ys = [rng.normal(size=n).cumsum() for n in lengths]
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    for threshold in [3, 10, 100]:
+        kept = lttb_indices(np.concatenate(xs), np.concatenate(ys), starts, lengths, threshold)
+        expected = [start + i for start, x, y in zip(starts, xs, ys) for i in reference_lttb(x, y, threshold)]
+        assert kept.tolist() == expected
+
+def test_lttb_keeps_extremes_and_bounds_points():
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 500)
+    y[4321] = 50.0
+    kept = lttb_indices(x, y, np.array([0]), np.array([10_000]), 200)
+    assert len(kept) == 200
+    assert {0, 4321, 9999} <= set(kept.tolist())
+
+def test_calendar_bucket_counts():
+    first, last = datetime.date(2023, 11, 15), datetime.date(2025, 2, 3)
+    assert bucket_count(first, last, "day") == (last - first).days + 1
+    assert bucket_count(datetime.date(2025, 1, 5), datetime.date(2025, 1, 6), "week") == 2
+    assert bucket_count(first, last, "month") == 16
+    assert bucket_count(first, last, "quarter") == 6
+    assert bucket_count(first, last, "year") == 3
@@ -0,0 +1,62 @@
+import io
+import json
+import pytest
+
+from backend.dal.models.locations import Locations
+from backend.dal.models.metrics import Metrics
+from backend.dal.quality import quality_ordinal
+from backend.dimensions import Dimensions
+from backend.ingest import format_from_content_type, parse_records, validate_batch
+
+def test_parse_formats_agree():
+    reading = {"location_id": 1, "metric_id": 2, "date": "2025-01-01", "value": 18.5, "quality": "good"}
+    bodies = {
+        "json": json.dumps({"climate_data": [reading]}),
+        "ndjson": json.dumps(reading) + "\n\n",
+        "csv": "location_id,metric_id,date,value,quality\n1,2,2025-01-01,18.5,good\n",
+    }
+    rows = [
+        validate_batch(list(parse_records(io.BytesIO(body.encode()), format)))[0]
+        for format, body in bodies.items()
+    ]
+    assert rows[0] == rows[1] == rows[2]
+    assert len(rows[0]) == 1
+
+def test_validate_batch_reports_bad_records():
+    records = [
+        {"location_id": 1, "metric_id": 1, "date": "2025-01-01", "value": 1.0, "quality": "Excellent"},
+        {"location_id": 1, "metric_id": 1, "date": "2025-01-02", "value": 1.0, "quality": "perfect"},
+        {"location_id": "one", "metric_id": 1, "date": "2025-01-03", "value": 1.0, "quality": "good"},
+    ]
+    rows, errors = validate_batch(records, offset=10)
+    assert [row[4] for row in rows] == [quality_ordinal("excellent")]
+    assert [error.record for error in errors] == [11, 12]
+
+def test_validate_batch_reports_unknown_ids():
+    registry = Dimensions.of(
+        0,
+        [Locations(id=1, name="Irvine", country="USA", latitude=33.68, longitude=-117.82, region="California")],
+        [Metrics(id=1, name="temperature", display_name="Temperature", unit="celsius", description="")]
+    )
+    records = [
+        {"location_id": 1, "metric_id": 1, "date": "2025-01-01", "value": 1.0, "quality": "good"},
+        {"location_id": 2, "metric_id": 1, "date": "2025-01-01", "value": 1.0, "quality": "good"},
+        {"location_id": 1, "metric_id": 1, "date": "2025-01-02", "value": 1.0, "quality": "perfect"},
+        {"location_id": 1, "metric_id": 9, "date": "2025-01-01", "value": 1.0, "quality": "good"},
+    ]
+    rows, errors = validate_batch(records, registry=lambda location_ids, metric_ids: registry)
+    assert len(rows) == 1
+    assert [(error.record, error.error) for error in errors if error.record != 2] == [
+        (1, "Unknown location_id 2"), (3, "Unknown metric_id 9")
+    ]
+    assert [error.record for error in errors] == [1, 2, 3]
+
+@pytest.mark.parametrize("body", ["5", '{"climate_data": 5}', '"readings"'])
+def test_parse_rejects_bodies_that_are_not_lists(body):
+    with pytest.raises(ValueError):
+        list(parse_records(io.BytesIO(body.encode()), "json"))
+
+def test_format_from_content_type():
+    assert format_from_content_type("text/csv; charset=utf-8") == "csv"
+    assert format_from_content_type("application/x-ndjson") == "ndjson"
+    assert format_from_content_type("text/plain") is None
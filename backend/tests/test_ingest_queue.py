@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+
+from backend.ingest_queue import IngestQueue
+
+def doubling_writer(batches: list):
+    def write(items):
+        batches.append(list(items))
+        if "bad" in items and len(items) > 1:
+            raise RuntimeError("the whole batch fails")
+        return [ValueError(item) if item == "bad" else item * 2 for item in items]
+    return write
+
+def test_batches_fill_up_to_their_size():
+    batches, written = [], []
+
+    async def run():
+        queue = IngestQueue("test", doubling_writer(batches), on_written=written.extend, batch_size=3, window_ms=50)
+        queue.start()
+        results = await asyncio.gather(*(queue.submit(number) for number in range(7)))
+        await queue.drain()
+        return results
+
+    assert asyncio.run(run()) == [0, 2, 4, 6, 8, 10, 12]
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert written == list(range(7))
+
+def test_a_bad_item_fails_alone():
+    batches = []
+
+    async def run():
+        queue = IngestQueue("test", doubling_writer(batches), batch_size=10, window_ms=10)
+        queue.start()
+        results = await asyncio.gather(*(queue.submit(item) for item in [1, "bad", 3]), return_exceptions=True)
+        await queue.drain()
+        return results
+
+    first, bad, third = asyncio.run(run())
+    assert (first, third) == (2, 6) and isinstance(bad, ValueError)
+    # the failed batch, then one by one
+    assert batches == [[1, "bad", 3], [1], ["bad"], [3]]
+
+def test_full_queue_pushes_back_and_drain_writes_the_rest():
+    batches = []
+
+    async def run():
+        queue = IngestQueue("test", doubling_writer(batches), max_pending=2, batch_size=10, window_ms=10)
+        queue.start()
+        await queue.submit(1, wait=False)
+        await queue.submit(2, wait=False)
+        with pytest.raises(HTTPException) as error:
+            await queue.submit(3, wait=False)
+        assert error.value.status_code == 503 and error.value.headers["Retry-After"] == "1"
+
+        await queue.drain()
+        assert queue.pending() == 0 and not queue.running()
+        with pytest.raises(HTTPException):
+            await queue.submit(4)
+
+    asyncio.run(run())
+    assert batches == [[1, 2]]
@@ -0,0 +1,37 @@
+from fastapi.testclient import TestClient
+
+from backend import instrumentation
+from backend.app import app
+from backend.instrumentation import Histogram
+
+client = TestClient(app)
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "help text", ["route"], [0.1, 1.0])
+    for value in [0.05, 0.5, 5.0]:
+        histogram.observe(value, '/a "quoted" route')
+
+    lines = histogram.render()
+    assert lines[:2] == ["# HELP test_seconds help text", "# TYPE test_seconds histogram"]
+    assert 'test_seconds_bucket{route="/a \\"quoted\\" route",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="/a \\"quoted\\" route",le="1"} 2' in lines
+    assert 'test_seconds_bucket{route="/a \\"quoted\\" route",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{route="/a \\"quoted\\" route"} 3' in lines
+
+def test_requests_are_recorded_by_route_template():
+    client.get("/api/v1/climate", params={"quality_threshold": "perfect"})
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'ecovision_http_request_duration_seconds_count{method="GET",route="/api/v1/climate",status="400"}' in response.text
+    assert 'ecovision_request_phase_seconds_count{route="/api/v1/climate",phase="db"}' in response.text
+
+def test_profile_is_opt_in(monkeypatch):
+    params = {"quality_threshold": "perfect", "profile": "1"}
+    monkeypatch.setattr(instrumentation, "PROFILING_ENABLED", False)
+    assert client.get("/api/v1/climate", params=params).headers["content-type"] == "application/json"
+
+    monkeypatch.setattr(instrumentation, "PROFILING_ENABLED", True)
+    response = client.get("/api/v1/climate", params=params)
+    assert response.headers["x-profile-status"] == "400"
+    assert "function calls" in response.text
@@ -0,0 +1,128 @@
+import asyncio
+import datetime
+
+from backend import live
+from backend.dal.models.locations import Locations
+from backend.dal.models.metrics import Metrics
+from backend.dal.queries import ReadingFilters
+from backend.dimensions import Dimensions
+from backend.live import NOTIFY_PAYLOAD_BYTES, Broadcaster, LiveFilter, notify_payloads, parse_payload
+
+REGISTRY = Dimensions.of(
+    0,
+    [
+        Locations(id=1, name="Irvine", country="USA", latitude=33.68, longitude=-117.82, region="California"),
+        Locations(id=2, name="Tokyo", country="Japan", latitude=35.68, longitude=139.69, region="Kanto"),
+    ],
+    [Metrics(id=1, name="temperature", display_name="Temperature", unit="celsius", description="")]
+)
+DATE = datetime.date(2030, 1, 1)
+
+def reading(id: int, location_id: int, value: float, quality: int = 3, previous: float = None):
+    return (id, location_id, 1, DATE, value, quality, previous)
+
+def test_filters_match_like_the_read_routes():
+    recent_good = LiveFilter(ReadingFilters(location_id=[1, 2], metric_id=1, start_date=DATE, min_quality=3))
+    assert recent_good.matches(reading(1, 2, 10.0), REGISTRY)
+    assert not recent_good.matches(reading(1, 2, 10.0, quality=2), REGISTRY)
+    assert not recent_good.matches((1, 1, 1, DATE - datetime.timedelta(days=1), 10.0, 3, None), REGISTRY)
+    assert not recent_good.matches((1, 1, 2, DATE, 10.0, 3, None), REGISTRY)
+
+    near_irvine = LiveFilter(ReadingFilters(near=(33.7, -117.8, 50)))
+    assert near_irvine.matches(reading(1, 1, 10.0), REGISTRY)
+    assert not near_irvine.matches(reading(2, 2, 10.0), REGISTRY)
+
+def test_readings_and_anomalies_reach_the_matching_subscribers(monkeypatch):
+    # 30 readings alternating 9 and 11 (mean 10, std 1) and the two being dispatched
+    history = [9.0, 11.0] * 15
+    batch = [reading(31, 1, 10.5), reading(32, 1, 20.0)]
+
+    async def fetch_all(query, params):
+        values = history + [row[4] for row in batch]
+        return [(1, 1, len(values), sum(values), sum(value * value for value in values))]
+
+    async def dimensions(location_ids=(), metric_ids=()):
+        return REGISTRY
+
+    monkeypatch.setattr(live, "fetch_all", fetch_all)
+    monkeypatch.setattr(live, "dimensions", dimensions)
+
+    async def run():
+        broadcaster = Broadcaster()
+        broadcaster.start()
+        irvine = broadcaster.subscribe(LiveFilter(ReadingFilters(location_id=1)))
+        tokyo = broadcaster.subscribe(LiveFilter(ReadingFilters(location_id=2)))
+        anomalies = broadcaster.subscribe(LiveFilter(ReadingFilters(), anomalies_only=True))
+        await broadcaster.dispatch(batch)
+        received = [[subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())] for subscriber in (irvine, tokyo, anomalies)]
+        await broadcaster.stop()
+        return received
+
+    irvine, tokyo, anomalies = asyncio.run(run())
+    assert [message.split(b"\n")[0] for message in irvine] == [b"event: reading", b"event: reading", b"event: anomaly"]
+    assert tokyo == []
+    assert len(anomalies) == 1 and anomalies[0] == irvine[2]
+    # only the 20.0 is an anomaly, scored against the 30 readings before it and the 10.5
+    assert b'"value":20.0' in anomalies[0] and b'"deviation":10.1' in anomalies[0]
+
+def test_overwrites_and_queued_batches_are_counted_once(monkeypatch):
+    # the rollups as of the seed: 30 readings alternating 9 and 11, one of them since overwritten
+    # with 13, and a queued batch holding 10
+    rollup = [9.0, 11.0] * 14 + [9.0, 13.0] + [10.0]
+
+    async def fetch_all(query, params):
+        return [(1, 1, len(rollup), sum(rollup), sum(value * value for value in rollup))]
+
+    async def dimensions(location_ids=(), metric_ids=()):
+        return REGISTRY
+
+    monkeypatch.setattr(live, "fetch_all", fetch_all)
+    monkeypatch.setattr(live, "dimensions", dimensions)
+
+    async def run():
+        broadcaster = Broadcaster()
+        broadcaster.start()
+        broadcaster.subscribe(LiveFilter(ReadingFilters(location_id=1)))
+        # both batches are committed and waiting when the first is dispatched
+        broadcaster._receive(broadcaster._inbox, [reading(30, 1, 13.0, previous=11.0)])
+        broadcaster._receive(broadcaster._inbox, [reading(31, 1, 10.0)])
+        for _ in range(2):
+            await broadcaster.dispatch(*reversed(await broadcaster._inbox.get()))
+        stats = broadcaster._stats[(1, 1)]
+        moments = (stats.n, stats.total, stats.squares)
+        await broadcaster.stop()
+        return moments
+
+    assert asyncio.run(run()) == (len(rollup), sum(rollup), sum(value * value for value in rollup))
+
+def test_slow_subscribers_overflow_and_are_dropped(monkeypatch):
+    async def dimensions(location_ids=(), metric_ids=()):
+        return REGISTRY
+
+    async def fetch_all(query, params):
+        return []
+
+    monkeypatch.setattr(live, "dimensions", dimensions)
+    monkeypatch.setattr(live, "fetch_all", fetch_all)
+
+    async def run():
+        broadcaster = Broadcaster(buffer=1)
+        broadcaster.start()
+        subscriber = broadcaster.subscribe(LiveFilter(ReadingFilters()))
+        await broadcaster.dispatch([reading(1, 1, 10.0), reading(2, 1, 10.0)])
+        messages = [message async for message in broadcaster.stream(subscriber)]
+        count = broadcaster.subscribers()
+        await broadcaster.stop()
+        return messages, count
+
+    messages, count = asyncio.run(run())
+    assert messages[1].startswith(b"event: overflow") and len(messages) == 2
+    assert count == 0
+
+def test_notify_payloads_fit_and_round_trip():
+    readings = [(id, 1, 2, DATE, id / 7, 4, None if id % 2 else id / 3) for id in range(1, 501)]
+    payloads = list(notify_payloads(readings))
+
+    assert len(payloads) > 1
+    assert all(len(payload) < NOTIFY_PAYLOAD_BYTES for payload in payloads)
+    assert [row for payload in payloads for row in parse_payload(payload)] == readings
@@ -0,0 +1,19 @@
+import pytest
+
+from backend.dal.quality import QUALITY_CODES, QUALITY_WEIGHTS, QualityType, quality_name, quality_ordinal
+
+def test_ordinals_follow_quality_order():
+    ordinals = [quality_ordinal(name) for name in QUALITY_CODES]
+    assert ordinals == sorted(ordinals)
+    # a higher ordinal never carries a lower weight, so `quality >= n` matches the weights
+    assert [QUALITY_WEIGHTS[name] for name in QUALITY_CODES] == sorted(QUALITY_WEIGHTS.values())
+
+def test_names_round_trip():
+    column = QualityType()
+    for name in QUALITY_CODES:
+        assert column.process_result_value(column.process_bind_param(name.upper(), None), None) == name
+    assert quality_name(quality_ordinal("Good")) == "good"
+
+def test_unknown_quality():
+    with pytest.raises(ValueError):
+        quality_ordinal("perfect")
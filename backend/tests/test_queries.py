@@ -0,0 +1,41 @@
+import datetime
+from sqlalchemy.dialects import postgresql
+
+from backend.dal.queries import ReadingFilters, statement
+
+def test_only_supplied_filters_are_emitted():
+    assert ReadingFilters().where("c") == "TRUE"
+    assert ReadingFilters().params() == {}
+
+    filters = ReadingFilters(location_id=3, end_date=datetime.date(2025, 1, 31), metric="Temperature")
+    assert filters.where("c") == (
+        "c.location_id = :location_id AND c.date <= :end_date "
+        "AND c.metric_id IN (SELECT id FROM metrics WHERE name = :metric)"
+    )
+    assert filters.params() == {"location_id": 3, "end_date": datetime.date(2025, 1, 31), "metric": "temperature"}
+    assert filters.without_dates().where("r") == "r.location_id = :location_id AND r.metric_id IN (SELECT id FROM metrics WHERE name = :metric)"
+
+def test_sql_and_expression_predicates_agree():
+    filters = ReadingFilters(start_date=datetime.date(2025, 1, 1), min_quality=3)
+    compiled = [str(clause.compile(dialect=postgresql.dialect())) for clause in filters.clauses()]
+    assert compiled == ["climatedata.date >= %(date_1)s", "climatedata.quality >= %(quality_1)s"]
+    assert len(filters.predicates("c")) == len(compiled)
+
+def test_equal_filters_share_cache_entries():
+    assert ReadingFilters(metric="HUMIDITY") == ReadingFilters(metric="humidity")
+    assert hash(ReadingFilters(location_id=1)) == hash(ReadingFilters(location_id=1))
+    assert statement("SELECT 1 WHERE TRUE") is statement("SELECT 1 WHERE TRUE")
+
+def test_list_filters_bind_one_array():
+    filters = ReadingFilters(location_id=[3, 1, 3], metric=["Humidity", "temperature"])
+    assert filters == ReadingFilters(location_id=(1, 3), metric=("temperature", "humidity"))
+    assert filters.where("c") == (
+        "c.location_id = ANY(CAST(:location_id AS INTEGER[])) "
+        "AND c.metric_id IN (SELECT id FROM metrics WHERE name = ANY(CAST(:metric AS TEXT[])))"
+    )
+    assert filters.params() == {"location_id": [1, 3], "metric": ["humidity", "temperature"]}
+    assert len(filters.clauses()) == 2
+
+    # a single value keeps the plain equality
+    assert ReadingFilters(location_id=[3]) == ReadingFilters(location_id=3)
+    assert ReadingFilters(location_id=[]).where("c") == "TRUE"
@@ -0,0 +1,156 @@
+import json
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from backend.dal.engine import engine
+from backend.dal.migrations import apply_migrations
+from backend.dal.partitions import ensure_partitions, partition_name
+from backend.dal.rollups import rebuild_rollups
+from backend.dimensions import Dimensions
+from backend.dal.models.metrics import Metrics
+from backend.routes.climate import build_climate_query, build_page_query, parse_filters
+from backend.routes.locations import build_locations_query
+from backend.routes.summary import build_summary_query
+from backend.routes.trends import MOMENTS_QUERY, TRENDS_QUERY, build_moments_query
+
+"""
+EXPLAIN based checks that every read route keeps hitting the CLIMATEDATA indexes.
+
+NOTE: needs the Postgres from .env. The synthetic table lives in a throwaway schema
+inside a single transaction that is rolled back, so the dev data is never touched.
+"""
+
+SCHEMA = "explain_test"
+LOCATIONS = 50
+METRICS = ["temperature", "precipitation", "humidity", "wind_speed"]
+DAYS = 1500
+
+ROUTE_FILTERS = [
+    {"location_id": 7, "metric": "temperature", "start_date": "2022-01-10", "end_date": "2022-03-20"},
+    {"location_id": None, "metric": "humidity", "start_date": "2023-05-03", "end_date": "2023-05-28"},
+    {"location_id": 12, "metric": None, "start_date": None, "end_date": None},
+]
+
+@pytest.fixture(scope="module")
+def conn():
+    try:
+        connection = engine.connect()
+    except OperationalError:
+        pytest.skip("Postgres is not reachable")
+
+    with connection:
+        connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        connection.execute(text(f"SET LOCAL search_path TO {SCHEMA}"))
+        apply_migrations(connection)
+
+        connection.execute(text(
+            "INSERT INTO locations (name, country, latitude, longitude, region) "
+            "SELECT 'station ' || g, 'country', 0, 0, 'region' FROM generate_series(1, :n) g"
+        ), {"n": LOCATIONS})
+        for name in METRICS:
+            connection.execute(text(
+                "INSERT INTO metrics (name, display_name, unit, description) VALUES (:name, :name, 'unit', '')"
+            ), {"name": name})
+        ensure_partitions(connection, [f"{year}-01-01" for year in range(2020, 2025)])
+        connection.execute(text(
+            """
+            INSERT INTO climatedata (location_id, metric_id, date, value, quality)
+            SELECT l, m, DATE '2020-01-01' + d, random() * 40,
+                1 + (l + d) % 4
+            FROM generate_series(1, :locations) l, generate_series(1, :metrics) m, generate_series(0, :days - 1) d
+            """
+        ), {"locations": LOCATIONS, "metrics": len(METRICS), "days": DAYS})
+        rebuild_rollups(connection)
+        connection.execute(text("ANALYZE"))
+
+        yield connection
+        connection.rollback()
+
+def explain(conn, sql: str, params: dict = None) -> dict:
+    return conn.execute(text("EXPLAIN (FORMAT JSON) " + sql), params or {}).scalar_one()[0]["Plan"]
+
+def scanned_relations(plan: dict) -> list:
+    relations = [(plan["Node Type"], plan["Relation Name"])] if "Relation Name" in plan else []
+    for child in plan.get("Plans", []):
+        relations.extend(scanned_relations(child))
+    return relations
+
+def seq_scans(plan: dict) -> list:
+    return [
+        relation for node, relation in scanned_relations(plan)
+        if node == "Seq Scan" and relation.startswith("climatedata")
+    ]
+
+def trends_where(filters: dict):
+    reading_filters = parse_filters(**filters, quality_threshold="good")
+    return reading_filters.where("c"), reading_filters.params()
+
+def trends_query(filters: dict):
+    where, params = trends_where(filters)
+    return TRENDS_QUERY.format(where=where), params
+
+@pytest.mark.parametrize("filters", ROUTE_FILTERS)
+def test_summary_route_uses_indexes(conn, filters):
+    query, params = build_summary_query(parse_filters(**filters, quality_threshold="good"))
+    plan = explain(conn, query, params)
+    assert seq_scans(plan) == []
+
+@pytest.mark.parametrize("filters", ROUTE_FILTERS)
+def test_trends_route_uses_indexes(conn, filters):
+    plan = explain(conn, *trends_query(filters))
+    assert seq_scans(plan) == []
+
+def moments_query(filters: dict):
+    return build_moments_query(parse_filters(**filters, quality_threshold="good"))
+
+@pytest.mark.parametrize("filters", ROUTE_FILTERS)
+def test_trends_rollup_moments_use_indexes(conn, filters):
+    plan = explain(conn, *moments_query(filters))
+    assert seq_scans(plan) == []
+
+@pytest.mark.parametrize("filters", ROUTE_FILTERS + [{}])
+def test_rollup_moments_match_raw_moments(conn, filters):
+    where, params = trends_where(filters)
+    raw = {(row.metric_id, row.month): row[2:] for row in conn.execute(text(MOMENTS_QUERY.format(where=where, location="")), params)}
+    query, params = moments_query(filters)
+    rollup = {(row.metric_id, row.month): row[2:] for row in conn.execute(text(query), params)}
+    assert rollup.keys() == raw.keys()
+    for key, moments in raw.items():
+        assert rollup[key] == pytest.approx(moments, rel=1e-9)
+
+@pytest.mark.parametrize("filters", ROUTE_FILTERS + [{}])
+def test_climate_route_uses_indexes(conn, filters):
+    query = build_climate_query(parse_filters(**filters)).limit(51)
+    compiled = query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+    plan = explain(conn, str(compiled))
+    assert seq_scans(plan) == []
+
+@pytest.mark.parametrize("filters", ROUTE_FILTERS)
+def test_climate_pages_only_read_climatedata(conn, filters):
+    # metric names are resolved to ids before the query, no dimension table is joined or looked up
+    metrics = [Metrics(id=id, name=name, display_name=name, unit="unit", description="") for id, name in enumerate(METRICS, 1)]
+    query = build_page_query(Dimensions.of(0, [], metrics).resolve(parse_filters(**filters))).limit(51)
+    compiled = query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+    relations = scanned_relations(explain(conn, str(compiled)))
+    assert relations and all(relation.startswith("climatedata") for _, relation in relations)
+    assert seq_scans(explain(conn, str(compiled))) == []
+
+def test_date_bounded_reads_prune_partitions(conn):
+    filters = {"metric": "temperature", "start_date": "2022-01-10", "end_date": "2022-03-20"}
+    climate = build_climate_query(parse_filters(**filters)).limit(51)
+    compiled = str(climate.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    summary = build_summary_query(parse_filters(**filters))
+
+    for plan in [explain(conn, *trends_query(filters)), explain(conn, compiled), explain(conn, *summary)]:
+        partitions = {relation for _, relation in scanned_relations(plan) if relation.startswith("climatedata_y")}
+        assert partitions == {partition_name(2022)}
+
+def test_location_lookups_use_the_spatial_index(conn):
+    # the 50 station table is small enough that a seq scan would win on cost
+    conn.execute(text("SET LOCAL enable_seqscan = off"))
+    try:
+        for query in [build_locations_query(near=(0.0, 0.0), radius_km=25), build_locations_query(bbox=(170.0, -1.0, -170.0, 1.0))]:
+            assert "ix_locations_position" in json.dumps(explain(conn, *query))
+    finally:
+        conn.execute(text("SET LOCAL enable_seqscan = on"))
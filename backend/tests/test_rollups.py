@@ -0,0 +1,71 @@
+import datetime
+import threading
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import NullPool
+
+from backend.dal.engine import POSTGRES_URL
+from backend.dal.migrations import apply_migrations
+from backend.dal.partitions import ensure_partitions
+from backend.dal.rollups import refresh_rollups
+
+"""
+Rollup refreshes of two transactions writing into the same month.
+
+NOTE: needs the Postgres from .env. Both connections work in a throwaway schema that
+is dropped afterwards, so the dev data is never touched.
+"""
+
+SCHEMA = "rollup_test"
+MONTH = datetime.date(2030, 1, 1)
+
+@pytest.fixture
+def rollup_engine():
+    engine = create_engine(POSTGRES_URL, poolclass=NullPool, connect_args={"options": f"-csearch_path={SCHEMA}"})
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+            apply_migrations(conn)
+            conn.execute(text("INSERT INTO locations (name, country, latitude, longitude, region) VALUES ('station', 'country', 0, 0, 'region')"))
+            conn.execute(text("INSERT INTO metrics (name, display_name, unit, description) VALUES ('temperature', 'temperature', 'unit', '')"))
+            ensure_partitions(conn, [MONTH])
+    except OperationalError:
+        pytest.skip("Postgres is not reachable")
+
+    yield engine
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+    engine.dispose()
+
+def write_reading(conn, date: datetime.date, value: float):
+    conn.execute(text(
+        "INSERT INTO climatedata (location_id, metric_id, date, value, quality) VALUES (1, 1, :date, :value, 4)"
+    ), {"date": date, "value": value})
+    refresh_rollups(conn, [(1, 1, date)])
+
+def test_concurrent_writes_to_one_month_both_land_in_the_rollup(rollup_engine):
+    errors = []
+
+    def second_writer():
+        try:
+            with rollup_engine.begin() as conn:
+                write_reading(conn, MONTH + datetime.timedelta(days=1), 20.0)
+        except Exception as error:
+            errors.append(error)
+
+    with rollup_engine.begin() as conn:
+        write_reading(conn, MONTH, 10.0)
+        second = threading.Thread(target=second_writer)
+        second.start()
+        # the second writer refreshes the same month while this transaction is still open
+        second.join(timeout=1)
+        assert second.is_alive()
+    second.join(timeout=10)
+
+    assert errors == []
+    with rollup_engine.connect() as conn:
+        count, total = conn.execute(text(
+            "SELECT reading_count, value_sum FROM climate_rollup_monthly WHERE period = :period"
+        ), {"period": MONTH}).one()
+    assert (count, total) == (2, 30.0)
@@ -0,0 +1,37 @@
+import math
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from backend.dal.queries import ReadingFilters
+from backend.dal.spatial import EARTH_RADIUS_KM, bounding_box, split_box
+
+def destination(lat: float, lon: float, bearing: float, distance_km: float):
+    angle, lat, bearing = distance_km / EARTH_RADIUS_KM, math.radians(lat), math.radians(bearing)
+    end_lat = math.asin(math.sin(lat) * math.cos(angle) + math.cos(lat) * math.sin(angle) * math.cos(bearing))
+    end_lon = math.radians(lon) + math.atan2(
+        math.sin(bearing) * math.sin(angle) * math.cos(lat), math.cos(angle) - math.sin(lat) * math.sin(end_lat)
+    )
+    return math.degrees(end_lat), (math.degrees(end_lon) + 540) % 360 - 180
+
+@pytest.mark.parametrize("lat, lon, radius_km", [(40.7, -74.0, 50), (-33.9, 151.2, 900), (78.0, 15.0, 400), (0.0, 179.9, 100), (89.0, 0.0, 300)])
+def test_bounding_box_holds_the_whole_circle(lat, lon, radius_km):
+    west, south, east, north = bounding_box(lat, lon, radius_km)
+    for bearing in range(0, 360, 5):
+        point_lat, point_lon = destination(lat, lon, bearing, radius_km * 0.999)
+        assert south <= point_lat <= north
+        assert west <= point_lon <= east
+
+def test_bounding_box_stays_tight_away_from_the_edges():
+    west, south, east, north = bounding_box(0.0, 0.0, 111.19)
+    assert [round(value, 2) for value in (west, south, east, north)] == [-1.0, -1.0, 1.0, 1.0]
+    assert split_box(170.0, -10.0, -170.0, 10.0) == [(170.0, -10.0, 180.0, 10.0), (-180.0, -10.0, -170.0, 10.0)]
+
+def test_near_filter_selects_stations_by_circle():
+    filters = ReadingFilters(near=(51.5, -0.12, 100.0))
+    assert filters.where("c").startswith("c.location_id IN (SELECT station.id FROM locations station WHERE point(station.longitude, station.latitude) <@ box(")
+    params = filters.params()
+    assert (params["near_lat"], params["near_lon"], params["near_radius_km"]) == (51.5, -0.12, 100.0)
+    assert params["near_south"] < 51.5 < params["near_north"]
+
+    compiled = str(filters.clauses()[0].compile(dialect=postgresql.dialect()))
+    assert compiled.startswith("climatedata.location_id IN (SELECT station.id FROM locations station")
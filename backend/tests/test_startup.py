@@ -0,0 +1,54 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+from fastapi.testclient import TestClient
+
+from backend import startup
+from backend.app import app
+
+client = TestClient(app)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# generous, a cold import of backend.app takes around a second
+STARTUP_BUDGET_SECONDS = 5.0
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import backend.app
+print(json.dumps({"seconds": time.perf_counter() - start, "modules": sorted(sys.modules)}))
+"""
+
+def test_app_imports_quickly_from_any_directory(tmp_path):
+    # a fresh interpreter in an unrelated directory, so nothing is cached and no cwd relative path resolves
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE],
+        cwd=tmp_path, capture_output=True, text=True,
+        env={**os.environ, "PYTHONPATH": REPO_ROOT}
+    )
+    assert result.returncode == 0, result.stderr
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert probe["seconds"] < STARTUP_BUDGET_SECONDS
+    # only loaded on first use
+    assert not {"pandas", "scipy", "pyarrow", "asyncpg"} & set(probe["modules"])
+
+def test_ready_waits_for_background_tasks():
+    gate = threading.Event()
+
+    async def run():
+        startup.start_background("test", gate.wait)
+        await asyncio.sleep(0)
+        states = (startup.ready(), startup.task_states())
+        gate.set()
+        await asyncio.gather(*startup._tasks.values())
+        states += (startup.ready(), startup.task_states())
+        await startup.wait_background()
+        return states
+
+    assert asyncio.run(run()) == (False, {"test": "running"}, True, {"test": "done"})
+    assert client.get("/ready").json() == {"ready": True, "tasks": {}}
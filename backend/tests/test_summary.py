@@ -0,0 +1,35 @@
+from datetime import date
+from types import SimpleNamespace
+
+from backend.routes.summary import fold_groups, split_date_range
+
+def test_whole_months_come_from_rollups():
+    assert split_date_range(date(2022, 1, 1), date(2022, 3, 31)) == ((date(2022, 1, 1), date(2022, 4, 1)), [])
+
+def test_partial_edges_come_from_raw_rows():
+    rollup_range, raw_ranges = split_date_range(date(2022, 1, 10), date(2022, 3, 20))
+    assert rollup_range == (date(2022, 2, 1), date(2022, 3, 1))
+    assert raw_ranges == [(date(2022, 1, 10), date(2022, 1, 31)), (date(2022, 3, 1), date(2022, 3, 20))]
+
+def test_range_inside_one_month_skips_rollups():
+    assert split_date_range(date(2022, 1, 5), date(2022, 1, 20)) == (None, [(date(2022, 1, 5), date(2022, 1, 20))])
+
+def test_open_ended_ranges():
+    assert split_date_range(None, None) == ((None, None), [])
+    assert split_date_range(None, date(2022, 2, 27)) == ((None, date(2022, 2, 1)), [(date(2022, 2, 1), date(2022, 2, 27))])
+
+def test_locations_of_a_group_fold_together():
+    def row(location_id, quality, count, total, low, high):
+        return SimpleNamespace(
+            location_id=location_id, metric_name="temperature", metric_unit="celsius", quality=quality,
+            quality_weight=1.0, reading_count=count, value_sum=total, value_min=low, value_max=high, weighted_sum=total
+        )
+
+    rows = [row(1, "excellent", 2, 30.0, 10.0, 20.0), row(2, "excellent", 1, 30.0, 30.0, 30.0), row(3, "good", 1, 5.0, 5.0, 5.0)]
+    summary = fold_groups(rows, {1: "California", 2: "California", 3: "England"})
+
+    assert list(summary) == ["California", "England"]
+    california = summary["California"]["temperature"]
+    assert (california["min"], california["max"], california["avg"]) == (10.0, 30.0, 20.0)
+    assert california["quality_distribution"]["excellent"] == 1.0
+    assert summary["England"]["temperature"]["quality_distribution"]["good"] == 1.0
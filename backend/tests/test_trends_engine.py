@@ -0,0 +1,46 @@
+import numpy as np
+
+from backend.analytics.trends import DAYS_PER_MONTH, Moments, analyze, analyze_columns, day_offsets, format_trend, months_of
+
+def synthetic(groups: int = 3, rows: int = 5000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    group = rng.integers(0, groups, rows)
+    day = rng.integers(0, 1500, rows)
+    dates = np.datetime64("2020-01-01") + day.astype("timedelta64[D]")
+    values = 10 + (group + 1) * 0.01 * day + 5 * np.sin(2 * np.pi * day / 365.25) + rng.normal(0, 1, rows)
+    return group, dates, values
+
+def test_grouped_fit_matches_per_group_polyfit():
+    group, dates, values = synthetic()
+    result, anomaly_rows, z = analyze_columns(group, dates, values, 3)
+
+    x = day_offsets(dates)
+    for g in range(3):
+        slope, _ = np.polyfit(x[group == g], values[group == g], 1)
+        r = np.corrcoef(x[group == g], values[group == g])[0, 1]
+        assert np.isclose(result.overall.slope[g], slope)
+        assert np.isclose(result.overall.r2[g], r * r)
+        assert np.isclose(result.overall.std[g], np.std(values[group == g]))
+
+    assert np.all(np.abs(z[anomaly_rows]) > 2)
+
+def test_sql_moments_match_column_moments():
+    group, dates, values = synthetic()
+    moments = Moments.from_columns(group, day_offsets(dates), values, months_of(dates), 3)
+    rows = [
+        (g, month + 1, *(getattr(moments, name)[g, month] for name in ("n", "sx", "sy", "sxx", "sxy", "syy")))
+        for g in range(3) for month in range(12)
+    ]
+    from_rows = analyze(Moments.from_rows(rows, 3))
+    assert np.allclose(from_rows.overall.slope, analyze(moments).overall.slope)
+
+def test_format_trend_reports_monthly_rate_and_seasons():
+    group, dates, values = synthetic()
+    result, _, _ = analyze_columns(group, dates, values, 3)
+    trend = format_trend(result, 0, "celsius", [])
+
+    assert trend["direction"] == "increasing"
+    # the partial final year of the seasonal cycle biases the fit slightly
+    assert np.isclose(trend["rate"], 0.01 * DAYS_PER_MONTH, atol=0.05)
+    assert trend["seasonality"]["detected"]
+    assert set(trend["seasonality"]["pattern"]) == {"winter", "spring", "summer", "fall"}
@@ -15,11 +15,33 @@ CREATE TABLE IF NOT EXISTS METRICS (
 	DESCRIPTION TEXT
 );
 
+CREATE TABLE IF NOT EXISTS QUALITY_LEVELS (
+	ORDINAL SMALLINT PRIMARY KEY,
+	NAME VARCHAR NOT NULL UNIQUE,
+	WEIGHT DOUBLE PRECISION NOT NULL
+);
+
+INSERT INTO QUALITY_LEVELS (ORDINAL, NAME, WEIGHT) VALUES
+	(1, 'poor', 0.25),
+	(2, 'questionable', 0.5),
+	(3, 'good', 0.75),
+	(4, 'excellent', 1.0)
+ON CONFLICT DO NOTHING;
+
 CREATE TABLE IF NOT EXISTS CLIMATE_DATA (
-	ID SERIAL PRIMARY KEY,
+	ID SERIAL,
 	LOCATION_ID INTEGER NOT NULL REFERENCES LOCATIONS (ID),
 	METRIC_ID INTEGER NOT NULL REFERENCES METRICS (ID),
 	DATE DATE NOT NULL,
 	VALUE DOUBLE PRECISION,
-	QUALITY VARCHAR(50)
-);
+	QUALITY SMALLINT NOT NULL CHECK (QUALITY BETWEEN 1 AND 4),
+	PRIMARY KEY (ID, DATE)
+) PARTITION BY RANGE (DATE);
+
+-- one partition per year, created on demand by the ingestion paths
+CREATE TABLE IF NOT EXISTS CLIMATE_DATA_Y2025 PARTITION OF CLIMATE_DATA FOR VALUES FROM ('2025-01-01') TO ('2026-01-01');
+
+CREATE UNIQUE INDEX IF NOT EXISTS UX_CLIMATE_DATA_LOCATION_METRIC_DATE ON CLIMATE_DATA (LOCATION_ID, METRIC_ID, DATE) INCLUDE (VALUE, QUALITY);
+CREATE INDEX IF NOT EXISTS IX_CLIMATE_DATA_METRIC_DATE ON CLIMATE_DATA (METRIC_ID, DATE) INCLUDE (LOCATION_ID, VALUE, QUALITY);
+CREATE INDEX IF NOT EXISTS IX_CLIMATE_DATA_DATE_ID ON CLIMATE_DATA (DATE, ID);
+CREATE INDEX IF NOT EXISTS IX_METRICS_NAME ON METRICS (NAME);